@@ -1,6 +1,6 @@
 # website/__init__.py
 import os
-from flask import Flask, render_template
+from flask import render_template
 from flask_mail import Mail
 from flask_jwt_extended import JWTManager, get_jwt_identity
 from flask_limiter import Limiter
@@ -8,12 +8,19 @@ from flask_limiter.util import get_remote_address
 import logging
 from logging.config import dictConfig
 from flask_talisman import Talisman
-from pymongo import MongoClient
 from pymongo.errors import OperationFailure
 from flask_wtf.csrf import CSRFProtect
 from flask_cors import CORS # This line should now be recognized
 
 from .config import config_by_name
+from .utils.storage import create_storage
+from .utils.uploads import init_uploads
+from .utils.assets import init_assets
+from .utils.http_cache import init_conditional_responses
+from .utils.compression import init_compression
+from .utils.json_provider import init_json_provider
+from .utils.database import MongoFlask, init_database
+from .utils.images import avatar_sources
 from .models.user import *
 from .models.transaction import *
 from .models.invoice import *
@@ -23,6 +30,9 @@ from .models.activity import *
 from .models.notification import *
 from .models.analytics import *
 from .models.archive import *
+from .models.indexes import *
+from .models.events import *
+from .models.sync import *
 
 log_config = {
     'version': 1,
@@ -43,16 +53,19 @@ limiter = Limiter(key_func=get_remote_address)
 csrf = CSRFProtect()
 
 def create_app(config_name='dev'):
-    app = Flask(__name__)
+    app = MongoFlask(__name__)
     app.config.from_object(config_by_name[config_name])
+    init_json_provider(app)
 
     # Initialize CORS
     CORS(app)
 
-    if not os.path.exists(app.config['UPLOAD_FOLDER']):
-        os.makedirs(app.config['UPLOAD_FOLDER'])
-    if not os.path.exists(app.config['PROFILE_PIC_FOLDER']):
-        os.makedirs(app.config['PROFILE_PIC_FOLDER'])
+    app.storage = create_storage(app)
+    init_uploads(app)
+    init_assets(app)
+    # Compression runs after the ETag/304 handling, so it is installed first.
+    init_compression(app)
+    init_conditional_responses(app)
 
     mail.init_app(app)
     jwt.init_app(app)
@@ -70,6 +83,8 @@ def create_app(config_name='dev'):
             pass
         return dict(current_user_data=None)
 
+    app.jinja_env.globals['avatar_sources'] = avatar_sources
+
     # (The rest of the file is unchanged)
     # ...
     app.get_user_by_username = get_user_by_username
@@ -95,10 +110,14 @@ def create_app(config_name='dev'):
     app.get_weekly_billing_summary = get_weekly_billing_summary
     app.log_user_activity = log_user_activity
     app.get_recent_activity = get_recent_activity
+    app.get_activity_version = get_activity_version
     app.add_invoice = add_invoice
     app.get_invoices = get_invoices
     app.get_invoice_by_id = get_invoice_by_id
+    app.get_invoice_details = get_invoice_details
+    app.get_invoice_text_page = get_invoice_text_page
     app.archive_invoice = archive_invoice
+    app.search_invoices = search_invoices
     app.add_notification = add_notification
     app.get_notifications = get_notifications
     app.get_unread_notification_count = get_unread_notification_count
@@ -112,16 +131,16 @@ def create_app(config_name='dev'):
     app.get_archived_items = get_archived_items
     app.restore_item = restore_item
     app.delete_item_permanently = delete_item_permanently
+    app.archive_items = archive_items
+    app.restore_items = restore_items
+    app.delete_items_permanently = delete_items_permanently
+    app.read_change_events = read_change_events
+    app.get_data_version = get_data_version
+    app.consume_change_events = consume_change_events
+    app.apply_sync_batch = apply_sync_batch
     app.mail = mail
 
-    try:
-        mongo_client = MongoClient(app.config['MONGO_URI'])
-        app.db = mongo_client.get_database(app.config['MONGO_DB_NAME'])
-        mongo_client.admin.command('ping')
-        logger.info("Successfully connected to MongoDB.")
-    except Exception as e:
-        logger.error(f"MongoDB connection failed: {e}", exc_info=True)
-        app.db = None
+    init_database(app)
 
     from .auth import auth as auth_blueprint
     app.register_blueprint(auth_blueprint, url_prefix='/auth')
@@ -0,0 +1,96 @@
+# compress_invoice_text_task.py
+import os
+from bson import BSON
+from pymongo import UpdateOne
+from website import create_app
+from website.models.invoice import compressed_text_fields
+
+app = create_app(os.getenv('FLASK_CONFIG') or 'dev')
+
+BATCH_SIZE = 500
+
+def _collection_stats(db):
+    stats = db.command('collStats', 'invoices')
+    return {
+        'count': stats.get('count', 0),
+        'size': stats.get('size', 0),
+        'avgObjSize': stats.get('avgObjSize', 0),
+        'storageSize': stats.get('storageSize', 0),
+        'totalIndexSize': stats.get('totalIndexSize', 0),
+    }
+
+def _mb(num_bytes):
+    return f"{num_bytes / (1024 * 1024):.2f} MB"
+
+def print_report(before, after, docs_before, docs_after, count):
+    """
+    Prints the size reduction. `size` is the uncompressed BSON size of all
+    documents, which is what the invoices collection occupies in the
+    WiredTiger cache (its working set); `storageSize` is the on-disk size.
+    """
+    print("\n--- Invoice text storage report ---")
+    print(f"Migrated documents: {count}")
+    if count:
+        saved = docs_before - docs_after
+        print(f"OCR text fields of migrated documents: {_mb(docs_before)} -> {_mb(docs_after)} "
+              f"({saved / docs_before * 100:.1f}% smaller, avg {docs_before // count} -> {docs_after // count} bytes)")
+    for key, label in (('size', 'Working set (data size)'), ('avgObjSize', 'Average document'),
+                       ('storageSize', 'On-disk storage'), ('totalIndexSize', 'Indexes')):
+        old, new = before[key], after[key]
+        change = f"{(old - new) / old * 100:.1f}% smaller" if old else "n/a"
+        if key == 'avgObjSize':
+            print(f"{label}: {old} -> {new} bytes ({change})")
+        else:
+            print(f"{label}: {_mb(old)} -> {_mb(new)} ({change})")
+    print("On-disk storage shrinks once WiredTiger reuses or compacts the freed space.")
+
+def compress_invoice_text():
+    """
+    Moves the plain `extracted_text` of existing invoices into the compressed
+    form used by new uploads (extracted_text_z / extracted_text_size /
+    search_text), then reports the size reduction.
+    """
+    with app.app_context():
+        db = app.db
+        if db is None:
+            print("Error: Database connection not available.")
+            return
+
+        before = _collection_stats(db)
+        print("Compressing invoice OCR text...")
+
+        cursor = db.invoices.find(
+            {'extracted_text': {'$exists': True}},
+            {'extracted_text': 1}
+        ).batch_size(BATCH_SIZE)
+
+        operations = []
+        count = 0
+        docs_before = docs_after = 0
+        for invoice in cursor:
+            fields = compressed_text_fields(invoice.get('extracted_text'))
+            docs_before += len(BSON.encode({'extracted_text': invoice.get('extracted_text') or ''}))
+            docs_after += len(BSON.encode(fields))
+            operations.append(UpdateOne(
+                {'_id': invoice['_id']},
+                {'$set': fields, '$unset': {'extracted_text': ''}}
+            ))
+            count += 1
+            if len(operations) >= BATCH_SIZE:
+                db.invoices.bulk_write(operations, ordered=False)
+                operations = []
+                print(f"  - Compressed {count} invoices...")
+
+        if operations:
+            db.invoices.bulk_write(operations, ordered=False)
+
+        if count == 0:
+            print("No invoices needed compression.")
+        else:
+            print(f"Successfully compressed text for {count} invoices.")
+
+        print_report(before, _collection_stats(db), docs_before, docs_after, count)
+
+
+if __name__ == '__main__':
+    compress_invoice_text()
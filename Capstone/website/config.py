@@ -14,15 +14,126 @@ class Config:
     
     UPLOAD_FOLDER = os.path.join(basedir, '..', 'uploads', 'invoices')
     PROFILE_PIC_FOLDER = os.path.join(basedir, '..', 'uploads', 'profile_pics')
+    UPLOAD_CHUNK_FOLDER = os.path.join(basedir, '..', 'uploads', 'chunks')
+
+    # File Storage Settings ('local' keeps files under uploads/, 'gridfs' stores them in MongoDB)
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+    STORAGE_CHUNK_SIZE = int(os.environ.get('STORAGE_CHUNK_SIZE', 256 * 1024))
+    # Browser cache lifetime for content-addressed upload names (e.g. resized avatars)
+    STORAGE_IMMUTABLE_MAX_AGE = int(os.environ.get('STORAGE_IMMUTABLE_MAX_AGE', 365 * 24 * 3600))
+    # Hand authorised file transfers to the front proxy: '' (off), 'X-Accel-Redirect' (nginx) or 'X-Sendfile'
+    STORAGE_SENDFILE_HEADER = os.environ.get('STORAGE_SENDFILE_HEADER', '')
+    # nginx `internal` location that maps to the uploads/ folder, used with X-Accel-Redirect
+    STORAGE_ACCEL_REDIRECT_PREFIX = os.environ.get('STORAGE_ACCEL_REDIRECT_PREFIX', '/protected-uploads/')
+
+    # Upload limits (bytes). MAX_CONTENT_LENGTH caps every request; routes
+    # marked with streamed_upload use their own request and per-file limits.
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 64 * 1024 * 1024))
+    UPLOAD_MAX_REQUEST_SIZE = int(os.environ.get('UPLOAD_MAX_REQUEST_SIZE', 16 * 1024 * 1024))
+    UPLOAD_MAX_FILE_SIZE = int(os.environ.get('UPLOAD_MAX_FILE_SIZE', 8 * 1024 * 1024))
+    INVOICE_UPLOAD_MAX_REQUEST_SIZE = int(os.environ.get('INVOICE_UPLOAD_MAX_REQUEST_SIZE', 60 * 1024 * 1024))
+    INVOICE_UPLOAD_MAX_FILE_SIZE = int(os.environ.get('INVOICE_UPLOAD_MAX_FILE_SIZE', 20 * 1024 * 1024))
+    PROFILE_PHOTO_MAX_REQUEST_SIZE = int(os.environ.get('PROFILE_PHOTO_MAX_REQUEST_SIZE', 10 * 1024 * 1024))
+    PROFILE_PHOTO_MAX_FILE_SIZE = int(os.environ.get('PROFILE_PHOTO_MAX_FILE_SIZE', 8 * 1024 * 1024))
+    # Chunked invoice uploads: the largest chunk a client may PUT, and how
+    # many chunks the browser sends at once
+    INVOICE_UPLOAD_CHUNK_SIZE = int(os.environ.get('INVOICE_UPLOAD_CHUNK_SIZE', 1024 * 1024))
+    INVOICE_UPLOAD_PARALLEL_CHUNKS = int(os.environ.get('INVOICE_UPLOAD_PARALLEL_CHUNKS', 4))
+    # Browser-side downscaling of invoice photos before upload
+    INVOICE_IMAGE_MAX_DIMENSION = int(os.environ.get('INVOICE_IMAGE_MAX_DIMENSION', 2000))
+    INVOICE_IMAGE_QUALITY = float(os.environ.get('INVOICE_IMAGE_QUALITY', 0.8))
+
+    # Archive retention: archived items are purged this many days after
+    # archivedAt by purge_archive_task.py (0 keeps them forever)
+    ARCHIVE_RETENTION_DAYS = int(os.environ.get('ARCHIVE_RETENTION_DAYS', 90))
+    ARCHIVE_PURGE_BATCH_SIZE = int(os.environ.get('ARCHIVE_PURGE_BATCH_SIZE', 500))
+
+    # Offline transaction sync: a client away longer than this many days gets
+    # a full snapshot instead of a delta (0 never forces one)
+    SYNC_TOKEN_MAX_AGE_DAYS = int(os.environ.get('SYNC_TOKEN_MAX_AGE_DAYS', 90))
+    # Unreferenced upload files younger than this are left alone (uploads in flight)
+    ORPHAN_FILE_GRACE_HOURS = int(os.environ.get('ORPHAN_FILE_GRACE_HOURS', 24))
+    # Chunks of uploads that were never assembled
+    UPLOAD_CHUNK_MAX_AGE_HOURS = int(os.environ.get('UPLOAD_CHUNK_MAX_AGE_HOURS', 24))
+
+    # Serve static files under content-hashed names with immutable caching
+    # (url_for('static', ...) and asset_url() produce the hashed names)
+    ASSET_FINGERPRINTING = os.environ.get('ASSET_FINGERPRINTING', 'True').lower() in ('true', '1', 'yes')
+    # Serve VENDOR_ASSETS from their CDN while static/vendor/ is not populated
+    # (development only: the app must install offline without the CDN)
+    VENDOR_CDN_FALLBACK = os.environ.get('VENDOR_CDN_FALLBACK', 'False').lower() in ('true', '1', 'yes')
+
+    # Response compression (Brotli when the Brotli package is installed, else gzip)
+    # for text responses of at least COMPRESSION_MIN_SIZE bytes. Dynamic
+    # responses use fast levels; static files are compressed once at maximum.
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'True').lower() in ('true', '1', 'yes')
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 500))
+    COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 4))
+    COMPRESSION_STATIC_GZIP_LEVEL = int(os.environ.get('COMPRESSION_STATIC_GZIP_LEVEL', 9))
+    COMPRESSION_STATIC_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_STATIC_BROTLI_QUALITY', 11))
+
+    # Paid folders paid more than this many years ago are moved, with their
+    # checks, into transactions_history by history_transactions_task.py (0 disables)
+    TRANSACTION_HISTORY_YEARS = int(os.environ.get('TRANSACTION_HISTORY_YEARS', 2))
+    TRANSACTION_HISTORY_BATCH_SIZE = int(os.environ.get('TRANSACTION_HISTORY_BATCH_SIZE', 200))
+
+    # Production server (python -m website.serve, waitress). Requests run on
+    # SERVER_THREADS threads; connections beyond SERVER_CONNECTION_LIMIT wait
+    # in the listen backlog, and idle connections close after
+    # SERVER_CHANNEL_TIMEOUT seconds.
+    SERVER_HOST = os.environ.get('SERVER_HOST', '0.0.0.0')
+    SERVER_PORT = int(os.environ.get('SERVER_PORT') or os.environ.get('PORT', 5000))
+    SERVER_THREADS = int(os.environ.get('SERVER_THREADS', 8))
+    SERVER_CONNECTION_LIMIT = int(os.environ.get('SERVER_CONNECTION_LIMIT', 200))
+    SERVER_CHANNEL_TIMEOUT = int(os.environ.get('SERVER_CHANNEL_TIMEOUT', 120))
+    SERVER_BACKLOG = int(os.environ.get('SERVER_BACKLOG', 1024))
+    # Address of the reverse proxy whose X-Forwarded-For/-Proto headers are trusted ('' trusts none)
+    SERVER_TRUSTED_PROXY = os.environ.get('SERVER_TRUSTED_PROXY', '')
 
     # VAPID Keys
     VAPID_PRIVATE_KEY = os.environ.get('VAPID_PRIVATE_KEY')
     VAPID_PUBLIC_KEY = os.environ.get('VAPID_PUBLIC_KEY')
     VAPID_CLAIM_EMAIL = os.environ.get('VAPID_CLAIM_EMAIL')
     
+    # OCR Settings: named pattern set used to pull totals, dates, TIN and OR numbers out of receipt text
+    OCR_FIELD_PATTERN_SET = os.environ.get('OCR_FIELD_PATTERN_SET', 'ph_receipt')
+    # Worker processes for page-parallel OCR (0 = one per CPU)
+    OCR_MAX_WORKERS = int(os.environ.get('OCR_MAX_WORKERS', 0))
+    OCR_PAGE_TIMEOUT = int(os.environ.get('OCR_PAGE_TIMEOUT', 15))
+    OCR_PDF_DPI = int(os.environ.get('OCR_PDF_DPI', 200))
+    INVOICE_PDF_MAX_PAGES = int(os.environ.get('INVOICE_PDF_MAX_PAGES', 50))
+
     # MongoDB Settings
     MONGO_URI = os.environ.get('MONGO_URI', "mongodb://localhost:2717/")
     MONGO_DB_NAME = os.environ.get('MONGO_DB_NAME', "deco_db")
+    # Connection pool per process. Requests wait at most
+    # MONGO_WAIT_QUEUE_TIMEOUT_MS for a free connection; idle connections
+    # above the minimum close after MONGO_MAX_IDLE_TIME_MS (0 = no limit).
+    MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 100))
+    MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+    MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 0))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 0))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 30000))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 20000))
+    MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 0))
+    # Wire compression, in order of preference (zstd and snappy come from
+    # the pymongo[zstd,snappy] extras in requirements.txt)
+    MONGO_COMPRESSORS = os.environ.get('MONGO_COMPRESSORS', 'zstd,snappy,zlib')
+    MONGO_ZLIB_COMPRESSION_LEVEL = int(os.environ.get('MONGO_ZLIB_COMPRESSION_LEVEL', 1))
+    MONGO_RETRY_WRITES = os.environ.get('MONGO_RETRY_WRITES', 'True').lower() in ('true', '1', 'yes')
+    MONGO_RETRY_READS = os.environ.get('MONGO_RETRY_READS', 'True').lower() in ('true', '1', 'yes')
+    MONGO_APP_NAME = os.environ.get('MONGO_APP_NAME', 'DecoOffice')
+    # Startup does not wait for MongoDB. While it is unreachable, requests
+    # fail fast and a reconnect is attempted after a backoff that doubles
+    # from the base delay up to the max (seconds); each attempt waits at
+    # most MONGO_PROBE_TIMEOUT_SECONDS.
+    MONGO_RECONNECT_BASE_DELAY_SECONDS = float(os.environ.get('MONGO_RECONNECT_BASE_DELAY_SECONDS', 1))
+    MONGO_RECONNECT_MAX_DELAY_SECONDS = float(os.environ.get('MONGO_RECONNECT_MAX_DELAY_SECONDS', 60))
+    MONGO_PROBE_TIMEOUT_SECONDS = float(os.environ.get('MONGO_PROBE_TIMEOUT_SECONDS', 5))
+    # Analytics and archive listings read from secondaries at most this far
+    # behind the primary (seconds, at least 90; -1 accepts any lag)
+    MONGO_REPORTING_MAX_STALENESS_SECONDS = int(os.environ.get('MONGO_REPORTING_MAX_STALENESS_SECONDS', 120))
     
     # Brevo API Key for sending emails via HTTP
     BREVO_API_KEY = os.environ.get('BREVO_API_KEY')
@@ -50,12 +161,34 @@ class Config:
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    VENDOR_CDN_FALLBACK = True
 
 class ProductionConfig(Config):
     DEBUG = False
     JWT_COOKIE_SECURE = True 
 
+    # Keep a connection ready per server thread, fail fast instead of
+    # queueing behind a saturated pool or an unreachable cluster.
+    MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', Config.SERVER_THREADS))
+    MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 50))
+    MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 300000))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 5000))
+    MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 30000))
+
+class TestingConfig(Config):
+    TESTING = True
+    # The suite never talks to a real database; tests that need one swap in a stand-in.
+    MONGO_URI = 'mongodb://localhost:27017/'
+    MONGO_DB_NAME = 'deco_test'
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = 500
+    MONGO_PROBE_TIMEOUT_SECONDS = 0.5
+    RATELIMIT_ENABLED = False
+    VENDOR_CDN_FALLBACK = True
+
 config_by_name = dict(
     dev=DevelopmentConfig,
-    prod=ProductionConfig
+    prod=ProductionConfig,
+    test=TestingConfig
 )
\ No newline at end of file
@@ -0,0 +1,56 @@
+# extract_invoice_fields_task.py
+import os
+from datetime import datetime
+import pytz
+from pymongo import UpdateOne
+from website import create_app
+from website.models.invoice import INVOICE_EXTRACTED_FIELDS, get_extracted_text
+from website.utils.receipt_fields import extract_invoice_fields
+
+app = create_app(os.getenv('FLASK_CONFIG') or 'dev')
+
+BATCH_SIZE = 500
+
+def backfill_invoice_fields():
+    """
+    Runs the OCR field extraction stage over invoices saved before it existed
+    and writes the typed fields (total, date, TIN, OR number) onto them.
+    """
+    with app.app_context():
+        db = app.db
+        if db is None:
+            print("Error: Database connection not available.")
+            return
+
+        pattern_set = app.config.get('OCR_FIELD_PATTERN_SET', 'ph_receipt')
+        print(f"Extracting invoice fields with pattern set '{pattern_set}'...")
+
+        cursor = db.invoices.find(
+            {'fieldsExtractedAt': {'$exists': False}},
+            {'extracted_text': 1, 'extracted_text_z': 1}
+        ).batch_size(BATCH_SIZE)
+
+        operations = []
+        count = 0
+        for invoice in cursor:
+            fields = extract_invoice_fields(get_extracted_text(invoice), pattern_set)
+            update = {k: v for k, v in fields.items() if k in INVOICE_EXTRACTED_FIELDS}
+            update['fieldsExtractedAt'] = datetime.now(pytz.utc)
+            operations.append(UpdateOne({'_id': invoice['_id']}, {'$set': update}))
+            count += 1
+            if len(operations) >= BATCH_SIZE:
+                db.invoices.bulk_write(operations, ordered=False)
+                operations = []
+                print(f"  - Processed {count} invoices...")
+
+        if operations:
+            db.invoices.bulk_write(operations, ordered=False)
+
+        if count == 0:
+            print("No invoices needed field extraction.")
+        else:
+            print(f"Successfully extracted fields for {count} invoices.")
+
+
+if __name__ == '__main__':
+    backfill_invoice_fields()
@@ -0,0 +1,32 @@
+# history_transactions_task.py
+import os
+from website import create_app
+from website.models.transaction import move_paid_folders_to_history
+
+app = create_app(os.getenv('FLASK_CONFIG') or 'dev')
+
+def move_old_transactions():
+    """
+    Moves paid folders older than TRANSACTION_HISTORY_YEARS, with their
+    checks, into the transactions_history collection so the live
+    transactions collection only holds recent and unpaid work. Lookups by
+    id, the folder PDF export and the analytics rollups read both
+    collections. Meant to run from the scheduler, like the other *_task.py scripts.
+    """
+    with app.app_context():
+        if app.db is None:
+            print("Error: Database connection not available.")
+            return
+
+        years = app.config.get('TRANSACTION_HISTORY_YEARS', 2)
+        if years <= 0:
+            print("Transaction history is disabled (TRANSACTION_HISTORY_YEARS=0).")
+            return
+
+        print(f"Moving folders paid more than {years} years ago to transactions_history...")
+        moved = move_paid_folders_to_history(years, app.config.get('TRANSACTION_HISTORY_BATCH_SIZE', 200))
+        print(f"  - Moved {moved['folders']} folders and {moved['checks']} checks.")
+
+
+if __name__ == '__main__':
+    move_old_transactions()
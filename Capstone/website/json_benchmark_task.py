@@ -0,0 +1,98 @@
+# json_benchmark_task.py
+import os
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+import pytz
+from bson import Decimal128, ObjectId
+from flask.json.provider import DefaultJSONProvider
+from website import create_app
+from website.utils.json_provider import BSONJSONProvider, orjson
+
+app = create_app(os.getenv('FLASK_CONFIG') or 'dev')
+
+# Documents per payload and timing rounds; override with JSON_BENCHMARK_SIZE / JSON_BENCHMARK_ROUNDS.
+PAYLOAD_SIZE = int(os.getenv('JSON_BENCHMARK_SIZE', 5000))
+ROUNDS = int(os.getenv('JSON_BENCHMARK_ROUNDS', 20))
+
+
+def build_payloads(size):
+    """Notification, schedule and invoice lists shaped like the documents pymongo returns."""
+    now = datetime.now(pytz.utc).replace(tzinfo=None)
+    notifications = [{
+        '_id': ObjectId(),
+        'username': 'benchmark',
+        'title': 'Transaction Due',
+        'message': f'Check #{i} for Supplier {i % 40} is due today.',
+        'url': f'/transactions/folder/{ObjectId()}',
+        'isRead': i % 3 == 0,
+        'createdAt': now - timedelta(minutes=i),
+    } for i in range(size)]
+    schedules = [{
+        '_id': ObjectId(),
+        'username': 'benchmark',
+        'branch': 'Main',
+        'title': f'Meeting {i}',
+        'start': now + timedelta(hours=i),
+        'end': now + timedelta(hours=i, minutes=30),
+        'allDay': False,
+        'description': 'Quarterly review with the supplier.',
+        'location': 'Office',
+        'label': 'Business',
+        'createdAt': now,
+    } for i in range(size)]
+    invoices = [{
+        '_id': ObjectId(),
+        'username': 'benchmark',
+        'branch': 'Main',
+        'folder_name': f'Supplier {i % 40}',
+        'date': now - timedelta(days=i % 365),
+        'total_amount': Decimal128(Decimal(f'{1000 + i}.50')),
+        'vat_amount': 120.06,
+        'files': [{'filename': f'{ObjectId()}.webp', 'size': 182344}],
+        'extracted_text_size': 4200,
+        'uploadedAt': now,
+    } for i in range(size)]
+    return {'notifications': notifications, 'schedules': schedules, 'invoices': invoices}
+
+
+def converted(documents):
+    """What the views did before the provider: stringify every ObjectId and Decimal128 first."""
+    def convert(value):
+        if isinstance(value, ObjectId):
+            return str(value)
+        if isinstance(value, Decimal128):
+            return str(value.to_decimal())
+        if isinstance(value, list):
+            return [convert(v) for v in value]
+        if isinstance(value, dict):
+            return {k: convert(v) for k, v in value.items()}
+        return value
+    return [convert(doc) for doc in documents]
+
+
+def time_response(provider, make_payload):
+    with app.test_request_context():
+        return min(timeit.repeat(lambda: provider.response(make_payload()), number=1, repeat=ROUNDS)) * 1000
+
+
+def run_benchmark():
+    payloads = build_payloads(PAYLOAD_SIZE)
+    default_provider = DefaultJSONProvider(app)
+    bson_provider = BSONJSONProvider(app)
+    stdlib_provider = BSONJSONProvider(app, use_orjson=False)
+    print(f"Serializing {PAYLOAD_SIZE} documents per payload, best of {ROUNDS} rounds (ms):")
+    print(f"{'payload':<15}{'flask default':>15}{'stdlib':>12}{'orjson':>12}")
+
+    for name, documents in payloads.items():
+        flask_default = time_response(default_provider, lambda: converted(documents))
+        stdlib = time_response(stdlib_provider, lambda: documents)
+        fast = time_response(bson_provider, lambda: documents) if orjson is not None else float('nan')
+        print(f"{name:<15}{flask_default:>15.1f}{stdlib:>12.1f}{fast:>12.1f}")
+
+    if orjson is None:
+        print("orjson is not installed; only the standard library encoder was measured.")
+
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,53 @@
+# load_test_task.py
+import os
+import threading
+import time
+import urllib.request
+from urllib.error import URLError
+
+# Target and shape of the load; see website/serve.py for how to compare servers.
+LOAD_TEST_URL = os.getenv('LOAD_TEST_URL', 'http://127.0.0.1:5000/offline')
+LOAD_TEST_CONCURRENCY = int(os.getenv('LOAD_TEST_CONCURRENCY', 32))
+LOAD_TEST_SECONDS = float(os.getenv('LOAD_TEST_SECONDS', 15))
+
+
+def _worker(deadline, latencies, errors, lock):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(LOAD_TEST_URL, timeout=30) as response:
+                response.read()
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+        except (URLError, OSError):
+            with lock:
+                errors.append(1)
+
+
+def run_load_test():
+    """Keeps LOAD_TEST_CONCURRENCY requests in flight for LOAD_TEST_SECONDS and reports throughput and latency."""
+    print(f"Load testing {LOAD_TEST_URL}: {LOAD_TEST_CONCURRENCY} concurrent clients for {LOAD_TEST_SECONDS:g}s...")
+    latencies, errors, lock = [], [], threading.Lock()
+    deadline = time.perf_counter() + LOAD_TEST_SECONDS
+    workers = [threading.Thread(target=_worker, args=(deadline, latencies, errors, lock))
+               for _ in range(LOAD_TEST_CONCURRENCY)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    duration = time.perf_counter() - started
+
+    if not latencies:
+        print(f"No successful requests ({len(errors)} errors).")
+        return
+    latencies.sort()
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+    print(f"Requests: {len(latencies)} ok, {len(errors)} failed")
+    print(f"Throughput: {len(latencies) / duration:.1f} requests/second")
+    print(f"Latency: p50 {percentile(0.5):.1f} ms, p95 {percentile(0.95):.1f} ms, p99 {percentile(0.99):.1f} ms")
+
+
+if __name__ == '__main__':
+    run_load_test()
@@ -7,4 +7,7 @@ from .activity import *
 from .notification import *
 from .analytics import *
 from .archive import *
-from .helpers import *
\ No newline at end of file
+from .helpers import *
+from .indexes import *
+from .events import *
+from .sync import *
\ No newline at end of file
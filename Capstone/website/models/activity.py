@@ -20,6 +20,21 @@ def log_user_activity(username, activity_type):
     except Exception as e:
         logger.error(f"Error logging user activity for {username}: {e}", exc_info=True)
 
+def get_activity_version(username):
+    """
+    Id of `username`'s newest activity log entry ('' if there is none). The
+    log is append-only, so the recent-activity list changes only when this
+    does (apart from its relative times). None if the database is unavailable.
+    """
+    db = current_app.db
+    if db is None: return None
+    try:
+        doc = db.activity_logs.find_one({'username': username}, {'_id': 1}, sort=[('timestamp', -1)])
+        return str(doc['_id']) if doc else ''
+    except Exception as e:
+        logger.error(f"Error reading activity version for {username}: {e}", exc_info=True)
+        return None
+
 def get_recent_activity(username, limit=10):
     db = current_app.db
     if db is None: return []
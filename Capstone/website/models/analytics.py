@@ -5,15 +5,29 @@ from datetime import datetime, timedelta
 import pytz
 from calendar import month_name, month_abbr
 from flask import current_app
+from .transaction import TRANSACTIONS_HISTORY
 
 logger = logging.getLogger(__name__)
 
+# Reports read through current_app.reporting_db, which prefers secondaries.
+
+
+def _paid_folders(match):
+    """
+    Pipeline stages selecting paid folders from both the live collection and
+    the history collection that old paid folders are moved into.
+    """
+    return [
+        {"$match": match},
+        {"$unionWith": {"coll": TRANSACTIONS_HISTORY, "pipeline": [{"$match": match}]}},
+    ]
+
 
 def get_analytics_data(username, branch, year, month):
     """
     Generates data for the main analytics chart. Bars reflect the total COVERED/COUNTERED amount.
     """
-    db = current_app.db
+    db = current_app.reporting_db
     if db is None:
         return {}
 
@@ -51,7 +65,7 @@ def get_analytics_data(username, branch, year, month):
         # 1. Monthly Breakdown — COUNTERED CHECK (Covered Debt)
         # ---------------------------------------------------------
         month_pipeline = [
-            {"$match": {**base_match, "paidAt": {"$gte": year_start, "$lt": year_end}}},
+            *_paid_folders({**base_match, "paidAt": {"$gte": year_start, "$lt": year_end}}),
             {
                 "$group": {
                     "_id": {"$month": "$paidAt"},
@@ -97,7 +111,7 @@ def get_analytics_data(username, branch, year, month):
         # 3. Weekly Breakdown for Selected Month
         # ---------------------------------------------------------
         weekly_pipeline = [
-            {"$match": {**base_match, "paidAt": {"$gte": month_start, "$lt": month_end}}},
+            *_paid_folders({**base_match, "paidAt": {"$gte": month_start, "$lt": month_end}}),
             {
                 "$project": {
                     "amount": "$countered_check",  # parent covered debt
@@ -180,7 +194,7 @@ def get_weekly_billing_summary(username, branch, year, week):
     - Countered Checks (Covered Debt)
     - Loans
     """
-    db = current_app.db
+    db = current_app.reporting_db
     if db is None:
         return {}
 
@@ -190,7 +204,7 @@ def get_weekly_billing_summary(username, branch, year, week):
         end_of_week = start_of_week + timedelta(days=7)
 
         # Parent folders (Paid)
-        parent_folders = list(db.transactions.find({
+        parent_folders = list(db.transactions.aggregate(_paid_folders({
             "username": username,
             "branch": branch,
             "status": "Paid",
@@ -200,7 +214,7 @@ def get_weekly_billing_summary(username, branch, year, week):
                 {"isArchived": {"$exists": False}},
                 {"isArchived": False},
             ],
-        }))
+        })))
 
         # Sum correct fields from parent folder
         total_check_amount = sum(folder.get("amount", 0) for folder in parent_folders) # Target Debt
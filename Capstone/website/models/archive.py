@@ -1,77 +1,367 @@
 # website/models/archive.py
 
+import base64
+import json
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 from bson.objectid import ObjectId
 from flask import current_app
+from pymongo import UpdateMany, DeleteMany
 from .helpers import format_relative_time
+from .transaction import recompute_folder_totals
+from .invoice import invoice_file_names, referenced_invoice_files
+from .events import ENTITY_INVOICE, ENTITY_TRANSACTION, EVENT_PROJECTION, record_changes, written_fields
+from ..utils.storage import get_storage
 
 logger = logging.getLogger(__name__)
 
-def restore_item(username, item_type, item_id):
+# Archivable item types and the collection each lives in. Checked instead of
+# asking the server for its collection names on every request.
+ARCHIVABLE_COLLECTIONS = {
+    'Transaction': 'transactions',
+    'Invoice': 'invoices',
+}
+
+# Change-event entity of each archivable collection.
+_COLLECTION_ENTITIES = {
+    'transactions': ENTITY_TRANSACTION,
+    'invoices': ENTITY_INVOICE,
+}
+
+ARCHIVE_PAGE_SIZE = 50
+
+# Most items accepted by one bulk archive/restore/delete request.
+ARCHIVE_BULK_LIMIT = 500
+
+def _archive_collection(item_type):
+    return ARCHIVABLE_COLLECTIONS.get((item_type or '').capitalize())
+
+def _group_items(items):
+    """Groups [{'type', 'id'}, ...] into {collection_name: [ObjectId, ...]}, skipping unknown types and bad ids."""
+    grouped = {}
+    for item in items:
+        collection_name = _archive_collection(item.get('type'))
+        item_id = str(item.get('id'))
+        if collection_name is None or not ObjectId.is_valid(item_id):
+            continue
+        ids = grouped.setdefault(collection_name, [])
+        if ObjectId(item_id) not in ids:
+            ids.append(ObjectId(item_id))
+    return grouped
+
+def _split_transactions(db, username, ids, archived_only=False):
+    """
+    Returns (folder_ids, parent_ids): the folders among `ids` and the folders
+    of the child checks among them. With `archived_only`, active documents
+    among `ids` are ignored.
+    """
+    query = {'_id': {'$in': ids}, 'username': username}
+    if archived_only:
+        query['isArchived'] = True
+    folder_ids, parent_ids = [], set()
+    for doc in db.transactions.find(query, {'parent_id': 1}):
+        if doc.get('parent_id') is None:
+            folder_ids.append(doc['_id'])
+        else:
+            parent_ids.add(doc['parent_id'])
+    return folder_ids, parent_ids
+
+def _recompute_parents(username, parent_ids, folder_ids):
+    # Folders that moved together with their children keep their totals.
+    for parent_id in parent_ids - set(folder_ids):
+        recompute_folder_totals(username, parent_id)
+
+def archive_items(username, items):
+    """
+    Archives a batch of items with one bulk_write per collection. Archiving
+    a folder also archives its active checks; those are flagged
+    archivedWithParent so restoring the folder brings back exactly them.
+    Folder totals are recomputed once per folder that lost a check.
+    Returns {'archived': count}, or None on error.
+    """
     db = current_app.db
-    if db is None: return False
-    collection_name = f"{item_type.lower()}s" 
-    if collection_name not in db.list_collection_names():
-        return False
+    if db is None: return None
+    now = datetime.now(pytz.utc)
+    archived = 0
     try:
-        result = db[collection_name].update_one(
-            {'_id': ObjectId(item_id), 'username': username},
-            {'$set': {'isArchived': False}, '$unset': {'archivedAt': ''}}
-        )
-        return result.modified_count == 1
+        for collection_name, ids in _group_items(items).items():
+            operations = [UpdateMany(
+                {'_id': {'$in': ids}, 'username': username, 'isArchived': {'$ne': True}},
+                {'$set': {'isArchived': True, 'archivedAt': now, 'updatedAt': now}}
+            )]
+            folder_ids, parent_ids = [], set()
+            if collection_name == 'transactions':
+                folder_ids, parent_ids = _split_transactions(db, username, ids)
+                if folder_ids:
+                    operations.append(UpdateMany(
+                        {'username': username, 'parent_id': {'$in': folder_ids}, 'isArchived': {'$ne': True}},
+                        {'$set': {'isArchived': True, 'archivedAt': now, 'archivedWithParent': True, 'updatedAt': now}}
+                    ))
+            archived += db[collection_name].bulk_write(operations, ordered=False).modified_count
+            # Everything this call archived carries exactly its timestamp.
+            record_changes(db, _COLLECTION_ENTITIES[collection_name], 'archive', db[collection_name].find(
+                {'username': username, 'archivedAt': now,
+                 '$or': [{'_id': {'$in': ids}}, {'parent_id': {'$in': folder_ids}}]},
+                EVENT_PROJECTION
+            ), ['isArchived', 'archivedAt', 'archivedWithParent', 'updatedAt'] if folder_ids
+               else ['isArchived', 'archivedAt', 'updatedAt'])
+            _recompute_parents(username, parent_ids, folder_ids)
     except Exception as e:
-        logger.error(f"Error restoring {item_type} {item_id}: {e}", exc_info=True)
-        return False
+        logger.error(f"Error bulk archiving items for {username}: {e}", exc_info=True)
+        return None
+    return {'archived': archived}
 
-def delete_item_permanently(username, item_type, item_id):
+def restore_items(username, items):
+    """
+    Restores a batch of archived items with one bulk_write per collection.
+    Restoring a folder also restores the checks that were archived with it.
+    Returns {'restored': count}, or None on error.
+    """
     db = current_app.db
-    if db is None: return False
-    collection_name = f"{item_type.lower()}s"
-    if collection_name not in db.list_collection_names():
-        return False
+    if db is None: return None
+    restore = {'$set': {'isArchived': False, 'updatedAt': datetime.now(pytz.utc)},
+               '$unset': {'archivedAt': '', 'archivedWithParent': ''}}
+    restored = 0
     try:
-        result = db[collection_name].delete_one({'_id': ObjectId(item_id), 'username': username})
-        return result.deleted_count == 1
+        for collection_name, ids in _group_items(items).items():
+            operations = [UpdateMany({'_id': {'$in': ids}, 'username': username, 'isArchived': True}, restore)]
+            folder_ids, parent_ids = [], set()
+            if collection_name == 'transactions':
+                folder_ids, parent_ids = _split_transactions(db, username, ids)
+                if folder_ids:
+                    operations.append(UpdateMany(
+                        {'username': username, 'parent_id': {'$in': folder_ids}, 'archivedWithParent': True},
+                        restore
+                    ))
+            changed = list(db[collection_name].find({'username': username, '$or': [
+                {'_id': {'$in': ids}, 'isArchived': True},
+                {'parent_id': {'$in': folder_ids}, 'archivedWithParent': True}
+            ]}, EVENT_PROJECTION))
+            restored += db[collection_name].bulk_write(operations, ordered=False).modified_count
+            record_changes(db, _COLLECTION_ENTITIES[collection_name], 'restore', changed,
+                           written_fields(restore))
+            _recompute_parents(username, parent_ids, folder_ids)
     except Exception as e:
-        logger.error(f"Error permanently deleting {item_type} {item_id}: {e}", exc_info=True)
-        return False
+        logger.error(f"Error bulk restoring items for {username}: {e}", exc_info=True)
+        return None
+    return {'restored': restored}
 
-def get_archived_items(username):
+def _release_invoice_files(names):
+    """Deletes the stored invoice files that no remaining invoice points at. Returns how many were removed."""
+    if not names: return 0
+    storage = get_storage()
+    removed = 0
+    for name in set(names) - referenced_invoice_files(names):
+        if storage.delete('invoices', name):
+            removed += 1
+    return removed
+
+def delete_items_permanently(username, items):
+    """
+    Permanently deletes a batch of archived items with one bulk_write per
+    collection. Deleting a folder deletes all of its checks, and invoice
+    files are removed once nothing references them any more.
+    Returns {'deleted': count}, or None on error.
+    """
     db = current_app.db
-    if db is None: return []
-    items = []
-    collections_to_check = ['transactions', 'invoices']
-    for collection_name in collections_to_check:
+    if db is None: return None
+    deleted = 0
+    try:
+        for collection_name, ids in _group_items(items).items():
+            query = {'_id': {'$in': ids}, 'username': username, 'isArchived': True}
+            operations = [DeleteMany(query)]
+            file_names = set()
+            folder_ids = []
+            if collection_name == 'transactions':
+                # Only folders that are themselves archived take their checks with them.
+                folder_ids, _ = _split_transactions(db, username, ids, archived_only=True)
+                if folder_ids:
+                    operations.append(DeleteMany({'username': username, 'parent_id': {'$in': folder_ids}}))
+            elif collection_name == 'invoices':
+                for doc in db.invoices.find(query, {'files.filename': 1, 'pages.thumbnail': 1, 'pages.preview': 1}):
+                    file_names |= invoice_file_names(doc)
+            changed = list(db[collection_name].find(
+                {'$or': [query, {'username': username, 'parent_id': {'$in': folder_ids}}]}, EVENT_PROJECTION
+            ))
+            deleted += db[collection_name].bulk_write(operations, ordered=False).deleted_count
+            record_changes(db, _COLLECTION_ENTITIES[collection_name], 'delete', changed)
+            _release_invoice_files(file_names)
+    except Exception as e:
+        logger.error(f"Error bulk deleting items for {username}: {e}", exc_info=True)
+        return None
+    return {'deleted': deleted}
+
+def purge_expired_archive(retention_days, batch_size=500):
+    """
+    Permanently deletes everything that has been in the archive for more
+    than `retention_days`, oldest first, `batch_size` documents per
+    bulk_write. Checks of purged folders go with them, and invoice files
+    are removed once no invoice references them.
+    Returns {'transactions': n, 'invoices': n, 'files': n}.
+    """
+    db = current_app.db
+    counts = {collection_name: 0 for collection_name in ARCHIVABLE_COLLECTIONS.values()}
+    counts['files'] = 0
+    if db is None or retention_days <= 0: return counts
+
+    expired = {'isArchived': True, 'archivedAt': {'$lt': datetime.now(pytz.utc) - timedelta(days=retention_days)}}
+    for collection_name in ARCHIVABLE_COLLECTIONS.values():
+        if collection_name == 'invoices':
+            projection = {'files.filename': 1, 'pages.thumbnail': 1, 'pages.preview': 1, **EVENT_PROJECTION}
+        else:
+            projection = {'parent_id': 1, **EVENT_PROJECTION}
+        while True:
+            docs = list(db[collection_name].find(expired, projection).sort('archivedAt', 1).limit(batch_size))
+            if not docs:
+                break
+            # The expiry condition is repeated so an item restored meanwhile survives.
+            operations = [DeleteMany({'_id': {'$in': [doc['_id'] for doc in docs]}, **expired})]
+            changed = list(docs)
+            if collection_name == 'transactions':
+                folder_ids = [doc['_id'] for doc in docs if doc.get('parent_id') is None]
+                if folder_ids:
+                    operations.append(DeleteMany({'parent_id': {'$in': folder_ids}}))
+                    changed += db.transactions.find(
+                        {'parent_id': {'$in': folder_ids}, '_id': {'$nin': [doc['_id'] for doc in docs]}}, EVENT_PROJECTION
+                    )
+            counts[collection_name] += db[collection_name].bulk_write(operations, ordered=False).deleted_count
+            record_changes(db, _COLLECTION_ENTITIES[collection_name], 'delete', changed)
+            if collection_name == 'invoices':
+                counts['files'] += _release_invoice_files(set().union(*(invoice_file_names(doc) for doc in docs)))
+            if len(docs) < batch_size:
+                break
+    return counts
+
+def sweep_orphaned_files(grace_hours, chunk_max_age_hours, batch_size=500):
+    """
+    Removes invoice files that no invoice references, e.g. left behind by
+    deletions before file cleanup existed or by interrupted uploads, plus
+    chunks of uploads that were never assembled. Files younger than
+    `grace_hours` are skipped so uploads in flight are not touched.
+    Returns {'orphans': n, 'chunks': n}.
+    """
+    storage = get_storage()
+    now = datetime.now(pytz.utc)
+    counts = {'orphans': 0, 'chunks': 0}
+
+    candidates = [name for name, uploaded in storage.iter_files('invoices')
+                  if uploaded is None or uploaded < now - timedelta(hours=grace_hours)]
+    for start in range(0, len(candidates), batch_size):
+        counts['orphans'] += _release_invoice_files(candidates[start:start + batch_size])
+
+    stale_chunks = [name for name, uploaded in storage.iter_files('upload_chunks')
+                    if uploaded is None or uploaded < now - timedelta(hours=chunk_max_age_hours)]
+    for name in stale_chunks:
+        if storage.delete('upload_chunks', name):
+            counts['chunks'] += 1
+    return counts
+
+def restore_item(username, item_type, item_id):
+    result = restore_items(username, [{'type': item_type, 'id': item_id}])
+    return bool(result and result['restored'])
+
+def delete_item_permanently(username, item_type, item_id):
+    result = delete_items_permanently(username, [{'type': item_type, 'id': item_id}])
+    return bool(result and result['deleted'])
+
+def _encode_archive_cursor(archived_at, doc_id):
+    raw = json.dumps({'t': archived_at.isoformat() if archived_at else None, 'i': str(doc_id)}).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def _decode_archive_cursor(cursor):
+    data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    archived_at = datetime.fromisoformat(data['t']) if data['t'] else None
+    return archived_at, ObjectId(data['i'])
+
+def _archive_branch(username, item_type, after, limit):
+    """Pipeline for one collection: its archived items, newest first, after the cursor."""
+    match = {'username': username, 'isArchived': True}
+    if after is not None:
+        archived_at, last_id = after
+        if archived_at is None:
+            # Already into the items without an archivedAt, which sort last.
+            match['archivedAt'] = None
+            match['_id'] = {'$lt': last_id}
+        else:
+            match['$or'] = [
+                {'archivedAt': {'$lt': archived_at}},
+                {'archivedAt': archived_at, '_id': {'$lt': last_id}},
+                {'archivedAt': None}
+            ]
+    return [
+        {'$match': match},
+        {'$sort': {'archivedAt': -1, '_id': -1}},
+        {'$limit': limit},
+        {'$project': {
+            'name': {'$ifNull': ['$name', {'$ifNull': ['$folder_name', 'Archived Item']}]},
+            'parent_id': 1,
+            'archivedAt': 1,
+            'type': {'$literal': item_type}
+        }}
+    ]
+
+def get_archived_items(username, cursor=None, limit=ARCHIVE_PAGE_SIZE):
+    """
+    One page of the user's archive across every archivable collection.
+
+    A single aggregation unions the collections with $unionWith. Each branch
+    is already sorted and limited on its archive index, and the merged
+    stream is sorted and cut server-side. Pages are keyed on
+    (archivedAt, _id). Returns {'items': [...], 'next_cursor': str or None},
+    or None if the cursor is invalid.
+    """
+    # Listing tolerates a slightly stale view, so it can read from a secondary.
+    db = current_app.reporting_db
+    if db is None: return {'items': [], 'next_cursor': None}
+
+    after = None
+    if cursor:
         try:
-            for doc in db[collection_name].find({'username': username, 'isArchived': True}):
-                # Base item structure
-                item = {
-                    'id': str(doc['_id']),
-                    'name': doc.get('name') or doc.get('folder_name', 'Archived Item'),
-                    'type': collection_name.rstrip('s').capitalize(), # 'Transaction' or 'Invoice' for API calls
-                    'details': f"Archived on {doc.get('archivedAt', datetime.now(pytz.utc)).strftime('%Y-%m-%d')}",
-                    'archived_at_str': doc.get('archivedAt').strftime('%m/%d/%Y') if doc.get('archivedAt') else 'N/A',
-                    'relative_time': format_relative_time(doc.get('archivedAt')) if doc.get('archivedAt') else 'N/A',
-                    'archivedAt': doc.get('archivedAt') # Keep the datetime object for sorting
-                }
-
-                # Add a separate key for display purposes to differentiate folders from files
-                if item['type'] == 'Transaction':
-                    if doc.get('parent_id') is not None:
-                        item['display_category'] = 'File' # This is an individual check
-                    else:
-                        item['display_category'] = 'Folder' # This is a transaction folder
-                elif item['type'] == 'Invoice':
-                    item['display_category'] = 'Image'
-                else:
-                    item['display_category'] = item['type'] # Fallback
-
-                items.append(item)
-        except Exception as e:
-            logger.error(f"Error fetching archived items from {collection_name} for {username}: {e}")
-    
-    # Sort by archiving time after all items have been collected
-    items.sort(key=lambda x: x.get('archivedAt') or datetime.now(pytz.utc), reverse=True)
-    return items
\ No newline at end of file
+            after = _decode_archive_cursor(cursor)
+        except Exception:
+            return None
+
+    (first_type, first_collection), *others = ARCHIVABLE_COLLECTIONS.items()
+    pipeline = _archive_branch(username, first_type, after, limit + 1)
+    for item_type, collection_name in others:
+        pipeline.append({'$unionWith': {
+            'coll': collection_name,
+            'pipeline': _archive_branch(username, item_type, after, limit + 1)
+        }})
+    pipeline += [
+        {'$sort': {'archivedAt': -1, '_id': -1}},
+        {'$limit': limit + 1}
+    ]
+
+    items = []
+    next_cursor = None
+    try:
+        docs = list(db[first_collection].aggregate(pipeline))
+        if len(docs) > limit:
+            docs = docs[:limit]
+            next_cursor = _encode_archive_cursor(docs[-1].get('archivedAt'), docs[-1]['_id'])
+        for doc in docs:
+            archived_at = doc.get('archivedAt')
+            item = {
+                'id': str(doc['_id']),
+                'name': doc['name'],
+                'type': doc['type'], # 'Transaction' or 'Invoice' for API calls
+                'details': f"Archived on {archived_at.strftime('%Y-%m-%d')}" if archived_at else 'Archived',
+                'archived_at_str': archived_at.strftime('%m/%d/%Y') if archived_at else 'N/A',
+                'relative_time': format_relative_time(archived_at) if archived_at else 'N/A',
+                'archivedAt': archived_at
+            }
+
+            # Add a separate key for display purposes to differentiate folders from files
+            if item['type'] == 'Transaction':
+                item['display_category'] = 'File' if doc.get('parent_id') is not None else 'Folder'
+            elif item['type'] == 'Invoice':
+                item['display_category'] = 'Image'
+            else:
+                item['display_category'] = item['type'] # Fallback
+
+            items.append(item)
+    except Exception as e:
+        logger.error(f"Error fetching archived items for {username}: {e}", exc_info=True)
+    return {'items': items, 'next_cursor': next_cursor}
@@ -0,0 +1,183 @@
+# website/models/events.py
+
+import logging
+from datetime import datetime, timedelta
+import pytz
+from flask import current_app
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+# Append-only outbox of changes to transactions, loans, invoices and
+# schedules. Every event gets the next value of a single counter, so
+# consumers can read everything after the last sequence they handled.
+CHANGE_EVENTS = 'change_events'
+CHANGE_EVENT_CHECKPOINTS = 'change_event_checkpoints'
+_SEQUENCE_ID = 'change_events'
+
+ENTITY_TRANSACTION = 'transaction'
+ENTITY_LOAN = 'loan'
+ENTITY_INVOICE = 'invoice'
+ENTITY_SCHEDULE = 'schedule'
+ENTITY_NOTIFICATION = 'notification'
+
+# Sequence numbers are reserved before the events are inserted, so a
+# concurrent writer can briefly leave a hole. Readers wait this long for a
+# hole to fill before treating it as a write that never happened.
+CHANGE_EVENT_GAP_SECONDS = 5
+
+# Fields the outbox needs from a changed document.
+EVENT_PROJECTION = {'username': 1, 'branch': 1}
+
+
+def _reserve_sequences(db, count):
+    """Reserves `count` consecutive sequence numbers and returns the first."""
+    counter = db.counters.find_one_and_update(
+        {'_id': _SEQUENCE_ID},
+        {'$inc': {'seq': count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter['seq'] - count + 1
+
+
+def record_changes(db, entity, op, docs, fields=()):
+    """
+    Appends one change event per document in `docs` (each needs _id,
+    username and branch, e.g. fetched with EVENT_PROJECTION). `op` is one of
+    insert/update/archive/restore/delete/move and `fields` names the fields
+    the operation wrote. Called right after the write it describes; a
+    failure is logged and never undoes or fails that write.
+    """
+    docs = list(docs)
+    if db is None or not docs:
+        return
+    try:
+        first_seq = _reserve_sequences(db, len(docs))
+        now = datetime.now(pytz.utc)
+        changed_fields = sorted(set(fields))
+        db[CHANGE_EVENTS].insert_many([{
+            'seq': first_seq + offset,
+            'entity': entity,
+            'entity_id': doc['_id'],
+            'username': doc.get('username'),
+            'branch': doc.get('branch'),
+            'op': op,
+            'fields': changed_fields,
+            'createdAt': now
+        } for offset, doc in enumerate(docs)])
+    except Exception as e:
+        logger.error(f"Error recording {entity} {op} events: {e}", exc_info=True)
+
+
+def record_change(db, entity, op, doc, fields=()):
+    """record_changes for a single document."""
+    if doc:
+        record_changes(db, entity, op, [doc], fields)
+
+
+def written_fields(update):
+    """Field names written by an update document ($set/$unset/$inc...)."""
+    return [field for operator in update.values() if isinstance(operator, dict) for field in operator]
+
+
+def get_data_version(username, entities):
+    """
+    Sequence number of `username`'s latest change event for any of
+    `entities` (0 if there is none). It grows with every change to that
+    data, so it serves as a cheap validator for responses built from it.
+    Returns None if the database is unavailable.
+    """
+    db = current_app.db
+    if db is None: return None
+    try:
+        doc = db[CHANGE_EVENTS].find_one(
+            {'username': username, 'entity': {'$in': list(entities)}},
+            {'_id': 0, 'seq': 1},
+            sort=[('seq', -1)]
+        )
+        return doc['seq'] if doc else 0
+    except Exception as e:
+        logger.error(f"Error reading data version for {username}: {e}", exc_info=True)
+        return None
+
+
+# =========================================================
+# CONSUMER API
+# =========================================================
+def read_change_events(after_seq=0, entities=None, limit=500):
+    """
+    Returns up to `limit` events with a sequence number above `after_seq`,
+    oldest first, optionally only for the given entity types. Reading stops
+    at a sequence hole that is younger than CHANGE_EVENT_GAP_SECONDS, so a
+    consumer never checkpoints past an event that is still being written.
+    """
+    db = current_app.db
+    if db is None: return []
+    query = {'seq': {'$gt': after_seq}}
+    try:
+        events = list(db[CHANGE_EVENTS].find(query, {'_id': 0}).sort('seq', 1).limit(limit))
+    except Exception as e:
+        logger.error(f"Error reading change events after {after_seq}: {e}", exc_info=True)
+        return []
+
+    settled_before = datetime.now(pytz.utc) - timedelta(seconds=CHANGE_EVENT_GAP_SECONDS)
+    expected = after_seq + 1
+    ready = []
+    for event in events:
+        if event['seq'] != expected:
+            created = event['createdAt']
+            if created.tzinfo is None:
+                created = pytz.utc.localize(created)
+            if created > settled_before:
+                break
+        expected = event['seq'] + 1
+        ready.append(event)
+    if entities:
+        ready = [event for event in ready if event['entity'] in entities]
+    return ready
+
+
+def get_change_checkpoint(consumer):
+    """Last sequence number `consumer` has handled (0 if it never ran)."""
+    db = current_app.db
+    if db is None: return 0
+    doc = db[CHANGE_EVENT_CHECKPOINTS].find_one({'_id': consumer})
+    return doc['seq'] if doc else 0
+
+
+def save_change_checkpoint(consumer, seq):
+    """Moves `consumer`'s checkpoint forward to `seq`; it never moves back."""
+    db = current_app.db
+    if db is None: return False
+    db[CHANGE_EVENT_CHECKPOINTS].update_one(
+        {'_id': consumer},
+        {'$max': {'seq': seq}, '$set': {'updatedAt': datetime.now(pytz.utc)}},
+        upsert=True
+    )
+    return True
+
+
+def consume_change_events(consumer, handler, entities=None, batch_size=500):
+    """
+    Feeds every event after `consumer`'s checkpoint to `handler` in batches
+    and advances the checkpoint after each batch the handler accepted.
+    Delivery is at-least-once: if the handler raises, the batch is offered
+    again on the next run. Returns the number of events handled.
+    """
+    checkpoint = get_change_checkpoint(consumer)
+    handled = 0
+    while True:
+        events = read_change_events(checkpoint, limit=batch_size)
+        if not events:
+            break
+        last_seq = events[-1]['seq']
+        matching = [event for event in events if not entities or event['entity'] in entities]
+        if matching:
+            handler(matching)
+            handled += len(matching)
+        save_change_checkpoint(consumer, last_seq)
+        checkpoint = last_seq
+        if len(events) < batch_size:
+            break
+    return handled
@@ -0,0 +1,122 @@
+# website/models/indexes.py
+
+import logging
+from pymongo import ASCENDING, DESCENDING, TEXT
+
+logger = logging.getLogger(__name__)
+
+INVOICE_TEXT_INDEX = 'invoice_text_search'
+
+
+def ensure_indexes(db):
+    """
+    Creates the indexes the model queries rely on. create_index is a no-op
+    when an identical index already exists, so this is safe on every start.
+    """
+    if db is None: return
+    try:
+        # Full-text search over invoice OCR text. The username prefix lets
+        # every per-user $text query use an equality-bounded index scan.
+        # search_text holds the words of compressed OCR text; extracted_text
+        # stays indexed for documents not yet migrated.
+        text_weights = {'folder_name': 10, 'category': 5, 'search_text': 1, 'extracted_text': 1}
+        existing = db.invoices.index_information().get(INVOICE_TEXT_INDEX)
+        if existing and existing.get('weights') != text_weights:
+            db.invoices.drop_index(INVOICE_TEXT_INDEX)
+        db.invoices.create_index(
+            [('username', ASCENDING), ('folder_name', TEXT), ('category', TEXT),
+             ('search_text', TEXT), ('extracted_text', TEXT)],
+            weights=text_weights,
+            default_language='english',
+            name=INVOICE_TEXT_INDEX
+        )
+
+        # Structured receipt attributes from the OCR extraction stage. Partial
+        # indexes skip invoices the extractor found nothing for.
+        for field, direction in (('total_amount', DESCENDING), ('receipt_date', DESCENDING),
+                                 ('vendor_tin', ASCENDING), ('or_number', ASCENDING)):
+            db.invoices.create_index(
+                [('username', ASCENDING), (field, direction)],
+                partialFilterExpression={field: {'$exists': True}},
+                name=f"invoice_{field}"
+            )
+    except Exception as e:
+        logger.error(f"Error creating invoice indexes: {e}", exc_info=True)
+
+    try:
+        # Archive listing: each $unionWith branch of get_archived_items walks
+        # this index newest-first and stops after one page.
+        for collection_name in ('transactions', 'invoices'):
+            db[collection_name].create_index(
+                [('username', ASCENDING), ('archivedAt', DESCENDING), ('_id', DESCENDING)],
+                partialFilterExpression={'isArchived': True},
+                name='archive_listing'
+            )
+            # Retention purge: finds expired archive entries across all users.
+            db[collection_name].create_index(
+                [('archivedAt', ASCENDING)],
+                partialFilterExpression={'isArchived': True},
+                name='archive_expiry'
+            )
+
+        # File reference checks made before deleting an invoice's files.
+        for field in ('files.filename', 'pages.thumbnail', 'pages.preview'):
+            db.invoices.create_index([(field, ASCENDING)], name=f"invoice_ref_{field.replace('.', '_')}")
+    except Exception as e:
+        logger.error(f"Error creating archive indexes: {e}", exc_info=True)
+
+    try:
+        # Paid folders moved out of the live collection. Folder checks are
+        # looked up by parent; rollups and the Paid list filter by branch,
+        # status and paid date.
+        db.transactions_history.create_index(
+            [('username', ASCENDING), ('parent_id', ASCENDING), ('createdAt', ASCENDING)],
+            name='history_children'
+        )
+        db.transactions_history.create_index(
+            [('username', ASCENDING), ('branch', ASCENDING), ('status', ASCENDING), ('paidAt', ASCENDING)],
+            name='history_paid'
+        )
+        # The history move scans the live collection for old paid folders.
+        db.transactions.create_index(
+            [('paidAt', ASCENDING)],
+            partialFilterExpression={'status': 'Paid'},
+            name='paid_folder_age'
+        )
+    except Exception as e:
+        logger.error(f"Error creating transaction history indexes: {e}", exc_info=True)
+
+    try:
+        # Change-event outbox: consumers read forward by sequence number.
+        db.change_events.create_index([('seq', ASCENDING)], unique=True, name='change_event_seq')
+        db.change_events.create_index(
+            [('entity', ASCENDING), ('entity_id', ASCENDING), ('seq', ASCENDING)],
+            name='change_event_entity'
+        )
+        # Per-user data versions used as HTTP validators.
+        db.change_events.create_index(
+            [('username', ASCENDING), ('entity', ASCENDING), ('seq', DESCENDING)],
+            name='change_event_user'
+        )
+        # Moves and deletes since a delta sync token (get_transaction_changes).
+        db.change_events.create_index(
+            [('username', ASCENDING), ('entity', ASCENDING), ('createdAt', ASCENDING)],
+            name='change_event_user_time'
+        )
+        db.activity_logs.create_index(
+            [('username', ASCENDING), ('timestamp', DESCENDING)],
+            name='activity_recent'
+        )
+    except Exception as e:
+        logger.error(f"Error creating change event indexes: {e}", exc_info=True)
+
+    try:
+        # Delta sync pages through a user's transactions by (updatedAt, _id);
+        # the initial snapshot pages by _id.
+        db.transactions.create_index(
+            [('username', ASCENDING), ('updatedAt', ASCENDING), ('_id', ASCENDING)],
+            name='sync_updated'
+        )
+        db.transactions.create_index([('username', ASCENDING), ('_id', ASCENDING)], name='sync_snapshot')
+    except Exception as e:
+        logger.error(f"Error creating sync indexes: {e}", exc_info=True)
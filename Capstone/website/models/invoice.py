@@ -1,28 +1,91 @@
 # website/models/invoice.py
 
+import base64
+import html
+import json
 import logging
+import re
+import zlib
 from datetime import datetime
 import pytz
+from bson.binary import Binary
 from bson.objectid import ObjectId
 from flask import current_app
+from .events import ENTITY_INVOICE, EVENT_PROJECTION, record_change
 
 logger = logging.getLogger(__name__)
 
-def add_invoice(username, branch, invoice_data, files, extracted_text):
+SEARCH_SNIPPET_LENGTH = 200
+SEARCH_SNIPPET_LEAD = 60
+
+# Code points of OCR text per stored (compressed) chunk, which is also the
+# page size of the text endpoint.
+INVOICE_TEXT_PAGE_SIZE = 16000
+INVOICE_TEXT_COMPRESSION_LEVEL = 6
+
+# Words kept in search_text: at least SEARCH_WORD_MIN_LENGTH characters, and
+# numbers only from SEARCH_NUMBER_MIN_LENGTH digits (OR numbers, TINs,
+# amounts), which drops most OCR noise, quantities and page numbers.
+SEARCH_WORD_MIN_LENGTH = 3
+SEARCH_NUMBER_MIN_LENGTH = 4
+
+# Typed attributes written by the post-OCR extraction stage.
+INVOICE_EXTRACTED_FIELDS = ('total_amount', 'vat_amount', 'receipt_date', 'vendor_tin', 'or_number')
+
+def compressed_text_fields(text):
+    """
+    Builds the stored form of an invoice's OCR text:
+      - extracted_text_z: zlib-compressed UTF-8 chunks of INVOICE_TEXT_PAGE_SIZE
+        code points, so one page can be read without inflating the rest
+      - extracted_text_size: length of the text in code points
+      - search_text: the distinct lower-cased words worth searching for (see
+        SEARCH_WORD_MIN_LENGTH), which is all the $text index needs. It is
+        stored uncompressed because $text cannot index compressed data, so
+        it is the one part of the OCR output that still costs working set.
+    """
+    text = text or ''
+    chunks = [
+        Binary(zlib.compress(text[i:i + INVOICE_TEXT_PAGE_SIZE].encode('utf-8'), INVOICE_TEXT_COMPRESSION_LEVEL))
+        for i in range(0, len(text), INVOICE_TEXT_PAGE_SIZE)
+    ]
+    return {
+        'extracted_text_z': chunks,
+        'extracted_text_size': len(text),
+        'search_text': ' '.join(dict.fromkeys(
+            word for word in re.findall(r'\w+', text.lower())
+            if len(word) >= (SEARCH_NUMBER_MIN_LENGTH if word.isdigit() else SEARCH_WORD_MIN_LENGTH)
+        ))
+    }
+
+def get_extracted_text(doc):
+    """Returns the OCR text of an invoice document in either the compressed or the legacy plain form."""
+    if doc.get('extracted_text_z') is not None:
+        return ''.join(zlib.decompress(bytes(chunk)).decode('utf-8') for chunk in doc['extracted_text_z'])
+    return doc.get('extracted_text') or ''
+
+def add_invoice(username, branch, invoice_data, files, extracted_text, extracted_fields=None, pages=None):
     db = current_app.db
     if db is None: return False
     try:
-        db.invoices.insert_one({
+        doc = {
             'username': username,
             'branch': branch,
             'folder_name': invoice_data.get('folder_name'),
             'category': invoice_data.get('category'),
             'date': invoice_data.get('date'),
             'files': files,
-            'extracted_text': extracted_text,
             'createdAt': datetime.now(pytz.utc),
             'isArchived': False
-        })
+        }
+        doc.update(compressed_text_fields(extracted_text))
+        if pages is not None:
+            # Per-page preview/thumbnail names and [text_start, text_end) offsets into extracted_text
+            doc['pages'] = pages
+        if extracted_fields is not None:
+            doc.update({k: v for k, v in extracted_fields.items() if k in INVOICE_EXTRACTED_FIELDS})
+            doc['fieldsExtractedAt'] = datetime.now(pytz.utc)
+        db.invoices.insert_one(doc)
+        record_change(db, ENTITY_INVOICE, 'insert', doc, [field for field in doc if field != '_id'])
         return True
     except Exception as e:
         logger.error(f"Error adding invoice for {username}: {e}", exc_info=True)
@@ -54,14 +117,98 @@ def get_invoice_by_id(username, invoice_id):
     if db is None: return None
     try:
         query = {'_id': ObjectId(invoice_id), 'username': username}
-        invoice = db.invoices.find_one(query)
+        invoice = db.invoices.find_one(query, {'search_text': 0})
         if invoice:
-            invoice['_id'] = str(invoice['_id'])
+            invoice['extracted_text'] = get_extracted_text(invoice)
+            invoice.pop('extracted_text_z', None)
         return invoice
     except Exception as e:
         logger.error(f"Error fetching invoice {invoice_id}: {e}", exc_info=True)
         return None
 
+def get_invoice_details(username, invoice_id):
+    """
+    Same as get_invoice_by_id but without the OCR text. Only its length in
+    code points ('extracted_text_size') and the number of text pages
+    ('text_pages') are returned; the text itself is fetched page by page
+    with get_invoice_text_page.
+    """
+    db = current_app.db
+    if db is None: return None
+    try:
+        pipeline = [
+            {'$match': {'_id': ObjectId(invoice_id), 'username': username}},
+            {'$addFields': {'extracted_text_size': {'$ifNull': [
+                '$extracted_text_size',
+                {'$strLenCP': {'$ifNull': ['$extracted_text', '']}}
+            ]}}},
+            {'$project': {'extracted_text': 0, 'extracted_text_z': 0, 'search_text': 0}}
+        ]
+        invoice = next(db.invoices.aggregate(pipeline), None)
+        if invoice:
+            invoice['text_pages'] = -(-invoice['extracted_text_size'] // INVOICE_TEXT_PAGE_SIZE)
+        return invoice
+    except Exception as e:
+        logger.error(f"Error fetching invoice details {invoice_id}: {e}", exc_info=True)
+        return None
+
+def get_invoice_text_page(username, invoice_id, page=1):
+    """
+    Returns one page (1-based) of an invoice's OCR text as
+    {'page', 'text_pages', 'size', 'text'}. Only the compressed chunk for
+    that page is read from the database. Returns None if the invoice does
+    not exist.
+    """
+    db = current_app.db
+    if db is None: return None
+    try:
+        doc = db.invoices.find_one(
+            {'_id': ObjectId(invoice_id), 'username': username},
+            {'extracted_text_z': {'$slice': [page - 1, 1]}, 'extracted_text_size': 1, 'extracted_text': 1}
+        )
+        if doc is None:
+            return None
+        if doc.get('extracted_text_z') is not None:
+            size = doc.get('extracted_text_size', 0)
+            text = get_extracted_text(doc)
+        else:
+            # Not yet migrated to compressed storage.
+            legacy = doc.get('extracted_text') or ''
+            size = len(legacy)
+            text = legacy[(page - 1) * INVOICE_TEXT_PAGE_SIZE:page * INVOICE_TEXT_PAGE_SIZE]
+        return {
+            'page': page,
+            'text_pages': -(-size // INVOICE_TEXT_PAGE_SIZE),
+            'size': size,
+            'text': text
+        }
+    except Exception as e:
+        logger.error(f"Error fetching text page {page} of invoice {invoice_id}: {e}", exc_info=True)
+        return None
+
+def invoice_file_names(doc):
+    """Every stored file an invoice document points at: uploads plus page previews and thumbnails."""
+    names = {f.get('filename') for f in doc.get('files') or []}
+    for page in doc.get('pages') or []:
+        names.update((page.get('thumbnail'), page.get('preview')))
+    names.discard(None)
+    return names
+
+def referenced_invoice_files(names):
+    """The subset of `names` that some invoice still points at."""
+    db = current_app.db
+    names = list(names)
+    if db is None or not names: return set(names)
+    query = {'$or': [
+        {'files.filename': {'$in': names}},
+        {'pages.thumbnail': {'$in': names}},
+        {'pages.preview': {'$in': names}}
+    ]}
+    referenced = set()
+    for doc in db.invoices.find(query, {'files.filename': 1, 'pages.thumbnail': 1, 'pages.preview': 1}):
+        referenced |= invoice_file_names(doc)
+    return referenced & set(names)
+
 def archive_invoice(username, invoice_id):
     db = current_app.db
     if db is None: return False
@@ -70,7 +217,114 @@ def archive_invoice(username, invoice_id):
             {'_id': ObjectId(invoice_id), 'username': username},
             {'$set': {'isArchived': True, 'archivedAt': datetime.now(pytz.utc)}}
         )
+        if result.modified_count == 1:
+            record_change(db, ENTITY_INVOICE, 'archive',
+                          db.invoices.find_one({'_id': ObjectId(invoice_id)}, EVENT_PROJECTION),
+                          ['isArchived', 'archivedAt'])
         return result.modified_count == 1
     except Exception as e:
         logger.error(f"Error archiving invoice {invoice_id}: {e}", exc_info=True)
-        return False
\ No newline at end of file
+        return False
+
+def _search_terms(query):
+    """Plain lowercase terms from a $text query string (negations and quotes removed)."""
+    terms = []
+    for token in re.findall(r'-?"[^"]*"|\S+', query):
+        if token.startswith('-'):
+            continue
+        token = token.strip('"').lower()
+        if token:
+            terms.append(token)
+    return terms
+
+def _encode_search_cursor(score, doc_id):
+    raw = json.dumps({'s': score, 'i': str(doc_id)}).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def _decode_search_cursor(cursor):
+    data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    return float(data['s']), ObjectId(data['i'])
+
+def _highlight(snippet, terms):
+    """HTML-escapes the snippet and wraps every term occurrence in <mark>."""
+    escaped = html.escape(snippet)
+    if not terms:
+        return escaped
+    pattern = re.compile('|'.join(re.escape(html.escape(t)) for t in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    return pattern.sub(lambda m: f"<mark>{m.group(0)}</mark>", escaped)
+
+def _snippet(text, terms):
+    """A SEARCH_SNIPPET_LENGTH window of text starting a little before the first matching term."""
+    lower = text.lower()
+    hits = [pos for pos in (lower.find(term) for term in terms) if pos >= 0]
+    start = max(0, min(hits) - SEARCH_SNIPPET_LEAD) if hits else 0
+    return text[start:start + SEARCH_SNIPPET_LENGTH]
+
+def search_invoices(username, branch, query, cursor=None, limit=20):
+    """
+    Ranked full-text search over invoice OCR text, folder name and category.
+
+    Results are ordered by text score and paged with a keyset cursor on
+    (score, _id). Snippets are cut from the first compressed chunk
+    (INVOICE_TEXT_PAGE_SIZE code points) of each returned invoice only, so a
+    match further into a long invoice shows its opening text. Returns {'results': [...], 'next_cursor': str or None},
+    or None if the cursor is invalid.
+    """
+    db = current_app.db
+    if db is None: return {'results': [], 'next_cursor': None}
+
+    terms = _search_terms(query)
+    match = {
+        '$text': {'$search': query},
+        'username': username,
+        '$or': [{'isArchived': {'$exists': False}}, {'isArchived': False}]
+    }
+    if branch:
+        match['branch'] = branch
+
+    pipeline = [
+        {'$match': match},
+        {'$addFields': {'score': {'$meta': 'textScore'}}},
+    ]
+    if cursor:
+        try:
+            last_score, last_id = _decode_search_cursor(cursor)
+        except Exception:
+            return None
+        pipeline.append({'$match': {'$or': [
+            {'score': {'$lt': last_score}},
+            {'score': last_score, '_id': {'$lt': last_id}}
+        ]}})
+
+    pipeline += [
+        {'$sort': {'score': -1, '_id': -1}},
+        {'$limit': limit + 1},
+        {'$project': {
+            'folder_name': 1,
+            'category': 1,
+            'date': 1,
+            'score': 1,
+            'extracted_text_z': {'$slice': ['$extracted_text_z', 1]},
+            'extracted_text': 1
+        }}
+    ]
+
+    results = []
+    next_cursor = None
+    try:
+        docs = list(db.invoices.aggregate(pipeline))
+        if len(docs) > limit:
+            docs = docs[:limit]
+            next_cursor = _encode_search_cursor(docs[-1]['score'], docs[-1]['_id'])
+        for doc in docs:
+            results.append({
+                'id': str(doc['_id']),
+                'file_name': doc.get('folder_name', 'N/A'),
+                'category': doc.get('category', 'N/A'),
+                'date': doc.get('date').strftime('%m/%d/%Y') if doc.get('date') else 'N/A',
+                'score': round(doc['score'], 4),
+                'snippet': _highlight(' '.join(_snippet(get_extracted_text(doc), terms).split()), terms)
+            })
+    except Exception as e:
+        logger.error(f"Error searching invoices for {username}: {e}", exc_info=True)
+    return {'results': results, 'next_cursor': next_cursor}
@@ -4,6 +4,7 @@ import logging
 from datetime import datetime
 import pytz
 from flask import current_app
+from .events import ENTITY_LOAN, record_change
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +26,7 @@ def add_loan(username, branch, loan_data):
             'isArchived': False
         }
         db.loans.insert_one(doc)
+        record_change(db, ENTITY_LOAN, 'insert', doc, [field for field in doc if field != '_id'])
         return True
     except Exception as e:
         logger.error(f"Error adding loan for {username}: {e}", exc_info=True)
@@ -6,6 +6,7 @@ import pytz
 from bson import ObjectId
 from flask import current_app
 from .helpers import format_relative_time
+from .events import ENTITY_NOTIFICATION, record_change
 import json
 from pywebpush import webpush, WebPushException
 
@@ -55,7 +56,7 @@ def add_notification(username, title, message, url):
     # --- START OF MODIFICATION: Explicitly try/except blocks around services ---
     try:
         # 1. Save the notification to the database (Prioritize this!)
-        db.notifications.insert_one({
+        result = db.notifications.insert_one({
             'username': username,
             'title': title,
             'message': message,
@@ -63,6 +64,7 @@ def add_notification(username, title, message, url):
             'isRead': False,
             'createdAt': datetime.now(pytz.utc)
         })
+        record_change(db, ENTITY_NOTIFICATION, 'insert', {'_id': result.inserted_id, 'username': username})
 
         # Locally import modules to prevent circular dependencies
         from website.utils.email_utils import send_notification_email
@@ -145,6 +147,9 @@ def mark_single_notification_as_read(username, notification_id):
             {'_id': ObjectId(notification_id), 'username': username},
             {'$set': {'isRead': True}}
         )
+        if result.modified_count > 0:
+            record_change(db, ENTITY_NOTIFICATION, 'update',
+                          {'_id': ObjectId(notification_id), 'username': username}, ['isRead'])
         return result.modified_count > 0
     except Exception as e:
         logger.error(f"Error marking notification {notification_id} as read for {username}: {e}", exc_info=True)
@@ -5,6 +5,7 @@ from datetime import datetime
 import pytz
 from bson.objectid import ObjectId
 from flask import current_app
+from .events import ENTITY_SCHEDULE, EVENT_PROJECTION, record_change, written_fields
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +36,7 @@ def add_schedule(username, branch, data):
             'createdAt': datetime.now(pytz.utc)
         }
         db.schedules.insert_one(schedule_doc)
+        record_change(db, ENTITY_SCHEDULE, 'insert', schedule_doc, [field for field in schedule_doc if field != '_id'])
         return True
     except Exception as e:
         logger.error(f"Error adding schedule for {username}: {e}", exc_info=True)
@@ -72,54 +74,55 @@ def get_schedules(username, branch, start_str, end_str):
         logger.error(f"Error fetching schedules for {username}: {e}", exc_info=True)
         return []
 
+def _parse_iso_datetime(iso_string):
+    """Safely parses an ISO string to datetime, returning None if it is missing, empty or invalid."""
+    if not iso_string:
+        return None
+    try:
+        # Check for and append '+00:00' if no timezone is present
+        if 'Z' not in iso_string.upper() and '+' not in iso_string and '-' not in iso_string[-6:]:
+            iso_string += '+00:00'
+        elif 'Z' in iso_string.upper():
+            iso_string = iso_string.replace('Z', '+00:00')
+        return datetime.fromisoformat(iso_string)
+    except ValueError as e:
+        # Log the specific problematic value and return None on parsing error
+        logger.error(f"ValueError during datetime parsing for string: {iso_string}. Error: {e}", exc_info=True)
+        return None
+
+def schedule_update_document(data):
+    """The update document for a schedule edit, or None if the start date is missing or invalid."""
+    start_dt = _parse_iso_datetime(data.get('start'))
+    if start_dt is None:
+        return None
+    return {
+        '$set': {
+            'title': data.get('title'),
+            'description': data.get('description'),
+            'location': data.get('location'),
+            'label': data.get('label'),
+            'allDay': data.get('allDay'),
+            'start': start_dt,
+            'end': _parse_iso_datetime(data.get('end')),
+        }
+    }
+
 def update_schedule(username, schedule_id, data):
     """Updates an existing schedule in the database."""
     db = current_app.db
     if db is None: return False
     try:
-        
-        # Helper to safely parse ISO string to datetime, handling None if key is missing or empty
-        def parse_iso_datetime(iso_string):
-            if not iso_string:
-                return None
-            try:
-                # --- START OF FIX: Simplified and more robust ISO parsing ---
-                # Check for and append '+00:00' if no timezone is present
-                if 'Z' not in iso_string.upper() and '+' not in iso_string and '-' not in iso_string[-6:]:
-                    iso_string += '+00:00' 
-                elif 'Z' in iso_string.upper():
-                    iso_string = iso_string.replace('Z', '+00:00')
-                    
-                dt_obj = datetime.fromisoformat(iso_string)
-                return dt_obj
-            except ValueError as e:
-                # Log the specific problematic value and return None on parsing error
-                logger.error(f"ValueError during datetime parsing for string: {iso_string}. Error: {e}", exc_info=True)
-                return None # <--- Crucially, return None instead of raising an exception.
-                # --- END OF FIX: Simplified and more robust ISO parsing ---
-
-
-        start_dt = parse_iso_datetime(data.get('start'))
-        end_dt = parse_iso_datetime(data.get('end'))
-
-        if start_dt is None:
+        update_doc = schedule_update_document(data)
+        if update_doc is None:
             # Prevent update if start date is invalid or missing, as it's required.
             logger.error(f"Schedule update failed: start date is missing or invalid for schedule ID {schedule_id}")
             return False
-        
-        update_doc = {
-            '$set': {
-                'title': data.get('title'),
-                'description': data.get('description'),
-                'location': data.get('location'),
-                'label': data.get('label'),
-                'allDay': data.get('allDay'),
-                'start': start_dt,
-                'end': end_dt,
-            }
-        }
-        
+
         result = db.schedules.update_one({'_id': ObjectId(schedule_id), 'username': username}, update_doc)
+        if result.modified_count > 0:
+            record_change(db, ENTITY_SCHEDULE, 'update',
+                          db.schedules.find_one({'_id': ObjectId(schedule_id)}, EVENT_PROJECTION),
+                          written_fields(update_doc))
         return result.modified_count > 0
     except Exception as e:
         # This catches MongoDB connection or other critical errors.
@@ -131,8 +134,11 @@ def delete_schedule(username, schedule_id):
     db = current_app.db
     if db is None: return False
     try:
-        result = db.schedules.delete_one({'_id': ObjectId(schedule_id), 'username': username})
-        return result.deleted_count > 0
+        doc = db.schedules.find_one_and_delete(
+            {'_id': ObjectId(schedule_id), 'username': username}, projection=EVENT_PROJECTION
+        )
+        record_change(db, ENTITY_SCHEDULE, 'delete', doc)
+        return doc is not None
     except Exception as e:
         logger.error(f"Error deleting schedule {schedule_id}: {e}", exc_info=True)
         return False
\ No newline at end of file
@@ -0,0 +1,162 @@
+# website/models/sync.py
+
+import logging
+from datetime import datetime
+import pytz
+from bson.objectid import ObjectId
+from flask import current_app
+from pymongo import UpdateOne, UpdateMany
+from pymongo.errors import BulkWriteError
+from .events import (
+    ENTITY_NOTIFICATION, ENTITY_SCHEDULE, ENTITY_TRANSACTION, EVENT_PROJECTION, record_change, record_changes
+)
+from .schedule import schedule_update_document
+from .transaction import child_check_update_fields, recompute_folder_totals
+
+logger = logging.getLogger(__name__)
+
+# Most queued operations accepted by one /api/sync/batch request.
+SYNC_BATCH_LIMIT = 200
+
+# Offline operations the service worker can replay, and the collection each writes.
+SYNC_OPERATIONS = {
+    'archive_transaction': 'transactions',
+    'update_child_transaction': 'transactions',
+    'update_schedule': 'schedules',
+    'read_notification': 'notifications',
+}
+
+
+def _operation_requests(name, doc, data, username, now):
+    """
+    The bulk_write requests for one queued operation on its (owned) document,
+    or a string saying why the operation is invalid.
+    """
+    query = {'_id': doc['_id'], 'username': username}
+    if name == 'archive_transaction':
+        requests = [UpdateOne(
+            {**query, 'isArchived': {'$ne': True}},
+            {'$set': {'isArchived': True, 'archivedAt': now, 'updatedAt': now}}
+        )]
+        if doc.get('parent_id') is None:
+            requests.append(UpdateMany(
+                {'username': username, 'parent_id': doc['_id'], 'isArchived': {'$ne': True}},
+                {'$set': {'isArchived': True, 'archivedAt': now, 'archivedWithParent': True, 'updatedAt': now}}
+            ))
+        return requests
+    if name == 'update_child_transaction':
+        if doc.get('parent_id') is None:
+            return 'Not a child check.'
+        return [UpdateOne(query, {'$set': {**child_check_update_fields(data), 'updatedAt': now}})]
+    if name == 'update_schedule':
+        update = schedule_update_document(data)
+        if update is None:
+            return 'Start date is missing or invalid.'
+        return [UpdateOne(query, update)]
+    return [UpdateOne(query, {'$set': {'isRead': True}})]
+
+
+def apply_sync_batch(username, operations):
+    """
+    Applies a service worker's queued offline operations, each
+    {'op': one of SYNC_OPERATIONS, 'id': ..., 'data': {...}}, in their
+    original order. Ownership is checked with one read per collection, the
+    writes go out as one ordered bulk_write per collection, and folder
+    totals are recomputed once per folder whose checks changed.
+
+    Returns one result per operation, {'status': 'ok' | 'invalid' |
+    'not_found' | 'failed', 'error': ...}; 'failed' operations may be
+    retried, the others should be dropped from the outbox. Returns None if
+    the database is unavailable.
+    """
+    db = current_app.db
+    if db is None: return None
+    now = datetime.now(pytz.utc)
+    results = [None] * len(operations)
+
+    parsed, ids = [], {}
+    for index, operation in enumerate(operations):
+        operation = operation if isinstance(operation, dict) else {}
+        name, item_id = operation.get('op'), str(operation.get('id'))
+        collection_name = SYNC_OPERATIONS.get(name)
+        if collection_name is None or not ObjectId.is_valid(item_id):
+            results[index] = {'status': 'invalid', 'error': 'Unknown operation or id.'}
+            continue
+        data = operation.get('data') if isinstance(operation.get('data'), dict) else {}
+        parsed.append((index, name, collection_name, ObjectId(item_id), data))
+        ids.setdefault(collection_name, set()).add(ObjectId(item_id))
+
+    try:
+        owned = {
+            collection_name: {doc['_id']: doc for doc in db[collection_name].find(
+                {'_id': {'$in': list(collection_ids)}, 'username': username},
+                {'parent_id': 1, **EVENT_PROJECTION}
+            )}
+            for collection_name, collection_ids in ids.items()
+        }
+    except Exception as e:
+        logger.error(f"Error loading documents for sync batch of {username}: {e}", exc_info=True)
+        return None
+
+    # collection -> [(operation index, first request position, request count)]
+    writes, requests = {}, {}
+    for index, name, collection_name, item_id, data in parsed:
+        doc = owned[collection_name].get(item_id)
+        if doc is None:
+            results[index] = {'status': 'not_found', 'error': 'Item not found.'}
+            continue
+        try:
+            operation_requests = _operation_requests(name, doc, data, username, now)
+        except (ValueError, TypeError, AttributeError) as e:
+            # Malformed data (e.g. a non-numeric amount) rejects this operation only.
+            logger.warning(f"Invalid {name} operation in sync batch of {username}: {e}")
+            operation_requests = 'Malformed operation data.'
+        if isinstance(operation_requests, str):
+            results[index] = {'status': 'invalid', 'error': operation_requests}
+            continue
+        collection_requests = requests.setdefault(collection_name, [])
+        writes.setdefault(collection_name, []).append((index, len(collection_requests), len(operation_requests)))
+        collection_requests.extend(operation_requests)
+        results[index] = {'status': 'ok'}
+
+    for collection_name, entries in writes.items():
+        failed_at = None
+        try:
+            db[collection_name].bulk_write(requests[collection_name], ordered=True)
+        except BulkWriteError as e:
+            # Ordered: everything from the first error on was not applied.
+            failed_at = e.details['writeErrors'][0]['index']
+            logger.error(f"Sync batch for {username} stopped in {collection_name}: {e.details['writeErrors'][0]}")
+        except Exception as e:
+            failed_at = 0
+            logger.error(f"Error applying sync batch to {collection_name} for {username}: {e}", exc_info=True)
+        if failed_at is not None:
+            for index, first, count in entries:
+                if first + count > failed_at:
+                    results[index] = {'status': 'failed', 'error': 'Could not be applied; retry later.'}
+
+    # Change events and folder totals for what was applied.
+    applied = [entry for entry in parsed if results[entry[0]]['status'] == 'ok']
+    parent_ids, archived_folders = set(), set()
+    for index, name, collection_name, item_id, data in applied:
+        doc = owned[collection_name][item_id]
+        if name == 'archive_transaction':
+            if doc.get('parent_id') is None:
+                archived_folders.add(item_id)
+            else:
+                parent_ids.add(doc['parent_id'])
+        elif name == 'update_child_transaction':
+            parent_ids.add(doc['parent_id'])
+            record_change(db, ENTITY_TRANSACTION, 'update', doc, [*child_check_update_fields(data), 'updatedAt'])
+        elif name == 'update_schedule':
+            record_change(db, ENTITY_SCHEDULE, 'update', doc, schedule_update_document(data)['$set'])
+        elif name == 'read_notification':
+            record_change(db, ENTITY_NOTIFICATION, 'update', doc, ['isRead'])
+    if any(name == 'archive_transaction' for _, name, _, _, _ in applied):
+        # Everything this batch archived carries exactly its timestamp.
+        record_changes(db, ENTITY_TRANSACTION, 'archive',
+                       db.transactions.find({'username': username, 'archivedAt': now}, EVENT_PROJECTION),
+                       ['isArchived', 'archivedAt', 'archivedWithParent', 'updatedAt'])
+    for parent_id in parent_ids - archived_folders:
+        recompute_folder_totals(username, parent_id)
+    return results
@@ -1,14 +1,24 @@
 # website/models/transaction.py
 
+import base64
+import json
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 from bson import ObjectId
 from bson.objectid import ObjectId
 from flask import current_app
+from pymongo import UpdateOne, UpdateMany, ReplaceOne
+from .events import (
+    CHANGE_EVENTS, ENTITY_TRANSACTION, EVENT_PROJECTION, record_change, record_changes, written_fields
+)
 
 logger = logging.getLogger(__name__)
 
+# Cold tier for paid folders (and their checks) older than the history
+# cutoff. Documents keep their _id, so lookups by id work in either place.
+TRANSACTIONS_HISTORY = 'transactions_history'
+
 
 # =========================================================
 # HELPER: Recompute and store folder totals
@@ -66,13 +76,17 @@ def recompute_folder_totals(username, parent_id):
             'ewt': round(ewt_sum, 2)                      # Parent.ewt = SUM(Child.ewt)
         }
 
+        # Only a real change bumps updatedAt, so synced clients are not sent unchanged folders.
         result = db.transactions.update_one(
-            {'_id': pid, 'username': username},
-            {'$set': update_fields}
+            {'_id': pid, 'username': username,
+             '$or': [{field: {'$ne': value}} for field, value in update_fields.items()]},
+            {'$set': {**update_fields, 'updatedAt': datetime.now(pytz.utc)}}
         )
 
         if result.modified_count:
             logger.info(f"Recomputed totals for folder {parent_id}: {update_fields}")
+            record_change(db, ENTITY_TRANSACTION, 'update',
+                          db.transactions.find_one({'_id': pid}, EVENT_PROJECTION), [*update_fields, 'updatedAt'])
         else:
             logger.debug(f"Recompute totals: no modification for folder {parent_id}.")
         return True
@@ -119,6 +133,7 @@ def update_transaction(username, transaction_id, form_data):
 
         set_updates = {k: v for k, v in update_fields.items() if k not in ['$unset', 'notes']}
         set_updates['notes'] = update_fields.get('notes', '')
+        set_updates['updatedAt'] = datetime.now(pytz.utc)
         
         final_update = {}
         if set_updates:
@@ -130,6 +145,10 @@ def update_transaction(username, transaction_id, form_data):
             {'_id': ObjectId(transaction_id), 'username': username},
             final_update
         )
+        if result.modified_count == 1:
+            record_change(db, ENTITY_TRANSACTION, 'update',
+                          db.transactions.find_one({'_id': ObjectId(transaction_id)}, EVENT_PROJECTION),
+                          written_fields(final_update))
         return result.modified_count == 1
     except Exception as e:
         logger.error(f"Error updating transaction {transaction_id}: {e}", exc_info=True)
@@ -191,8 +210,10 @@ def add_transaction(username, branch, transaction_data, parent_id=None):
             
             doc['ewt'] = round(sum(d.get('amount', 0) for d in deductions if d.get('name', '').upper() == 'EWT'), 2)
 
+        doc['updatedAt'] = doc['createdAt']
         db.transactions.insert_one(doc)
-        
+        record_change(db, ENTITY_TRANSACTION, 'insert', doc, [field for field in doc if field != '_id'])
+
         if parent_id:
             recompute_folder_totals(username, parent_id)
         
@@ -209,7 +230,8 @@ def get_transaction_by_id(username, transaction_id, full_document=False):
     if db is None:
         return None
     try:
-        doc = db.transactions.find_one({'_id': ObjectId(transaction_id), 'username': username})
+        query = {'_id': ObjectId(transaction_id), 'username': username}
+        doc = db.transactions.find_one(query) or db[TRANSACTIONS_HISTORY].find_one(query)
         if not doc:
             logger.warning(f"Transaction with id {transaction_id} not found for user {username}")
             return None
@@ -262,7 +284,17 @@ def get_transactions_by_status(username, branch, status):
         if branch:
             query['branch'] = branch
 
-        for doc in db.transactions.find(query).sort('check_date', -1):
+        if status == 'Paid':
+            # Old paid folders live in the history collection.
+            docs = db.transactions.aggregate([
+                {'$match': query},
+                {'$unionWith': {'coll': TRANSACTIONS_HISTORY, 'pipeline': [{'$match': query}]}},
+                {'$sort': {'check_date': -1}}
+            ])
+        else:
+            docs = db.transactions.find(query).sort('check_date', -1)
+
+        for doc in docs:
             editor = (
                 doc.get('paidBy', doc.get('username', 'N/A')).capitalize()
                 if status == 'Paid'
@@ -308,6 +340,9 @@ def get_child_transactions_by_parent_id(username, parent_id):
         }
         for doc in db.transactions.find(query).sort('createdAt', 1):
             child_checks.append(doc)
+        if not child_checks:
+            # Checks move to the history collection together with their folder.
+            child_checks = list(db[TRANSACTIONS_HISTORY].find(query).sort('createdAt', 1))
     except Exception as e:
         logger.error(f"Error fetching child transactions for parent {parent_id}: {e}", exc_info=True)
     return child_checks
@@ -315,6 +350,44 @@ def get_child_transactions_by_parent_id(username, parent_id):
 # =========================================================
 # UPDATE CHILD TRANSACTION (UPDATED LOGIC)
 # =========================================================
+def child_check_update_fields(form_data):
+    """The $set fields for an edit of a child check."""
+    check_amount = float(form_data.get('check_amount') or 0.0)
+    deductions = form_data.get('deductions', [])
+
+    # --- START OF MODIFICATION: No Auto-Balancing ---
+    manual_countered = form_data.get('countered_check')
+    if manual_countered is not None and str(manual_countered).strip() != '':
+        try:
+            countered_check = round(float(manual_countered), 2)
+        except ValueError:
+            countered_check = 0.0
+    else:
+        countered_check = 0.0
+    # --- END OF MODIFICATION ---
+
+    ewt = round(sum(d.get('amount', 0) for d in deductions if d.get('name', '').upper() == 'EWT'), 2)
+
+    update_fields = {
+        'name': form_data.get('name_of_issued_check'),
+        'check_no': form_data.get('check_no'),
+        'notes': form_data.get('notes'),
+        'check_amount': round(check_amount, 2),
+        'deductions': deductions,
+        'countered_check': countered_check,
+        'amount': countered_check,
+        'ewt': ewt
+    }
+
+    check_date_str = form_data.get('check_date')
+    if check_date_str:
+        try:
+            date_part = datetime.strptime(check_date_str, '%Y-%m-%d').date()
+            update_fields['check_date'] = pytz.utc.localize(datetime.combine(date_part, datetime.min.time()))
+        except ValueError:
+            logger.warning(f"Failed to parse check_date string '{check_date_str}' in update_child_transaction.")
+    return update_fields
+
 def update_child_transaction(username, transaction_id, form_data):
     """Updates an existing child check in the database."""
     db = current_app.db
@@ -325,46 +398,14 @@ def update_child_transaction(username, transaction_id, form_data):
         existing = db.transactions.find_one({'_id': ObjectId(transaction_id), 'username': username})
         parent_id = existing.get('parent_id') if existing else None
 
-        check_amount = float(form_data.get('check_amount') or 0.0)
-        deductions = form_data.get('deductions', []) 
-        
-        # --- START OF MODIFICATION: No Auto-Balancing ---
-        manual_countered = form_data.get('countered_check')
-        if manual_countered is not None and str(manual_countered).strip() != '':
-            try:
-                countered_check = round(float(manual_countered), 2)
-            except ValueError:
-                countered_check = 0.0
-        else:
-            countered_check = 0.0
-        # --- END OF MODIFICATION ---
-        
-        ewt = round(sum(d.get('amount', 0) for d in deductions if d.get('name', '').upper() == 'EWT'), 2)
-        
-        update_fields = {
-            'name': form_data.get('name_of_issued_check'),
-            'check_no': form_data.get('check_no'),
-            'notes': form_data.get('notes'),
-            'check_amount': round(check_amount, 2),
-            'deductions': deductions, 
-            'countered_check': countered_check, 
-            'amount': countered_check,         
-            'ewt': ewt                         
-        }
-        
-        check_date_str = form_data.get('check_date')
-        if check_date_str:
-            try:
-                date_part = datetime.strptime(check_date_str, '%Y-%m-%d').date()
-                update_fields['check_date'] = pytz.utc.localize(datetime.combine(date_part, datetime.min.time()))
-            except ValueError:
-                logger.warning(f"Failed to parse check_date string '{check_date_str}' in update_child_transaction.")
-
+        update_fields = child_check_update_fields(form_data)
         result = db.transactions.update_one(
             {'_id': ObjectId(transaction_id), 'username': username},
-            {'$set': update_fields}
+            {'$set': {**update_fields, 'updatedAt': datetime.now(pytz.utc)}}
         )
         
+        if result.modified_count == 1:
+            record_change(db, ENTITY_TRANSACTION, 'update', existing, [*update_fields, 'updatedAt'])
         if result.modified_count == 1 and parent_id:
             recompute_folder_totals(username, parent_id)
             return True
@@ -387,7 +428,8 @@ def mark_folder_as_paid(username, folder_id, notes):
             '$set': {
                 'status': 'Paid',
                 'paidAt': paid_at_time,
-                'paidBy': username
+                'paidBy': username,
+                'updatedAt': paid_at_time
             }
         }
         if notes is not None:
@@ -404,8 +446,14 @@ def mark_folder_as_paid(username, folder_id, notes):
 
         db.transactions.update_many(
             {'parent_id': ObjectId(folder_id), 'username': username},
-            {'$set': {'status': 'Paid', 'paidAt': paid_at_time}}
+            {'$set': {'status': 'Paid', 'paidAt': paid_at_time, 'updatedAt': paid_at_time}}
         )
+        record_change(db, ENTITY_TRANSACTION, 'update',
+                      db.transactions.find_one({'_id': ObjectId(folder_id)}, EVENT_PROJECTION),
+                      written_fields(update_data))
+        record_changes(db, ENTITY_TRANSACTION, 'update',
+                       db.transactions.find({'parent_id': ObjectId(folder_id), 'username': username}, EVENT_PROJECTION),
+                       ['status', 'paidAt', 'updatedAt'])
         return True
     except Exception as e:
         logger.error(f"Error marking folder {folder_id} as paid: {e}", exc_info=True)
@@ -416,7 +464,8 @@ def mark_folder_as_paid(username, folder_id, notes):
 # =========================================================
 def archive_transaction(username, transaction_id):
     """
-    Archives a transaction. If the archived transaction is a child,
+    Archives a transaction. Archiving a folder also archives its active
+    checks in the same bulk_write; if the archived transaction is a child,
     recompute its parent's totals after archiving.
     """
     db = current_app.db
@@ -429,13 +478,26 @@ def archive_transaction(username, transaction_id):
             return False
 
         parent_id = doc.get('parent_id')
+        now = datetime.now(pytz.utc)
 
-        result = db.transactions.update_one(
-            {'_id': ObjectId(transaction_id), 'username': username},
-            {'$set': {'isArchived': True, 'archivedAt': datetime.now(pytz.utc)}}
-        )
-
-        success = result.modified_count == 1
+        operations = [UpdateOne(
+            {'_id': doc['_id'], 'username': username, 'isArchived': {'$ne': True}},
+            {'$set': {'isArchived': True, 'archivedAt': now, 'updatedAt': now}}
+        )]
+        if parent_id is None:
+            operations.append(UpdateMany(
+                {'username': username, 'parent_id': doc['_id'], 'isArchived': {'$ne': True}},
+                {'$set': {'isArchived': True, 'archivedAt': now, 'archivedWithParent': True, 'updatedAt': now}}
+            ))
+        result = db.transactions.bulk_write(operations)
+
+        success = result.modified_count >= 1
+        if success:
+            # Everything this call archived carries exactly its timestamp.
+            record_changes(db, ENTITY_TRANSACTION, 'archive', db.transactions.find(
+                {'username': username, 'archivedAt': now, '$or': [{'_id': doc['_id']}, {'parent_id': doc['_id']}]},
+                EVENT_PROJECTION
+            ), ['isArchived', 'archivedAt', 'updatedAt'])
 
         if success and parent_id:
             try:
@@ -446,4 +508,175 @@ def archive_transaction(username, transaction_id):
         return success
     except Exception as e:
         logger.error(f"Error archiving transaction {transaction_id}: {e}", exc_info=True)
-        return False
\ No newline at end of file
+        return False
+
+
+# =========================================================
+# MOVE OLD PAID FOLDERS TO THE HISTORY COLLECTION
+# =========================================================
+def move_paid_folders_to_history(years, batch_size=200):
+    """
+    Moves paid, non-archived folders paid more than `years` years ago,
+    together with all their checks, from `transactions` into
+    TRANSACTIONS_HISTORY, `batch_size` folders at a time.
+
+    Each batch is upserted into the history collection before it is deleted
+    from the hot one, so a rerun after an interruption finishes the move
+    instead of duplicating it. Returns {'folders': n, 'checks': n}.
+    """
+    db = current_app.db
+    moved = {'folders': 0, 'checks': 0}
+    if db is None or years <= 0:
+        return moved
+
+    cutoff = datetime.now(pytz.utc) - timedelta(days=365 * years)
+    query = {
+        'parent_id': None,
+        'status': 'Paid',
+        'paidAt': {'$lt': cutoff},
+        'isArchived': {'$ne': True}
+    }
+    while True:
+        folders = list(db.transactions.find(query).sort('paidAt', 1).limit(batch_size))
+        if not folders:
+            break
+        folder_ids = [folder['_id'] for folder in folders]
+        checks = list(db.transactions.find({'parent_id': {'$in': folder_ids}}))
+
+        db[TRANSACTIONS_HISTORY].bulk_write(
+            [ReplaceOne({'_id': doc['_id']}, doc, upsert=True) for doc in folders + checks],
+            ordered=False
+        )
+        db.transactions.delete_many({'_id': {'$in': folder_ids + [check['_id'] for check in checks]}})
+        record_changes(db, ENTITY_TRANSACTION, 'move', folders + checks)
+
+        moved['folders'] += len(folders)
+        moved['checks'] += len(checks)
+        if len(folders) < batch_size:
+            break
+    return moved
+
+
+# =========================================================
+# DELTA SYNC FOR THE OFFLINE TRANSACTION STORE
+# =========================================================
+SYNC_PAGE_SIZE = 500
+
+# updatedAt is stamped before a write commits, so every delta re-reads this
+# much history to pick up writes that were still in flight at the last sync.
+SYNC_OVERLAP_SECONDS = 5
+
+# Change events for transactions that left the collection without being
+# archived (moved to history, or permanently deleted).
+_SYNC_REMOVAL_OPS = ('move', 'delete')
+
+_SYNC_FIELDS = ('branch', 'name', 'check_no', 'check_date', 'due_date', 'status', 'amount', 'check_amount',
+                'countered_check', 'ewt', 'deductions', 'notes', 'paidAt', 'createdAt', 'updatedAt')
+
+def _encode_sync_token(data):
+    return base64.urlsafe_b64encode(json.dumps(data).encode('utf-8')).decode('ascii')
+
+def _decode_sync_token(token):
+    data = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    if data.get('m') not in ('full', 'delta'):
+        raise ValueError(f"Unknown sync token mode {data.get('m')!r}")
+    return data
+
+def _sync_document(doc):
+    item = {'_id': str(doc['_id']), 'parent_id': str(doc['parent_id']) if doc.get('parent_id') else None}
+    for field in _SYNC_FIELDS:
+        value = doc.get(field)
+        item[field] = value.isoformat() if isinstance(value, datetime) else value
+    return item
+
+def get_transaction_changes(username, token=None, branch=None, max_age_days=0, limit=SYNC_PAGE_SIZE):
+    """
+    Delta sync for the offline transaction store. Without a token the
+    active folders and checks are paged out as a full snapshot (`reset`
+    tells the client to clear its copy first); the final page's token then
+    starts incremental sync, where each call returns the transactions whose
+    updatedAt moved past the token and archived ones as tombstones. Folders
+    and checks moved to history or deleted since the token are found in
+    their change events and sent as tombstones too (with only `_id`).
+
+    Tokens are bound to `username`; another user's token, like a delta
+    token older than `max_age_days`, restarts with a snapshot.
+    Returns {'changes', 'tombstones', 'next_token', 'has_more', 'reset'},
+    or None if the token is invalid.
+    """
+    db = current_app.db
+    if db is None: return None
+    now = datetime.now(pytz.utc)
+    try:
+        state = _decode_sync_token(token) if token else {'m': 'full'}
+        if state.get('n') != username:
+            # A replica left behind by another user on this browser.
+            state = {'m': 'full'}
+        if state['m'] == 'delta' and max_age_days and 't' in state:
+            watermark = datetime.fromisoformat(state['t'])
+            if watermark.tzinfo is None:
+                watermark = pytz.utc.localize(watermark)
+            if watermark < now - timedelta(days=max_age_days):
+                state = {'m': 'full'}
+    except Exception:
+        return None
+
+    query = {'username': username}
+    if branch:
+        query['branch'] = branch
+    removed = []
+    try:
+        if state['m'] == 'full':
+            started = state.get('s') or now.isoformat()
+            query['isArchived'] = {'$ne': True}
+            if state.get('i'):
+                query['_id'] = {'$gt': ObjectId(state['i'])}
+            docs = list(db.transactions.find(query).sort('_id', 1).limit(limit))
+            has_more = len(docs) == limit
+            if has_more:
+                next_state = {'m': 'full', 's': started, 'i': str(docs[-1]['_id'])}
+            else:
+                next_state = {'m': 'delta', 't': started}
+            reset = not state.get('i')
+        else:
+            upper = datetime.fromisoformat(state['u']) if state.get('u') else now
+            if state.get('a'):
+                # Continuing a delta that did not fit in one page.
+                after = datetime.fromisoformat(state['a'])
+                query['$or'] = [
+                    {'updatedAt': {'$gt': after, '$lte': upper}},
+                    {'updatedAt': after, '_id': {'$gt': ObjectId(state['i'])}}
+                ]
+            else:
+                since = datetime.fromisoformat(state['t']) - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+                query['updatedAt'] = {'$gte': since, '$lte': upper}
+                removal_query = {'username': username, 'entity': ENTITY_TRANSACTION,
+                                 'op': {'$in': list(_SYNC_REMOVAL_OPS)}, 'createdAt': {'$gte': since, '$lte': upper}}
+                if branch:
+                    removal_query['branch'] = branch
+                removed = list(db[CHANGE_EVENTS].find(removal_query, {'_id': 0, 'entity_id': 1}))
+            docs = list(db.transactions.find(query).sort([('updatedAt', 1), ('_id', 1)]).limit(limit))
+            has_more = len(docs) == limit
+            if has_more:
+                next_state = {'m': 'delta', 'u': upper.isoformat(),
+                              'a': docs[-1]['updatedAt'].isoformat(), 'i': str(docs[-1]['_id'])}
+            else:
+                next_state = {'m': 'delta', 't': upper.isoformat()}
+            reset = False
+    except Exception as e:
+        logger.error(f"Error reading transaction changes for {username}: {e}", exc_info=True)
+        return None
+
+    changes, tombstones = [], [{'_id': str(event['entity_id'])} for event in removed]
+    for doc in docs:
+        if doc.get('isArchived'):
+            tombstones.append({'_id': str(doc['_id']), 'parent_id': str(doc['parent_id']) if doc.get('parent_id') else None})
+        else:
+            changes.append(_sync_document(doc))
+    return {
+        'changes': changes,
+        'tombstones': tombstones,
+        'next_token': _encode_sync_token({**next_state, 'n': username}),
+        'has_more': has_more,
+        'reset': reset
+    }
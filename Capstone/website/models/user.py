@@ -153,8 +153,10 @@ def get_user_push_subscriptions(username):
 
 def update_personal_info(username, new_data):
     """
-    Updates the user's name and/or profile picture URL.
-    This includes the necessary logic to handle the `profile_picture_url` field.
+    Updates the user's name and/or profile picture.
+    `profile_picture_variants` maps avatar size -> {format: filename}; the
+    plain `profile_picture_url` is kept pointing at the largest JPEG for
+    anything that still reads the single-file field.
     """
     db = current_app.db
     if db is None: return False
@@ -166,6 +168,9 @@ def update_personal_info(username, new_data):
         
         if 'profile_picture_url' in new_data:
             update_doc['$set']['profile_picture_url'] = new_data['profile_picture_url']
+
+        if 'profile_picture_variants' in new_data:
+            update_doc['$set']['profile_picture_variants'] = new_data['profile_picture_variants']
             
         if not update_doc['$set']:
             return True # Nothing to update
@@ -0,0 +1,42 @@
+# purge_archive_task.py
+import os
+from website import create_app
+from website.models.archive import purge_expired_archive, sweep_orphaned_files
+
+app = create_app(os.getenv('FLASK_CONFIG') or 'dev')
+
+def purge_archive():
+    """
+    Enforces ARCHIVE_RETENTION_DAYS: permanently deletes archived transactions
+    and invoices whose archivedAt is older than the retention period, then
+    removes upload files nothing references any more. Meant to run daily
+    from the scheduler, like the other *_task.py scripts.
+    """
+    with app.app_context():
+        if app.db is None:
+            print("Error: Database connection not available.")
+            return
+
+        config = app.config
+        retention_days = config.get('ARCHIVE_RETENTION_DAYS', 90)
+        batch_size = config.get('ARCHIVE_PURGE_BATCH_SIZE', 500)
+
+        if retention_days > 0:
+            print(f"Purging items archived more than {retention_days} days ago...")
+            counts = purge_expired_archive(retention_days, batch_size)
+            print(f"  - Deleted {counts['transactions']} transactions and {counts['invoices']} invoices.")
+            print(f"  - Removed {counts['files']} invoice files.")
+        else:
+            print("Archive retention is disabled (ARCHIVE_RETENTION_DAYS=0).")
+
+        print("Sweeping orphaned upload files...")
+        swept = sweep_orphaned_files(
+            config.get('ORPHAN_FILE_GRACE_HOURS', 24),
+            config.get('UPLOAD_CHUNK_MAX_AGE_HOURS', 24),
+            batch_size
+        )
+        print(f"  - Removed {swept['orphans']} orphaned files and {swept['chunks']} stale upload chunks.")
+
+
+if __name__ == '__main__':
+    purge_archive()
@@ -0,0 +1,83 @@
+# website/serve.py
+"""
+Production entry point: python -m website.serve
+
+Builds the app once, warms the MongoDB connection pool and the template
+cache, then serves it with waitress using the SERVER_* settings in
+config.py. main.py remains the development server.
+
+Load test (load_test_task.py), run from the Capstone directory against a
+page that needs no login:
+
+    FLASK_CONFIG=prod python main.py &             # development server
+    LOAD_TEST_URL=http://127.0.0.1:5000/offline python -m website.load_test_task
+    kill %1
+    FLASK_CONFIG=prod python -m website.serve &    # waitress
+    LOAD_TEST_URL=http://127.0.0.1:5000/offline python -m website.load_test_task
+
+Compare the requests/second and p95 latency of the two runs; raise
+SERVER_THREADS while p95 improves and MongoDB is not the bottleneck.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from waitress import serve
+from website import create_app
+
+logger = logging.getLogger(__name__)
+
+
+def _ping(db):
+    try:
+        db.client.admin.command('ping')
+        return True
+    except Exception as e:
+        logger.error(f"MongoDB warm-up ping failed: {e}")
+        return False
+
+
+def warm_up(app):
+    """
+    Opens one MongoDB connection per server thread and compiles every
+    template, so the first requests do not pay for either.
+    """
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+    if app.db is None:
+        logger.warning("MongoDB unavailable; serving without a warm connection pool.")
+        return
+    threads = app.config['SERVER_THREADS']
+    # Concurrent pings each check out a connection, so the pool grows to `threads`.
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(lambda _: _ping(app.db), range(threads)))
+    logger.info(f"Warmed MongoDB pool: {sum(results)}/{threads} connections ready.")
+
+
+def run(app):
+    config = app.config
+    options = dict(
+        host=config['SERVER_HOST'],
+        port=config['SERVER_PORT'],
+        threads=config['SERVER_THREADS'],
+        connection_limit=config['SERVER_CONNECTION_LIMIT'],
+        channel_timeout=config['SERVER_CHANNEL_TIMEOUT'],
+        backlog=config['SERVER_BACKLOG'],
+        max_request_body_size=config['MAX_CONTENT_LENGTH'],
+        ident='DecoOffice',
+    )
+    if config['SERVER_TRUSTED_PROXY']:
+        options.update(
+            trusted_proxy=config['SERVER_TRUSTED_PROXY'],
+            trusted_proxy_headers={'x-forwarded-for', 'x-forwarded-proto'},
+            clear_untrusted_proxy_headers=True,
+        )
+    logger.info(f"Serving on {options['host']}:{options['port']} with {options['threads']} threads.")
+    serve(app, **options)
+
+
+app = create_app(os.getenv('FLASK_CONFIG') or 'prod')
+
+if __name__ == '__main__':
+    warm_up(app)
+    run(app)
@@ -1,6 +1,7 @@
 // website/static/js/db.js
 
-const dbPromise = idb.openDB('deco-office-db', 1, {
+// Keep the version and stores in step with sw.js, which opens the same database.
+const dbPromise = idb.openDB('deco-office-db', 2, {
   upgrade(db) {
     if (!db.objectStoreNames.contains('transactions')) {
       db.createObjectStore('transactions', { keyPath: '_id' });
@@ -8,6 +9,9 @@ const dbPromise = idb.openDB('deco-office-db', 1, {
     if (!db.objectStoreNames.contains('transaction-outbox')) {
       db.createObjectStore('transaction-outbox', { autoIncrement: true, keyPath: 'id' });
     }
+    if (!db.objectStoreNames.contains('sync-state')) {
+      db.createObjectStore('sync-state');
+    }
   },
 });
 
@@ -41,5 +45,48 @@ window.db = {
     const tx = db.transaction(st, 'readwrite');
     await tx.store.clear();
     return tx.done;
+  },
+
+  // Queues a change made while offline for /api/sync/batch (see syncOutbox
+  // in sw.js) and asks for a background sync to replay it. The outbox key
+  // ('id') is auto-incremented, so entries replay in the order they were
+  // queued and one item can have several queued changes.
+  async queueOperation(op, itemId, data = {}) {
+    const db = await dbPromise;
+    const headers = window.getCSRFToken ? { 'X-CSRF-Token': window.getCSRFToken() } : {};
+    await db.add('transaction-outbox', { op, itemId, data, headers });
+    const registration = await navigator.serviceWorker.ready;
+    if ('sync' in registration) await registration.sync.register('sync-deleted-items');
+  },
+
+  // Pulls folder/check changes since the stored token into the 'transactions'
+  // store. Each page is applied in one IndexedDB transaction together with
+  // its token, so an interrupted sync resumes where it stopped.
+  async syncTransactions() {
+    const db = await dbPromise;
+    let since = await db.get('sync-state', 'transactions');
+    let hasMore = true;
+    while (hasMore) {
+      const url = since ? `/api/sync/transactions?since=${encodeURIComponent(since)}` : '/api/sync/transactions';
+      const response = await fetch(url, { credentials: 'same-origin' });
+      if (response.status === 400 && since) {
+        // Token rejected: start over with a full snapshot.
+        since = null;
+        continue;
+      }
+      if (!response.ok) throw new Error(`Transaction sync failed: ${response.status}`);
+      const page = await response.json();
+
+      const tx = db.transaction(['transactions', 'sync-state'], 'readwrite');
+      const store = tx.objectStore('transactions');
+      if (page.reset) await store.clear();
+      for (const item of page.changes) store.put(item);
+      for (const tombstone of page.tombstones) store.delete(tombstone._id);
+      tx.objectStore('sync-state').put(page.next_token, 'transactions');
+      await tx.done;
+
+      since = page.next_token;
+      hasMore = page.has_more;
+    }
   }
 };
\ No newline at end of file
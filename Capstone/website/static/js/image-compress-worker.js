@@ -0,0 +1,24 @@
+// static/js/image-compress-worker.js
+// Downscales and re-encodes invoice photos off the main thread.
+self.onmessage = async (event) => {
+    const { id, file, maxDimension, quality } = event.data;
+    try {
+        const bitmap = await createImageBitmap(file, { imageOrientation: 'from-image' });
+        const scale = Math.min(1, maxDimension / Math.max(bitmap.width, bitmap.height));
+        const width = Math.round(bitmap.width * scale);
+        const height = Math.round(bitmap.height * scale);
+
+        const canvas = new OffscreenCanvas(width, height);
+        const ctx = canvas.getContext('2d');
+        // JPEG has no alpha channel, so flatten transparent PNGs onto white
+        ctx.fillStyle = '#ffffff';
+        ctx.fillRect(0, 0, width, height);
+        ctx.drawImage(bitmap, 0, 0, width, height);
+        bitmap.close();
+
+        const blob = await canvas.convertToBlob({ type: 'image/jpeg', quality });
+        self.postMessage({ id, blob, resized: scale < 1 });
+    } catch (error) {
+        self.postMessage({ id, error: error.message });
+    }
+};
@@ -8,6 +8,21 @@ document.addEventListener("DOMContentLoaded", () => {
     const uploadBtn = document.getElementById('upload-btn');
     let filesToUpload = [];
 
+    // Upload tuning comes from the server config via data-* attributes on the form
+    const uploadSettings = {
+        maxDimension: parseInt(invoiceForm?.dataset.maxDimension, 10) || 2000,
+        quality: parseFloat(invoiceForm?.dataset.imageQuality) || 0.8,
+        chunkSize: parseInt(invoiceForm?.dataset.chunkSize, 10) || 1024 * 1024,
+        parallelChunks: parseInt(invoiceForm?.dataset.parallelChunks, 10) || 4,
+        compressWorkerUrl: invoiceForm?.dataset.compressWorker || '/static/js/image-compress-worker.js',
+    };
+    const COMPRESSIBLE_TYPES = ['image/jpeg', 'image/png', 'image/webp', 'image/bmp'];
+    const CHUNK_RETRIES = 3;
+    const progressBox = document.getElementById('upload-progress');
+    const progressBar = document.getElementById('upload-progress-bar');
+    const progressLabel = document.getElementById('upload-progress-label');
+    const progressPercent = document.getElementById('upload-progress-percent');
+
     if (!dropZone || !fileInput || !fileList) {
         console.error("Uploader elements not found.");
         return;
@@ -80,6 +95,134 @@ document.addEventListener("DOMContentLoaded", () => {
         if (element) element.remove();
     };
 
+    // --- Image compression ---
+    let compressWorker = null;
+    let compressJobId = 0;
+    const compressJobs = new Map();
+
+    const getCompressWorker = () => {
+        if (compressWorker === null) {
+            compressWorker = (typeof Worker !== 'undefined' && typeof OffscreenCanvas !== 'undefined')
+                ? new Worker(uploadSettings.compressWorkerUrl)
+                : false;
+            if (compressWorker) {
+                compressWorker.onmessage = (event) => {
+                    const job = compressJobs.get(event.data.id);
+                    compressJobs.delete(event.data.id);
+                    if (!job) return;
+                    event.data.error ? job.reject(new Error(event.data.error)) : job.resolve(event.data);
+                };
+            }
+        }
+        return compressWorker;
+    };
+
+    // Fallback for browsers without OffscreenCanvas: same work on a main-thread canvas
+    const compressOnCanvas = async (file) => {
+        const bitmap = await createImageBitmap(file, { imageOrientation: 'from-image' });
+        const scale = Math.min(1, uploadSettings.maxDimension / Math.max(bitmap.width, bitmap.height));
+        const canvas = document.createElement('canvas');
+        canvas.width = Math.round(bitmap.width * scale);
+        canvas.height = Math.round(bitmap.height * scale);
+        const ctx = canvas.getContext('2d');
+        ctx.fillStyle = '#ffffff';
+        ctx.fillRect(0, 0, canvas.width, canvas.height);
+        ctx.drawImage(bitmap, 0, 0, canvas.width, canvas.height);
+        bitmap.close();
+        const blob = await new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', uploadSettings.quality));
+        return { blob, resized: scale < 1 };
+    };
+
+    const compressImage = async (file) => {
+        if (!COMPRESSIBLE_TYPES.includes(file.type) || typeof createImageBitmap === 'undefined') return file;
+        try {
+            const worker = getCompressWorker();
+            const result = worker
+                ? await new Promise((resolve, reject) => {
+                    const id = ++compressJobId;
+                    compressJobs.set(id, { resolve, reject });
+                    worker.postMessage({ id, file, maxDimension: uploadSettings.maxDimension, quality: uploadSettings.quality });
+                })
+                : await compressOnCanvas(file);
+            // Keep the original if re-encoding did not help
+            if (!result.blob || (!result.resized && result.blob.size >= file.size)) return file;
+            const name = file.name.replace(/\.[^.]+$/, '') + '.jpg';
+            return new File([result.blob], name, { type: 'image/jpeg', lastModified: file.lastModified });
+        } catch (error) {
+            console.warn(`Could not compress ${file.name}, uploading the original.`, error);
+            return file;
+        }
+    };
+
+    // --- Chunked upload ---
+    const newUploadId = () => Array.from(crypto.getRandomValues(new Uint8Array(16)), b => b.toString(16).padStart(2, '0')).join('');
+
+    const setProgress = (label, fraction) => {
+        if (!progressBox) return;
+        progressBox.classList.remove('hidden');
+        const percent = Math.min(100, Math.round(fraction * 100));
+        progressLabel.textContent = label;
+        progressPercent.textContent = `${percent}%`;
+        progressBar.style.width = `${percent}%`;
+    };
+
+    const putChunk = (uploadId, index, blob, onProgress) => new Promise((resolve, reject) => {
+        // XHR rather than fetch: fetch cannot report upload progress
+        const xhr = new XMLHttpRequest();
+        xhr.open('PUT', `/api/invoices/upload/chunks/${uploadId}/${index}`);
+        xhr.setRequestHeader('Content-Type', 'application/octet-stream');
+        xhr.setRequestHeader('X-CSRF-Token', document.querySelector('meta[name="csrf-token"]').getAttribute('content'));
+        xhr.upload.onprogress = (e) => onProgress(e.loaded);
+        xhr.onload = () => {
+            if (xhr.status >= 200 && xhr.status < 300) return resolve();
+            let message = `Server responded with status: ${xhr.status}`;
+            try { message = JSON.parse(xhr.responseText).error || message; } catch (e) { /* not JSON */ }
+            reject(new Error(message));
+        };
+        xhr.onerror = () => reject(new Error('Network error while uploading.'));
+        xhr.send(blob);
+    });
+
+    const uploadInChunks = async (files) => {
+        const manifest = [];
+        const tasks = [];
+        files.forEach(file => {
+            const id = newUploadId();
+            const count = Math.max(1, Math.ceil(file.size / uploadSettings.chunkSize));
+            manifest.push({ id, name: file.name, chunks: count });
+            for (let index = 0; index < count; index++) {
+                const start = index * uploadSettings.chunkSize;
+                tasks.push({ id, index, blob: file.slice(start, start + uploadSettings.chunkSize) });
+            }
+        });
+
+        const totalBytes = tasks.reduce((sum, task) => sum + task.blob.size, 0) || 1;
+        const sent = new Map();
+        const report = () => setProgress('Uploading...', Array.from(sent.values()).reduce((a, b) => a + b, 0) / totalBytes);
+
+        // A fixed number of workers drain the shared queue, so chunks of all files go up in parallel
+        let next = 0;
+        const runWorker = async () => {
+            while (next < tasks.length) {
+                const task = tasks[next++];
+                const key = `${task.id}/${task.index}`;
+                for (let attempt = 1; ; attempt++) {
+                    try {
+                        await putChunk(task.id, task.index, task.blob, loaded => { sent.set(key, loaded); report(); });
+                        sent.set(key, task.blob.size);
+                        report();
+                        break;
+                    } catch (error) {
+                        sent.set(key, 0);
+                        if (attempt >= CHUNK_RETRIES) throw error;
+                    }
+                }
+            }
+        };
+        await Promise.all(Array.from({ length: Math.min(uploadSettings.parallelChunks, tasks.length) }, runWorker));
+        return manifest;
+    };
+
     if (invoiceForm && uploadBtn) {
         invoiceForm.addEventListener('submit', async (e) => {
             e.preventDefault();
@@ -96,12 +239,14 @@ document.addEventListener("DOMContentLoaded", () => {
             formData.append('folder-name', document.getElementById('folder-name').value);
             formData.append('categories', document.getElementById('categories').value);
             formData.append('date', document.getElementById('date').value);
-            
-            filesToUpload.forEach(file => {
-                formData.append('files', file);
-            });
 
             try {
+                setProgress('Compressing images...', 0);
+                const prepared = await Promise.all(filesToUpload.map(compressImage));
+                const manifest = await uploadInChunks(prepared);
+                formData.append('chunked_uploads', JSON.stringify(manifest));
+                setProgress('Processing...', 1);
+
                 const response = await fetch('/api/invoices/upload', {
                     method: 'POST',
                     body: formData,
@@ -111,6 +256,12 @@ document.addEventListener("DOMContentLoaded", () => {
                 });
 
                 if (!response.ok) {
+                    // Oversize (413) and unsupported (415) files come back with a JSON reason
+                    const failure = await response.json().catch(() => ({}));
+                    if (failure.error) {
+                        alert(failure.error);
+                        return;
+                    }
                     throw new Error(`Server responded with status: ${response.status}`);
                 }
                 
@@ -137,8 +288,9 @@ document.addEventListener("DOMContentLoaded", () => {
 
             } catch (error) {
                 console.error("Upload failed:", error);
-                alert("An error occurred while uploading the files. Please check the console and try again.");
+                alert(error.message || "An error occurred while uploading the files. Please check the console and try again.");
             } finally {
+                if (progressBox) progressBox.classList.add('hidden');
                 uploadBtn.disabled = false;
                 uploadBtn.textContent = 'Upload';
             }
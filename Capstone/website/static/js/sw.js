@@ -1,113 +1,220 @@
 // website/static/js/sw.js
-const STATIC_CACHE_NAME = 'decooffice-static-v8';
-const DYNAMIC_CACHE_NAME = 'decooffice-dynamic-v8';
-
-const urlsToCache = [
-    '/',
-    '/offline',
-    '/splash',
-    '/static/js/common.js',
-    '/static/js/db.js',
-    'https://cdn.jsdelivr.net/npm/idb@7/build/umd.js',
-    'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.5.1/css/all.min.css',
-    '/static/imgs/icons/logo192.png',
-    '/static/imgs/icons/logo512.png',
-    '/static/imgs/icons/icon-maskable-512.png'
-];
-
-importScripts('https://cdn.jsdelivr.net/npm/idb@7/build/umd.js');
+// Filled in by the /sw.js route from the server's asset manifest, so any
+// static file change installs a new worker with a fresh precache.
+const PRECACHE_VERSION = '__PRECACHE_VERSION__';
+const PRECACHE_NAME = `decooffice-precache-${PRECACHE_VERSION}`;
+
+// Runtime caches and the most entries each keeps (least recently used go first).
+const RUNTIME_CACHES = {
+    pages: { name: 'decooffice-pages', maxEntries: 30 },
+    api: { name: 'decooffice-api', maxEntries: 100 },
+    assets: { name: 'decooffice-assets', maxEntries: 60 },
+    cdn: { name: 'decooffice-cdn', maxEntries: 30 },
+};
+
+// The self-hosted, fingerprinted idb bundle (or its pinned CDN URL).
+importScripts('__IDB_URL__');
 
 self.addEventListener('install', event => {
-    event.waitUntil(
-        caches.open(STATIC_CACHE_NAME).then(cache => cache.addAll(urlsToCache))
-    );
+    event.waitUntil((async () => {
+        const response = await fetch('/precache-manifest.json', { cache: 'no-store' });
+        const manifest = await response.json();
+        const cache = await caches.open(PRECACHE_NAME);
+        await cache.addAll([...manifest.assets, ...manifest.pages]);
+        await self.skipWaiting();
+    })());
 });
 
 self.addEventListener('activate', event => {
-    event.waitUntil(
-        caches.keys().then(keys => Promise.all(
-            keys.filter(key => key !== STATIC_CACHE_NAME && key !== DYNAMIC_CACHE_NAME)
-                .map(key => caches.delete(key))
-        ))
-    );
+    const keep = new Set([PRECACHE_NAME, ...Object.values(RUNTIME_CACHES).map(c => c.name)]);
+    event.waitUntil((async () => {
+        const keys = await caches.keys();
+        await Promise.all(keys.filter(key => !keep.has(key)).map(key => caches.delete(key)));
+        await self.clients.claim();
+    })());
 });
 
-// --- START OF MODIFICATION: Updated Fetch Event Listener ---
+// Cache API keys come back in insertion order, and every hit or refresh
+// re-inserts its entry, so the oldest keys are the least recently used.
+async function putAndTrim(config, request, response) {
+    const cache = await caches.open(config.name);
+    await cache.delete(request);
+    await cache.put(request, response);
+    const keys = await cache.keys();
+    await Promise.all(keys.slice(0, Math.max(0, keys.length - config.maxEntries)).map(key => cache.delete(key)));
+}
+
+function clearRuntimeCaches() {
+    return Promise.all(Object.values(RUNTIME_CACHES).map(c => caches.delete(c.name)));
+}
+
+// Fingerprinted static names (name.<content hash>.ext) never change, so the cached copy is final.
+const HASHED_ASSET_RE = /\.[0-9a-f]{12}\.[a-z0-9]+$/;
+
+async function cacheFirst(request, config) {
+    const cached = await caches.match(request);
+    if (cached) return cached;
+    const response = await fetch(request);
+    if (response.ok) await putAndTrim(config, request, response.clone());
+    return response;
+}
+
+// Answers from the cache at once and refreshes the entry in the background,
+// revalidating with the cached ETag so an unchanged response costs a 304.
+async function staleWhileRevalidate(event, config) {
+    const request = event.request;
+    const cache = await caches.open(config.name);
+    const cached = await cache.match(request);
+
+    const etag = cached && cached.headers.get('ETag');
+    const revalidate = (etag
+        ? fetch(request.url, { headers: { 'If-None-Match': etag }, credentials: 'same-origin' })
+        : fetch(request))
+        .then(async response => {
+            if (response.status === 304 && cached) {
+                await putAndTrim(config, request, cached.clone());
+                return cached;
+            }
+            // Redirects (e.g. to the login page) are not the page that was asked for.
+            if (response.ok && !response.redirected) {
+                await putAndTrim(config, request, response.clone());
+            }
+            return response;
+        });
+
+    if (cached) {
+        event.waitUntil(revalidate.catch(() => {}));
+        return cached;
+    }
+    try {
+        return await revalidate;
+    } catch (error) {
+        if (request.mode === 'navigate') return caches.match('/offline');
+        throw error;
+    }
+}
+
 self.addEventListener('fetch', event => {
-    const url = new URL(event.request.url);
-
-    // --- Special Strategy for Calendar API ---
-    if (url.pathname.startsWith('/api/schedules')) {
-        event.respondWith(
-            // 1. Try to fetch from the network first
-            fetch(event.request).then(networkResponse => {
-                // If successful, cache the response and return it
-                return caches.open(DYNAMIC_CACHE_NAME).then(cache => {
-                    cache.put(event.request.url, networkResponse.clone());
-                    return networkResponse;
-                });
-            }).catch(() => {
-                // If the network request fails (offline), get the data from the cache
-                return caches.match(event.request);
-            })
-        );
-    } 
-    // --- General Strategy for other requests ---
-    else {
-        event.respondWith(
-            caches.match(event.request)
-                .then(cachedResponse => {
-                    // Return from cache if found
-                    if (cachedResponse) {
-                        return cachedResponse;
-                    }
-                    // Otherwise, fetch from network
-                    return fetch(event.request)
-                        .then(networkResponse => {
-                            // If we get a valid response, cache it for future offline use
-                            if (networkResponse && networkResponse.status === 200) {
-                                return caches.open(DYNAMIC_CACHE_NAME).then(cache => {
-                                    cache.put(event.request.url, networkResponse.clone());
-                                    return networkResponse;
-                                });
-                            }
-                            return networkResponse;
-                        })
-                        .catch(() => {
-                            // If both cache and network fail, show the offline page for navigation requests
-                            if (event.request.mode === 'navigate') {
-                                return caches.match('/offline');
-                            }
-                        });
-                })
-        );
+    const request = event.request;
+    const url = new URL(request.url);
+
+    if (url.origin !== self.location.origin) {
+        if (request.method === 'GET') {
+            event.respondWith(staleWhileRevalidate(event, RUNTIME_CACHES.cdn));
+        }
+        return;
+    }
+
+    // Writes, signing in or out and sync traffic go straight to the network.
+    // A write or a session change also drops cached pages and API responses
+    // so the next view is fetched fresh.
+    if (request.method !== 'GET' || url.pathname.startsWith('/auth/')) {
+        event.waitUntil(clearRuntimeCaches());
+        if (url.pathname === '/auth/logout') event.waitUntil(clearUserData());
+        return;
+    }
+    if (url.pathname.startsWith('/api/sync/') || url.pathname === '/precache-manifest.json') {
+        return;
+    }
+
+    if (url.pathname.startsWith('/static/')) {
+        if (HASHED_ASSET_RE.test(url.pathname)) {
+            event.respondWith(cacheFirst(request, RUNTIME_CACHES.assets));
+        } else {
+            event.respondWith(staleWhileRevalidate(event, RUNTIME_CACHES.assets));
+        }
+    } else if (url.pathname.startsWith('/api/')) {
+        event.respondWith(staleWhileRevalidate(event, RUNTIME_CACHES.api));
+    } else if (request.mode === 'navigate' || (request.headers.get('Accept') || '').includes('text/html')) {
+        event.respondWith(staleWhileRevalidate(event, RUNTIME_CACHES.pages));
     }
 });
-// --- END OF MODIFICATION ---
 
 
 // --- Other Service Worker logic (Push, Sync) ---
-const dbPromise = idb.openDB('deco-office-db', 1);
+// Same version and stores as static/js/db.js; whichever opens first creates them.
+const dbPromise = idb.openDB('deco-office-db', 2, {
+    upgrade(db) {
+        if (!db.objectStoreNames.contains('transactions')) {
+            db.createObjectStore('transactions', { keyPath: '_id' });
+        }
+        if (!db.objectStoreNames.contains('transaction-outbox')) {
+            db.createObjectStore('transaction-outbox', { autoIncrement: true, keyPath: 'id' });
+        }
+        if (!db.objectStoreNames.contains('sync-state')) {
+            db.createObjectStore('sync-state');
+        }
+    },
+});
+
+// Signing out drops the offline replica of the user's transactions and its
+// sync token, so the next user of this browser starts from their own snapshot.
+async function clearUserData() {
+    const db = await dbPromise;
+    const tx = db.transaction(['transactions', 'sync-state'], 'readwrite');
+    await Promise.all([tx.objectStore('transactions').clear(), tx.objectStore('sync-state').clear(), tx.done]);
+}
+
+// Must not exceed SYNC_BATCH_LIMIT in models/sync.py.
+const SYNC_BATCH_SIZE = 200;
 
+// Outbox entries are {id (queue key), op, itemId, data, headers}. Older ones
+// kept the item id in 'id' or stored the raw request; an archive (DELETE)
+// of a transaction maps onto the batch API.
+function toBatchOperation(entry) {
+    if (entry.op) return { op: entry.op, id: entry.itemId || entry.id, data: entry.data || {} };
+    const match = entry.method === 'DELETE' && entry.url && entry.url.match(/\/api\/transactions\/([0-9a-f]{24})$/);
+    return match ? { op: 'archive_transaction', id: match[1], data: {} } : null;
+}
+
+async function replayIndividually(db, entry) {
+    const response = await fetch(entry.url, { method: entry.method, headers: entry.headers });
+    if (response.ok) await db.delete('transaction-outbox', entry.id);
+}
+
+// Replays the outbox with one /api/sync/batch request per SYNC_BATCH_SIZE
+// entries. Entries the server applied or rejected for good are removed;
+// 'failed' ones stay queued for the next sync.
 async function syncOutbox() {
     const db = await dbPromise;
-    const outboxStore = db.transaction('transaction-outbox', 'readwrite').store;
-    let requests = await outboxStore.getAll();
-    if (!requests.length) return;
-
-    for (const req of requests) {
-        try {
-            const response = await fetch(req.url, {
-                method: req.method,
-                headers: req.headers,
-            });
-            if (response.ok) {
-                await outboxStore.delete(req.id);
+    const entries = await db.getAll('transaction-outbox');
+    if (!entries.length) return;
+
+    const batchable = [];
+    for (const entry of entries) {
+        const operation = toBatchOperation(entry);
+        if (operation) {
+            batchable.push({ entry, operation });
+        } else {
+            try {
+                await replayIndividually(db, entry);
+            } catch (error) {
+                console.error('Sync failed for request:', entry.id, error);
             }
-        } catch (error) {
-            console.error('Sync failed for request:', req.id, error);
         }
     }
+
+    for (let start = 0; start < batchable.length; start += SYNC_BATCH_SIZE) {
+        const batch = batchable.slice(start, start + SYNC_BATCH_SIZE);
+        // The newest entry carries the freshest CSRF token.
+        const headers = { ...(batch[batch.length - 1].entry.headers || {}), 'Content-Type': 'application/json' };
+        const response = await fetch('/api/sync/batch', {
+            method: 'POST',
+            headers,
+            credentials: 'same-origin',
+            body: JSON.stringify({ operations: batch.map(item => item.operation) }),
+        });
+        if (!response.ok) {
+            console.error('Batch sync failed:', response.status);
+            return;
+        }
+        const { results } = await response.json();
+        const tx = db.transaction('transaction-outbox', 'readwrite');
+        results.forEach((result, index) => {
+            if (result.status !== 'failed') tx.store.delete(batch[index].entry.id);
+        });
+        await tx.done;
+    }
 }
 
 self.addEventListener('sync', event => {
@@ -1,23 +1,34 @@
 # tests/conftest.py
+from unittest import mock
 import pytest
+from flask_jwt_extended import create_access_token
 from website import create_app
+from website.utils.storage import create_storage
+
+TEST_USERNAME = 'tester'
 
 @pytest.fixture(scope='module')
-def app():
+def app(tmp_path_factory):
     """
     Provides a Flask application instance for testing.
     The scope='module' means the app is created once per test module.
+    Uploads go to a temporary folder instead of uploads/.
     """
-    app = create_app('test') 
+    app = create_app('test')
+    upload_root = tmp_path_factory.mktemp('uploads')
     app.config.update({
         "TESTING": True,
-        "RATELIMIT_ENABLED": False, 
+        "RATELIMIT_ENABLED": False,
+        "UPLOAD_FOLDER": str(upload_root / 'invoices'),
+        "PROFILE_PIC_FOLDER": str(upload_root / 'profile_pics'),
+        "UPLOAD_CHUNK_FOLDER": str(upload_root / 'chunks'),
     })
+    app.storage = create_storage(app)
 
-    # Optional: Set up test database or mock database interactions here if needed
     # Give the test client a way to access the app
     with app.app_context():
         yield app
+    app.extensions['mongo'].close()
 
 @pytest.fixture(scope='module')
 def client(app):
@@ -28,10 +39,45 @@ def client(app):
     with app.test_client() as client:
         yield client
 
+@pytest.fixture
+def username():
+    """The user auth_client is signed in as."""
+    return TEST_USERNAME
+
+@pytest.fixture
+def auth_client(app):
+    """A test client signed in as TEST_USERNAME, with CSRF checks off for API calls."""
+    with mock.patch.dict(app.config, {'WTF_CSRF_ENABLED': False}):
+        with app.test_client() as client:
+            client.set_cookie('access_token_cookie', create_access_token(identity=TEST_USERNAME))
+            yield client
+
+class _StandInConnection:
+    """Takes the place of the MongoConnection, so app.db is the given object."""
+    def __init__(self, db):
+        self.db = db
+
+    def database(self, reporting=False):
+        return self.db
+
+@pytest.fixture
+def db(app):
+    """
+    A MagicMock standing in for the MongoDB database (app.db and
+    app.reporting_db). Configure the collections a test needs, e.g.
+    db.transactions.find.return_value = [...].
+    """
+    stand_in = mock.MagicMock(name='db')
+    stand_in.__getitem__.side_effect = lambda name: getattr(stand_in, name)
+    original = app.extensions['mongo']
+    app.extensions['mongo'] = _StandInConnection(stand_in)
+    yield stand_in
+    app.extensions['mongo'] = original
+
 @pytest.fixture(scope='module')
 def runner(app):
     """
     Provides a runner for Flask CLI commands.
     """
     with app.test_cli_runner() as runner:
-        yield runner
\ No newline at end of file
+        yield runner
@@ -0,0 +1,40 @@
+# tests/test_archive.py
+from bson import ObjectId
+from pymongo import DeleteMany
+from website.models import delete_items_permanently, delete_item_permanently
+
+
+def _folders(db, username, folder_id, archived):
+    """Makes db.transactions.find see one folder, archived or not."""
+    def find(query, projection=None):
+        if query.get('isArchived') is True and not archived:
+            return []
+        return [{'_id': folder_id, 'parent_id': None, 'username': username}]
+    db.transactions.find.side_effect = find
+    db.transactions.bulk_write.return_value.deleted_count = 0
+
+
+def _cascade(username, folder_id):
+    return DeleteMany({'username': username, 'parent_id': {'$in': [folder_id]}})
+
+
+def test_deleting_an_active_folder_keeps_its_checks(db, username):
+    folder_id = ObjectId()
+    _folders(db, username, folder_id, archived=False)
+
+    delete_items_permanently(username, [{'type': 'Transaction', 'id': str(folder_id)}])
+    delete_item_permanently(username, 'Transaction', str(folder_id))
+
+    for call in db.transactions.bulk_write.call_args_list:
+        assert _cascade(username, folder_id) not in call.args[0]
+
+
+def test_deleting_an_archived_folder_deletes_its_checks(db, username):
+    folder_id = ObjectId()
+    _folders(db, username, folder_id, archived=True)
+
+    delete_items_permanently(username, [{'type': 'Transaction', 'id': str(folder_id)}])
+
+    operations = db.transactions.bulk_write.call_args.args[0]
+    assert DeleteMany({'_id': {'$in': [folder_id]}, 'username': username, 'isArchived': True}) in operations
+    assert _cascade(username, folder_id) in operations
@@ -0,0 +1,28 @@
+# tests/test_http_cache.py
+
+
+def _data_version(db, seq):
+    db.change_events.find_one.return_value = {'seq': seq}
+    db.notifications.count_documents.return_value = 3
+
+
+def test_unchanged_data_is_answered_with_304(auth_client, db):
+    _data_version(db, 7)
+    first = auth_client.get('/api/notifications/status')
+    assert first.status_code == 200 and first.get_json() == {'unread_count': 3}
+
+    db.notifications.count_documents.reset_mock()
+    second = auth_client.get('/api/notifications/status', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 304
+    assert second.headers['ETag'] == first.headers['ETag']
+    db.notifications.count_documents.assert_not_called()
+
+
+def test_changed_data_gets_a_new_etag(auth_client, db):
+    _data_version(db, 7)
+    first = auth_client.get('/api/notifications/status')
+
+    _data_version(db, 8)
+    second = auth_client.get('/api/notifications/status', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.headers['ETag'] != first.headers['ETag']
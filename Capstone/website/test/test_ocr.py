@@ -0,0 +1,43 @@
+# tests/test_ocr.py
+import io
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+from PIL import Image
+from website.utils import ocr
+
+
+def _pages_then_failure(stream, content_type, filename, dpi, max_pages):
+    yield 1, Image.new('RGB', (40, 40), 'white'), 'x' * ocr.MIN_TEXT_LAYER_CHARS
+    raise ValueError('corrupt page 2')
+
+
+def test_a_file_that_fails_partway_becomes_one_placeholder_page(app):
+    with mock.patch.object(ocr, '_page_images', _pages_then_failure):
+        text, pages = ocr.process_invoice_uploads([
+            ('scan.pdf', io.BytesIO(), 'application/pdf'),
+            ('photo.jpg', io.BytesIO(), 'image/jpeg'),
+        ], 'tester')
+
+    assert [(page['file'], page['page']) for page in pages] == [('scan.pdf', 1), ('photo.jpg', 1)]
+    assert 'thumbnail' not in pages[0] and 'preview' not in pages[0]
+    assert pages[1]['thumbnail'] == pages[1]['preview'] == 'photo.jpg'
+    assert text.count('OCR failed') == 2
+
+
+class _BrokenPool:
+    def submit(self, *args):
+        raise BrokenProcessPool('worker died')
+
+    def shutdown(self, **kwargs):
+        pass
+
+
+def test_a_broken_pool_is_replaced_before_the_next_submit(app):
+    healthy = mock.Mock()
+    healthy.submit.return_value = Future()
+    with mock.patch.object(ocr, '_executor', _BrokenPool()), \
+            mock.patch.object(ocr, 'ProcessPoolExecutor', return_value=healthy):
+        executor, future = ocr._submit_ocr(b'png', 15)
+        assert ocr._executor is healthy
+    assert executor is healthy and future is healthy.submit.return_value
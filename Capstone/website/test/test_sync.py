@@ -0,0 +1,63 @@
+# tests/test_sync.py
+from bson import ObjectId
+from website.models import get_transaction_changes
+
+
+def _owned(db, username, **docs_by_collection):
+    """Makes each collection's find return the given documents as owned by `username`."""
+    for collection_name, docs in docs_by_collection.items():
+        getattr(db, collection_name).find.return_value = [
+            {'_id': doc_id, 'username': username, 'branch': None, **fields} for doc_id, fields in docs
+        ]
+
+
+def test_batch_returns_one_result_per_operation(auth_client, db, username):
+    folder_id, check_id, notification_id = ObjectId(), ObjectId(), ObjectId()
+    _owned(db, username,
+           transactions=[(check_id, {'parent_id': folder_id})],
+           notifications=[(notification_id, {})])
+
+    response = auth_client.post('/api/sync/batch', json={'operations': [
+        {'op': 'read_notification', 'id': str(notification_id)},
+        {'op': 'update_child_transaction', 'id': str(check_id), 'data': {'check_amount': 'abc'}},
+        {'op': 'update_child_transaction', 'id': str(check_id), 'data': {'deductions': ['x']}},
+        {'op': 'read_notification', 'id': str(ObjectId())},
+        {'op': 'drop_database', 'id': str(notification_id)},
+    ]})
+
+    assert response.status_code == 200
+    statuses = [result['status'] for result in response.get_json()['results']]
+    assert statuses == ['ok', 'invalid', 'invalid', 'not_found', 'invalid']
+    db.notifications.bulk_write.assert_called_once()
+    db.transactions.bulk_write.assert_not_called()
+
+
+def test_batch_rejects_an_empty_outbox(auth_client, db):
+    response = auth_client.post('/api/sync/batch', json={'operations': []})
+    assert response.status_code == 400
+
+
+def _finish_snapshot(db, username):
+    """Runs a (one page) full snapshot and returns its delta token."""
+    db.transactions.find.return_value.sort.return_value.limit.return_value = []
+    return get_transaction_changes(username)['next_token']
+
+
+def test_delta_sync_reports_moved_and_deleted_transactions(db, username):
+    token = _finish_snapshot(db, username)
+    moved_id, deleted_id = ObjectId(), ObjectId()
+    db.change_events.find.return_value = [{'entity_id': moved_id}, {'entity_id': deleted_id}]
+
+    page = get_transaction_changes(username, token=token)
+
+    assert not page['reset']
+    assert page['tombstones'] == [{'_id': str(moved_id)}, {'_id': str(deleted_id)}]
+    query = db.change_events.find.call_args.args[0]
+    assert query['username'] == username and query['op'] == {'$in': ['move', 'delete']}
+
+
+def test_another_users_sync_token_restarts_with_a_snapshot(db, username):
+    token = _finish_snapshot(db, 'someone-else')
+    page = get_transaction_changes(username, token=token)
+    assert page['reset']
+    db.change_events.find.assert_not_called()
@@ -0,0 +1,47 @@
+# tests/test_uploads.py
+import io
+import os
+from unittest import mock
+from website.utils.storage import is_immutable_name
+from website.utils.uploads import unique_upload_name
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 2048
+
+
+def _post_invoice(client):
+    return client.post('/api/invoices/upload', data={
+        'folder-name': 'Receipts',
+        'files': (io.BytesIO(PNG), 'victim.png'),
+    }, content_type='multipart/form-data')
+
+
+def _stored_invoices(app):
+    return os.listdir(app.config['UPLOAD_FOLDER'])
+
+
+def test_upload_without_csrf_token_stores_nothing(app, client):
+    response = _post_invoice(client)
+    assert response.status_code == 400
+    assert _stored_invoices(app) == []
+
+
+def test_upload_without_login_stores_nothing(app, client):
+    with mock.patch.dict(app.config, {'WTF_CSRF_ENABLED': False}):
+        response = _post_invoice(client)
+    assert response.status_code == 401
+    assert _stored_invoices(app) == []
+
+
+def test_upload_names_are_unique_and_server_generated():
+    first, second = unique_upload_name('victim.png'), unique_upload_name('victim.png')
+    assert first != second
+    assert first != 'victim.png' and first.endswith('.victim.png')
+    assert unique_upload_name('../../etc/passwd').endswith('.etc_passwd')
+
+
+def test_only_content_hash_names_are_immutable():
+    digest = 'ab' * 16
+    assert is_immutable_name(f'tester_96_{digest}.webp')
+    assert is_immutable_name(f'tester_preview_{digest}.jpg')
+    assert not is_immutable_name(f'invoice_{digest}.pdf')
+    assert not is_immutable_name(unique_upload_name(f'tester_preview_{digest}.jpg'))
@@ -0,0 +1,156 @@
+# website/utils/assets.py
+
+import hashlib
+import logging
+import os
+import re
+from flask import current_app, url_for
+
+logger = logging.getLogger(__name__)
+
+# Hex digits of a file's sha256 used as its revision.
+ASSET_HASH_LENGTH = 12
+
+# Static files that are never served to the browser as app assets.
+PRECACHE_EXCLUDE = frozenset({'js/sw.js', 'css/input.css'})
+# Font formats every supported browser can do without (woff2 is used instead).
+PRECACHE_EXCLUDE_SUFFIXES = ('.ttf',)
+
+# Pages the service worker keeps for offline use.
+PRECACHE_PAGES = ('/offline',)
+
+# Third-party bundles kept under static/vendor by vendor_assets_task.py:
+# name -> (vendored path, pinned CDN URL, used only with VENDOR_CDN_FALLBACK).
+VENDOR_ASSETS = {
+    'idb': ('vendor/idb/umd.js', 'https://cdn.jsdelivr.net/npm/idb@7.1.1/build/umd.js'),
+    'fontawesome': ('vendor/fontawesome/css/all.min.css',
+                    'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.5.1/css/all.min.css'),
+}
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_FINGERPRINT_RE = re.compile(r'^(?P<stem>.+)\.(?P<revision>[0-9a-f]{%d})(?P<ext>\.[^./]+)$' % ASSET_HASH_LENGTH)
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()[:ASSET_HASH_LENGTH]
+
+
+def build_asset_manifest(static_folder):
+    """
+    Hashes every file under `static_folder`. Returns {'version': ...,
+    'files': {relative path: revision}}; the version changes whenever any
+    file does.
+    """
+    files = {}
+    for root, _, names in os.walk(static_folder):
+        for name in names:
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            files[relative] = _file_hash(path)
+    version = hashlib.sha256(''.join(f"{k}:{v};" for k, v in sorted(files.items())).encode('utf-8'))
+    return {'version': version.hexdigest()[:ASSET_HASH_LENGTH], 'files': files}
+
+
+def get_asset_manifest():
+    return current_app.extensions['asset_manifest']
+
+
+def fingerprinted_name(filename, revision):
+    """'js/common.js' -> 'js/common.<revision>.js'."""
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.{revision}{ext}"
+
+
+def split_fingerprint(filename):
+    """
+    Returns (original name, revision) for a fingerprinted static name of a
+    known file, or (None, None) if `filename` is not one.
+    """
+    match = _FINGERPRINT_RE.match(filename)
+    if not match:
+        return None, None
+    original = match.group('stem') + match.group('ext')
+    if original not in get_asset_manifest()['files']:
+        return None, None
+    return original, match.group('revision')
+
+
+def asset_url(filename):
+    """URL of a static file; with fingerprinting on it changes whenever the file's content does."""
+    return url_for('static', filename=filename)
+
+
+def vendor_asset_url(name):
+    """
+    The self-hosted copy of a VENDOR_ASSETS bundle. Its pinned CDN URL is
+    only used with VENDOR_CDN_FALLBACK (development), since init_assets
+    refuses to start without the copies otherwise.
+    """
+    path, cdn_url = VENDOR_ASSETS[name]
+    if path in get_asset_manifest()['files']:
+        return asset_url(path)
+    return cdn_url
+
+
+def precache_manifest():
+    """What the service worker caches at install: every app asset, by hashed URL, plus the offline pages."""
+    manifest = get_asset_manifest()
+    return {
+        'version': manifest['version'],
+        'assets': [asset_url(filename) for filename in sorted(manifest['files'])
+                   if filename not in PRECACHE_EXCLUDE and not filename.endswith(PRECACHE_EXCLUDE_SUFFIXES)],
+        'pages': list(PRECACHE_PAGES),
+    }
+
+
+def init_assets(app):
+    """
+    Hashes the static folder once at startup. With ASSET_FINGERPRINTING on,
+    url_for('static', ...) (and so asset_url) produces content-hashed names,
+    which the static route serves as immutable.
+    """
+    app.extensions['asset_manifest'] = build_asset_manifest(app.static_folder)
+    logger.info(f"Asset manifest {app.extensions['asset_manifest']['version']}: "
+                f"{len(app.extensions['asset_manifest']['files'])} files")
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.jinja_env.globals['vendor_asset_url'] = vendor_asset_url
+    missing = [name for name, (path, _) in VENDOR_ASSETS.items()
+               if path not in app.extensions['asset_manifest']['files']]
+    if missing and not app.config.get('VENDOR_CDN_FALLBACK'):
+        raise RuntimeError(f"Vendored assets missing ({', '.join(missing)}); "
+                           f"run website/vendor_assets_task.py and commit static/vendor/.")
+    if missing:
+        logger.warning(f"Vendored assets missing ({', '.join(missing)}), serving them from the CDN; "
+                       f"run website/vendor_assets_task.py and commit static/vendor/.")
+
+    if not app.config.get('ASSET_FINGERPRINTING', True):
+        return
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        if endpoint != 'static' or 'filename' not in values:
+            return
+        revision = app.extensions['asset_manifest']['files'].get(values['filename'])
+        if revision is not None:
+            values['filename'] = fingerprinted_name(values['filename'], revision)
+
+    send_static = app.view_functions['static']
+
+    def serve_static(filename):
+        original, revision = split_fingerprint(filename)
+        if original is None:
+            return send_static(filename=filename)
+        response = send_static(filename=original)
+        if revision == get_asset_manifest()['files'][original]:
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        else:
+            # A name from an older deploy: serve the current file, but never cache it under that name.
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    app.view_functions['static'] = serve_static
@@ -0,0 +1,122 @@
+# website/utils/compression.py
+
+import gzip
+import logging
+import os
+import threading
+from flask import request
+from .assets import get_asset_manifest, split_fingerprint
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available.
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Text formats worth compressing. Images (other than SVG), PDFs and fonts
+# are already compressed and are never touched.
+COMPRESSIBLE_MIMETYPES = frozenset({
+    'text/html', 'text/css', 'text/plain', 'text/xml', 'text/javascript', 'text/csv',
+    'application/javascript', 'application/json', 'application/manifest+json',
+    'application/xml', 'image/svg+xml',
+})
+
+# Compressed static files: (filename, encoding) -> (revision, bytes). A new
+# revision replaces the old one, so there is one entry per manifest file and
+# encoding however often the assets change.
+_static_variants = {}
+_static_lock = threading.Lock()
+
+
+def _compress(data, encoding, gzip_level, brotli_quality):
+    if encoding == 'br':
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+
+
+def _negotiate(accept_encodings):
+    """The supported encoding the client rates highest (br on a tie), or None."""
+    candidates = [('gzip', accept_encodings['gzip'])]
+    if brotli is not None:
+        candidates.insert(0, ('br', accept_encodings['br']))
+    encoding, quality = max(candidates, key=lambda candidate: candidate[1])
+    return encoding if quality > 0 else None
+
+
+def _static_variant(app, filename, encoding):
+    """The compressed bytes of a static file at its current revision, compressed once at maximum level."""
+    revision = get_asset_manifest()['files'][filename]
+    key = (filename, encoding)
+    cached = _static_variants.get(key)
+    if cached is not None and cached[0] == revision:
+        return cached[1]
+    with open(os.path.join(app.static_folder, *filename.split('/')), 'rb') as f:
+        variant = _compress(f.read(), encoding,
+                            app.config.get('COMPRESSION_STATIC_GZIP_LEVEL', 9),
+                            app.config.get('COMPRESSION_STATIC_BROTLI_QUALITY', 11))
+    with _static_lock:
+        _static_variants[key] = (revision, variant)
+    return variant
+
+
+def _static_filename():
+    """Manifest name of the static file being served, or None if this is not a static request."""
+    if request.endpoint != 'static' or not request.view_args:
+        return None
+    filename = request.view_args.get('filename', '')
+    original, _ = split_fingerprint(filename)
+    filename = original or filename
+    return filename if filename in get_asset_manifest()['files'] else None
+
+
+def init_compression(app):
+    """
+    Compresses text responses above COMPRESSION_MIN_SIZE with Brotli or gzip,
+    whichever the client prefers and the server supports. Static files are
+    compressed once per revision at the static levels and served from
+    memory afterwards. Must be installed before init_conditional_responses
+    so ETags and 304s are decided on the uncompressed body.
+    """
+    if not app.config.get('COMPRESSION_ENABLED', True):
+        return
+
+    @app.after_request
+    def compress_response(response):
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return response
+        response.vary.add('Accept-Encoding')
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers or 'Range' in request.headers
+                or request.method == 'HEAD'):
+            return response
+        encoding = _negotiate(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        static_filename = _static_filename()
+        if static_filename is not None:
+            if (response.content_length or 0) < app.config.get('COMPRESSION_MIN_SIZE', 500):
+                return response
+            data = _static_variant(app, static_filename, encoding)
+        else:
+            if response.direct_passthrough or response.is_streamed:
+                return response
+            body = response.get_data()
+            if len(body) < app.config.get('COMPRESSION_MIN_SIZE', 500):
+                return response
+            data = _compress(body, encoding,
+                             app.config.get('COMPRESSION_GZIP_LEVEL', 6),
+                             app.config.get('COMPRESSION_BROTLI_QUALITY', 4))
+
+        if response.direct_passthrough and hasattr(response.response, 'close'):
+            response.response.close()
+        response.direct_passthrough = False
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        # The body differs per encoding, so the validator becomes weak;
+        # If-None-Match still matches it for the next conditional request.
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
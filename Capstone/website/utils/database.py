@@ -0,0 +1,188 @@
+# website/utils/database.py
+
+import logging
+import random
+import threading
+import time
+import pymongo
+from flask import Flask
+from pymongo import MongoClient
+from pymongo.monitoring import TopologyListener
+from pymongo.read_preferences import SecondaryPreferred
+
+logger = logging.getLogger(__name__)
+
+# Circuit breaker states: not tried yet, connected, and failing fast until
+# the next reconnect attempt.
+_UNKNOWN, _CLOSED, _OPEN = 'unknown', 'closed', 'open'
+
+
+def _milliseconds(value):
+    """Config value in ms, where 0 means "no limit" (None to pymongo)."""
+    return value or None
+
+
+def mongo_client_options(config):
+    """MongoClient keyword arguments from the MONGO_* settings."""
+    return dict(
+        maxPoolSize=config['MONGO_MAX_POOL_SIZE'],
+        minPoolSize=config['MONGO_MIN_POOL_SIZE'],
+        maxIdleTimeMS=_milliseconds(config['MONGO_MAX_IDLE_TIME_MS']),
+        waitQueueTimeoutMS=_milliseconds(config['MONGO_WAIT_QUEUE_TIMEOUT_MS']),
+        serverSelectionTimeoutMS=config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+        connectTimeoutMS=config['MONGO_CONNECT_TIMEOUT_MS'],
+        socketTimeoutMS=_milliseconds(config['MONGO_SOCKET_TIMEOUT_MS']),
+        # Compressors whose library is not installed are skipped by pymongo with a warning.
+        compressors=config['MONGO_COMPRESSORS'] or None,
+        zlibCompressionLevel=config['MONGO_ZLIB_COMPRESSION_LEVEL'],
+        retryWrites=config['MONGO_RETRY_WRITES'],
+        retryReads=config['MONGO_RETRY_READS'],
+        appname=config['MONGO_APP_NAME'],
+    )
+
+
+def reporting_database(db, config):
+    """
+    `db` with the reporting read preference: secondaryPreferred, and only
+    from secondaries at most MONGO_REPORTING_MAX_STALENESS_SECONDS behind
+    (-1 accepts any lag). Used by analytics and archive listings, which
+    tolerate slightly stale data, to keep their reads off the primary.
+    """
+    return db.with_options(read_preference=SecondaryPreferred(
+        max_staleness=config['MONGO_REPORTING_MAX_STALENESS_SECONDS']
+    ))
+
+
+class _TopologyWatcher(TopologyListener):
+    """Tells the connection when the driver loses or regains every server."""
+    def __init__(self, connection):
+        self.connection = connection
+
+    def opened(self, event):
+        pass
+
+    def description_changed(self, event):
+        if self.connection._client is None:
+            return  # Closed; late events from its monitors mean nothing.
+        if event.new_description.has_known_servers:
+            self.connection.mark_available()
+        elif event.previous_description.has_known_servers:
+            self.connection.mark_unavailable('all servers became unreachable')
+
+    def closed(self, event):
+        pass
+
+
+class MongoConnection:
+    """
+    Lazily verified MongoDB handle behind a circuit breaker.
+
+    The client is created and pinged on first use (or by the startup
+    thread), never during create_app. While MongoDB is unreachable the
+    breaker is open: database() returns None immediately, and one caller
+    at a time retries after an exponential backoff between
+    MONGO_RECONNECT_BASE_DELAY_SECONDS and MONGO_RECONNECT_MAX_DELAY_SECONDS.
+    The driver's own monitoring closes the breaker as soon as a server is
+    reachable again, and opens it when every server is lost.
+    """
+    def __init__(self, app):
+        self.config = app.config
+        self._lock = threading.Lock()
+        self._state = _UNKNOWN
+        self._failures = 0
+        self._retry_at = 0.0
+        self._indexed = False
+        self._client = self._db = self._reporting_db = None
+
+    def database(self, reporting=False):
+        """app.db (or app.reporting_db with `reporting`), or None while MongoDB is unreachable."""
+        if self._state != _CLOSED and not self._reconnect():
+            return None
+        return self._reporting_db if reporting else self._db
+
+    def _reconnect(self):
+        if self._state == _UNKNOWN:
+            # First use: wait for the attempt already in flight rather than fail.
+            with self._lock:
+                if self._state == _UNKNOWN:
+                    self._connect()
+            return self._state == _CLOSED
+        if time.monotonic() < self._retry_at or not self._lock.acquire(blocking=False):
+            return False
+        try:
+            if self._state == _OPEN:
+                self._connect()
+        finally:
+            self._lock.release()
+        return self._state == _CLOSED
+
+    def _connect(self):
+        try:
+            if self._client is None:
+                self._client = MongoClient(self.config['MONGO_URI'], event_listeners=[_TopologyWatcher(self)],
+                                           **mongo_client_options(self.config))
+                self._db = self._client.get_database(self.config['MONGO_DB_NAME'])
+                self._reporting_db = reporting_database(self._db, self.config)
+            with pymongo.timeout(self.config['MONGO_PROBE_TIMEOUT_SECONDS']):
+                self._client.admin.command('ping')
+        except Exception as e:
+            self.mark_unavailable(e)
+            return
+        logger.info("Successfully connected to MongoDB.")
+        self.mark_available()
+
+    def mark_available(self):
+        if self._client is None or self._state == _CLOSED:
+            return
+        if self._state == _OPEN:
+            logger.info(f"MongoDB reachable again after {self._failures} failed attempt(s).")
+        self._state = _CLOSED
+        self._failures = 0
+        if not self._indexed:
+            self._indexed = True
+            from ..models.indexes import ensure_indexes
+            threading.Thread(target=ensure_indexes, args=(self._db,), name='ensure-indexes', daemon=True).start()
+
+    def close(self):
+        """Stops the driver's monitor threads; a later database() call reconnects."""
+        with self._lock:
+            client, self._client = self._client, None
+            self._db = self._reporting_db = None
+            self._state, self._failures, self._retry_at = _UNKNOWN, 0, 0.0
+        if client is not None:
+            client.close()
+
+    def mark_unavailable(self, reason):
+        self._failures += 1
+        delay = min(self.config['MONGO_RECONNECT_BASE_DELAY_SECONDS'] * 2 ** (self._failures - 1),
+                    self.config['MONGO_RECONNECT_MAX_DELAY_SECONDS'])
+        # Jitter keeps processes that lost the database together from retrying in lockstep.
+        delay = random.uniform(delay / 2, delay)
+        self._retry_at = time.monotonic() + delay
+        self._state = _OPEN
+        logger.error(f"MongoDB unavailable ({reason}); failing fast, next attempt in {delay:.1f}s.")
+
+
+class MongoFlask(Flask):
+    """Flask app whose `db` and `reporting_db` go through its MongoConnection on every access."""
+    @property
+    def db(self):
+        connection = self.extensions.get('mongo')
+        return connection.database() if connection else None
+
+    @property
+    def reporting_db(self):
+        connection = self.extensions.get('mongo')
+        return connection.database(reporting=True) if connection else None
+
+
+def init_database(app):
+    """
+    Sets up app.db (primary reads and all writes) and app.reporting_db
+    without waiting for MongoDB: the first connection attempt runs in the
+    background (on first use under TESTING), and either handle is None
+    while the server is unreachable.
+    """
+    connection = app.extensions['mongo'] = MongoConnection(app)
+    if not app.config.get('TESTING'):
+        threading.Thread(target=connection.database, name='mongo-connect', daemon=True).start()
@@ -0,0 +1,58 @@
+# website/utils/http_cache.py
+
+import hashlib
+from functools import wraps
+from flask import current_app, request, session
+from flask_jwt_extended import get_jwt_identity
+
+# Response types the service worker revalidates with If-None-Match.
+REVALIDATED_MIMETYPES = frozenset({'text/html', 'application/json'})
+
+
+def init_conditional_responses(app):
+    """
+    Gives GET HTML and JSON responses an ETag and answers a matching
+    If-None-Match with 304, so a cached page or API response is confirmed
+    without sending the body again.
+    """
+    @app.after_request
+    def add_etag(response):
+        if (request.method == 'GET' and response.status_code == 200
+                and response.mimetype in REVALIDATED_MIMETYPES
+                and not response.is_streamed and 'ETag' not in response.headers):
+            response.add_etag()
+            response.make_conditional(request)
+        return response
+
+
+def conditional_view(version):
+    """
+    Answers If-None-Match for a GET JSON view without running it.
+
+    `version(username, **view_args)` returns a cheap value that changes
+    whenever the view's data does (e.g. models.get_data_version), or None
+    if it cannot tell. The ETag is derived from it together with the user,
+    the selected branch and the full URL, so a matching If-None-Match gets
+    a 304 after a single lookup; otherwise the view runs and its response
+    carries that ETag. Goes below @jwt_required().
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            current = version(get_jwt_identity(), **kwargs)
+            if current is None:
+                return view(*args, **kwargs)
+            key = '|'.join(str(part) for part in (
+                request.endpoint, get_jwt_identity(), session.get('selected_branch'), request.full_path, current
+            ))
+            etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+                response.set_etag(etag, weak=True)
+                return response
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag, weak=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,100 @@
+# website/utils/images.py
+
+import hashlib
+import io
+import logging
+from flask import url_for
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Square avatar edge lengths (px) rendered for every profile picture upload.
+AVATAR_SIZES = (48, 96, 256)
+
+# Output formats: key -> (Pillow format, content type, file extension, save options)
+AVATAR_FORMATS = {
+    'webp': ('WEBP', 'image/webp', 'webp', {'method': 4}),
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg', {'optimize': True, 'progressive': True}),
+}
+
+
+def build_avatar_variants(stream, name_prefix, quality=80):
+    """
+    Resizes an uploaded picture into square WebP and JPEG avatars for every
+    size in AVATAR_SIZES.
+
+    Each variant is named after a hash of its own bytes, so a name always
+    refers to the same content and can be cached as immutable.
+
+    Returns a list of (size, format_key, filename, bytes, content_type).
+    Raises OSError if the upload is not a readable image.
+    """
+    with Image.open(stream) as img:
+        # Let the JPEG decoder skip detail we are about to throw away.
+        img.draft('RGB', (max(AVATAR_SIZES) * 2, max(AVATAR_SIZES) * 2))
+        img = ImageOps.exif_transpose(img)
+        img.load()
+
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'PA') else 'RGB')
+
+    variants = []
+    for size in AVATAR_SIZES:
+        square = ImageOps.fit(img, (size, size), Image.LANCZOS)
+        for format_key, (pil_format, content_type, ext, options) in AVATAR_FORMATS.items():
+            frame = square
+            if pil_format == 'JPEG' and frame.mode == 'RGBA':
+                # JPEG has no alpha channel; flatten onto white.
+                background = Image.new('RGB', frame.size, (255, 255, 255))
+                background.paste(frame, mask=frame.split()[3])
+                frame = background
+
+            buffer = io.BytesIO()
+            frame.save(buffer, pil_format, quality=quality, **options)
+            data = buffer.getvalue()
+
+            digest = hashlib.sha256(data).hexdigest()[:32]
+            filename = f"{name_prefix}_{size}_{digest}.{ext}"
+            variants.append((size, format_key, filename, data, content_type))
+    return variants
+
+
+def avatar_sources(user, display_px):
+    """
+    Picks the avatar files for an element rendered at `display_px` CSS pixels.
+
+    Returns a dict with `src` (JPEG fallback) and, for resized avatars,
+    `webp_srcset` / `jpeg_srcset` offering 1x and 2x candidates, or None if
+    the user has no picture. Users whose picture predates resizing only get
+    `src` pointing at the original upload.
+    """
+    if not user:
+        return None
+
+    variants = user.get('profile_picture_variants')
+    if not variants:
+        legacy = user.get('profile_picture_url')
+        if not legacy:
+            return None
+        return {'src': url_for('main.serve_profile_picture', filename=legacy)}
+
+    available = sorted(int(size) for size in variants)
+
+    def pick(target):
+        return next((size for size in available if size >= target), available[-1])
+
+    one_x, two_x = pick(display_px), pick(display_px * 2)
+
+    def srcset(format_key):
+        candidates = []
+        for density, size in (('1x', one_x), ('2x', two_x)):
+            filename = variants[str(size)].get(format_key)
+            if filename:
+                candidates.append(f"{url_for('main.serve_profile_picture', filename=filename)} {density}")
+        return ', '.join(candidates)
+
+    return {
+        'src': url_for('main.serve_profile_picture', filename=variants[str(one_x)]['jpeg']),
+        'webp_srcset': srcset('webp'),
+        'jpeg_srcset': srcset('jpeg'),
+    }
@@ -0,0 +1,98 @@
+# website/utils/json_provider.py
+
+import base64
+import decimal
+from datetime import date, datetime
+import pytz
+from bson import Binary, Decimal128, ObjectId, Timestamp
+from bson.datetime_ms import DatetimeMS
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the standard library encoder is the fallback.
+    orjson = None
+
+
+def _default(o):
+    """
+    Encodes what the JSON types do not cover: BSON values as they are read
+    from MongoDB, and datetimes as ISO 8601 (naive ones are UTC, like
+    everything pymongo returns). Anything else goes to Flask's default.
+    """
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, datetime):
+        return (pytz.utc.localize(o) if o.tzinfo is None else o).isoformat()
+    if isinstance(o, date):
+        return o.isoformat()
+    if isinstance(o, Decimal128):
+        return str(o.to_decimal())
+    if isinstance(o, decimal.Decimal):
+        return str(o)
+    if isinstance(o, DatetimeMS):
+        return _default(o.as_datetime())
+    if isinstance(o, Timestamp):
+        return _default(o.as_datetime())
+    if isinstance(o, (Binary, bytes)):
+        return base64.b64encode(o).decode('ascii')
+    return DefaultJSONProvider.default(o)
+
+
+class BSONJSONProvider(DefaultJSONProvider):
+    """
+    app.json provider that encodes documents straight from MongoDB, so
+    views need not convert ObjectIds and datetimes to strings first. Uses
+    orjson when it is installed and the standard library otherwise; both
+    encode values the same way (use_orjson=False forces the standard
+    library, e.g. to compare the two). Non-ASCII text is written as UTF-8
+    rather than escaped.
+    """
+    default = staticmethod(_default)
+    ensure_ascii = False
+
+    def __init__(self, app, use_orjson=True):
+        super().__init__(app)
+        self._orjson = orjson if use_orjson else None
+
+    def _options(self, indent=False):
+        options = self._orjson.OPT_NAIVE_UTC | self._orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= self._orjson.OPT_SORT_KEYS
+        if indent:
+            options |= self._orjson.OPT_INDENT_2
+        return options
+
+    def _dump_bytes(self, obj, indent=False):
+        """UTF-8 JSON for `obj`, or None if orjson is unavailable or cannot encode it (e.g. a huge int)."""
+        if self._orjson is None:
+            return None
+        try:
+            return self._orjson.dumps(obj, default=_default, option=self._options(indent))
+        except self._orjson.JSONEncodeError:
+            return None
+
+    def dumps(self, obj, **kwargs):
+        if not kwargs:
+            data = self._dump_bytes(obj)
+            if data is not None:
+                return data.decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self._orjson is not None and not kwargs:
+            return self._orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        data = self._dump_bytes(obj, indent=indent)
+        if data is None:
+            return super().response(obj)
+        return self._app.response_class(data, mimetype=self.mimetype)
+
+
+def init_json_provider(app):
+    app.json_provider_class = BSONJSONProvider
+    app.json = BSONJSONProvider(app)
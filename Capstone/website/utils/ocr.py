@@ -0,0 +1,207 @@
+# website/utils/ocr.py
+
+import hashlib
+import io
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app
+from PIL import Image, ImageOps
+import pypdfium2 as pdfium
+import pytesseract
+from .storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+PAGE_SEPARATOR = "\n\n"
+THUMBNAIL_SIZE = 256
+PREVIEW_SIZE = 1200
+
+# A PDF page with at least this many characters in its text layer is
+# born-digital, so its text is taken directly instead of being OCR'd.
+MIN_TEXT_LAYER_CHARS = 40
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_ocr_executor():
+    """Lazily starts the shared OCR process pool."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=current_app.config.get('OCR_MAX_WORKERS') or None,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _executor
+
+
+def reset_ocr_executor(broken):
+    """
+    Discards a pool that a crashed worker left broken (BrokenProcessPool),
+    so the next get_ocr_executor() starts a fresh one. Another thread may
+    already have replaced it, in which case the new pool is kept.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit_ocr(png, timeout):
+    """Queues one page on the OCR pool, replacing the pool once if it is broken."""
+    executor = get_ocr_executor()
+    try:
+        return executor, executor.submit(perform_ocr_on_image, png, timeout)
+    except BrokenProcessPool:
+        logger.warning("OCR process pool was broken by a crashed worker; starting a new one.")
+        reset_ocr_executor(executor)
+        executor = get_ocr_executor()
+        return executor, executor.submit(perform_ocr_on_image, png, timeout)
+
+
+def perform_ocr_on_image(image_path, timeout=15):
+    """
+    Performs Optical Character Recognition (OCR) on an image file using Tesseract.
+    Accepts a path, a readable file object or raw image bytes.
+    """
+    try:
+        if isinstance(image_path, bytes):
+            image_path = io.BytesIO(image_path)
+        return pytesseract.image_to_string(Image.open(image_path), timeout=timeout)
+    except pytesseract.TesseractNotFoundError:
+        logger.error("TESSERACT NOT FOUND: The Tesseract executable was not found in the system's PATH.")
+        return "OCR Error: Tesseract executable not found. Please check the server configuration."
+    except RuntimeError as timeout_error:
+        logger.error(f"OCR timed out for image: {timeout_error}")
+        return "OCR failed: Processing timed out. The image may be too complex."
+    except Exception as e:
+        logger.error(f"An unexpected OCR error occurred for image: {e}")
+        return f"OCR failed: An unexpected error occurred. Check server logs for details. (Error: {str(e)[:100]})"
+
+
+def _encode_image(img, max_size, quality=80):
+    frame = img.copy()
+    frame.thumbnail((max_size, max_size), Image.LANCZOS)
+    if frame.mode not in ('RGB', 'L'):
+        frame = frame.convert('RGB')
+    buffer = io.BytesIO()
+    frame.save(buffer, 'JPEG', quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def _page_images(stream, content_type, filename, dpi, max_pages):
+    """
+    Yields (page_number, PIL image, text_layer) for every page of an upload.
+    Images are a single page; PDFs are rasterized one page at a time so only
+    one rendered page is held in memory.
+    """
+    is_pdf = content_type == 'application/pdf' or filename.lower().endswith('.pdf')
+    if not is_pdf:
+        with Image.open(stream) as img:
+            img = ImageOps.exif_transpose(img)
+            img.load()
+        yield 1, img, None
+        return
+
+    pdf = pdfium.PdfDocument(stream.read())
+    try:
+        page_count = min(len(pdf), max_pages)
+        if len(pdf) > max_pages:
+            logger.warning(f"PDF {filename} has {len(pdf)} pages; only the first {max_pages} are processed.")
+        for index in range(page_count):
+            page = pdf[index]
+            try:
+                textpage = page.get_textpage()
+                text_layer = textpage.get_text_range()
+                textpage.close()
+                bitmap = page.render(scale=dpi / 72)
+                img = bitmap.to_pil()
+                yield index + 1, img, text_layer
+            finally:
+                page.close()
+    finally:
+        pdf.close()
+
+
+def process_invoice_uploads(uploads, name_prefix):
+    """
+    Splits uploads into pages, OCRs the pages in parallel on the process
+    pool and stitches the results back together in upload order.
+
+    `uploads` is a list of (filename, stream, content_type) for files that
+    are already stored. Per-page previews and thumbnails are written to the
+    'invoices' bucket under content-hash names.
+
+    Returns (full_text, pages) where each page is
+    {'file', 'page', 'thumbnail', 'preview', 'text_start', 'text_end'};
+    the offsets index into full_text. A file that could not be split into
+    pages gets a single page instead; it uses the file itself as thumbnail
+    and preview if it is an image, and has neither if it is a PDF.
+    """
+    config = current_app.config
+    dpi = config.get('OCR_PDF_DPI', 200)
+    max_pages = config.get('INVOICE_PDF_MAX_PAGES', 50)
+    timeout = config.get('OCR_PAGE_TIMEOUT', 15)
+    storage = get_storage()
+
+    pending = []
+    for filename, stream, content_type in uploads:
+        file_pending = []
+        try:
+            for page_number, img, text_layer in _page_images(stream, content_type, filename, dpi, max_pages):
+                page = {'file': filename, 'page': page_number}
+                for key, size in (('thumbnail', THUMBNAIL_SIZE), ('preview', PREVIEW_SIZE)):
+                    data = _encode_image(img, size)
+                    name = f"{name_prefix}_{key}_{hashlib.sha256(data).hexdigest()[:32]}.jpg"
+                    storage.save('invoices', name, io.BytesIO(data), 'image/jpeg')
+                    page[key] = name
+
+                if text_layer and len(text_layer.strip()) >= MIN_TEXT_LAYER_CHARS:
+                    result = text_layer
+                else:
+                    png = io.BytesIO()
+                    img.save(png, 'PNG')
+                    result = _submit_ocr(png.getvalue(), timeout)
+                file_pending.append((page, result))
+        except Exception as e:
+            logger.error(f"Could not split {filename} into pages: {e}", exc_info=True)
+            # Pages read before the failure are dropped with the rest of the file.
+            for _, result in file_pending:
+                if not isinstance(result, str):
+                    result[1].cancel()
+            page = {'file': filename, 'page': 1}
+            if (content_type or '').startswith('image/'):
+                page['thumbnail'] = page['preview'] = filename
+            file_pending = [(page, f"OCR failed: Could not read {filename}.")]
+        pending.extend(file_pending)
+
+    texts = []
+    pages = []
+    offset = 0
+    for page, result in pending:
+        if isinstance(result, str):
+            text = result
+        else:
+            executor, future = result
+            try:
+                text = future.result()
+            except BrokenProcessPool as e:
+                logger.error(f"OCR worker crashed on {page['file']} page {page['page']}: {e}")
+                reset_ocr_executor(executor)
+                text = "OCR failed: An unexpected error occurred. Check server logs for details."
+            except Exception as e:
+                logger.error(f"OCR worker failed for {page['file']} page {page['page']}: {e}", exc_info=True)
+                text = "OCR failed: An unexpected error occurred. Check server logs for details."
+        if texts:
+            offset += len(PAGE_SEPARATOR)
+        page['text_start'] = offset
+        page['text_end'] = offset + len(text)
+        offset = page['text_end']
+        texts.append(text)
+        pages.append(page)
+    return PAGE_SEPARATOR.join(texts), pages
@@ -0,0 +1,127 @@
+# website/utils/receipt_fields.py
+
+import logging
+import re
+from datetime import datetime
+import pytz
+
+logger = logging.getLogger(__name__)
+
+# name -> {field: [(compiled regex, parser), ...]}
+# Patterns for a field are tried in order; the first one that yields a
+# value wins, so the most specific labels should come first.
+PATTERN_SETS = {}
+
+DEFAULT_PATTERN_SET = 'ph_receipt'
+
+
+def register_pattern_set(name, patterns):
+    """
+    Registers (or replaces) a named pattern set. `patterns` maps a field name
+    to a list of (regex, parser) pairs; the parser receives the regex match
+    and returns the typed value, or None to try the next candidate.
+    """
+    PATTERN_SETS[name] = {
+        field: [(re.compile(regex, re.IGNORECASE | re.MULTILINE) if isinstance(regex, str) else regex, parser)
+                for regex, parser in candidates]
+        for field, candidates in patterns.items()
+    }
+
+
+def extract_invoice_fields(text, pattern_set=DEFAULT_PATTERN_SET):
+    """
+    Runs a pattern set over OCR text and returns the typed fields it found,
+    e.g. {'total_amount': 1250.0, 'receipt_date': datetime, ...}. Fields
+    that are not found are left out.
+    """
+    patterns = PATTERN_SETS.get(pattern_set)
+    if not text or not patterns:
+        return {}
+
+    fields = {}
+    for field, candidates in patterns.items():
+        for regex, parser in candidates:
+            values = []
+            for match in regex.finditer(text):
+                try:
+                    value = parser(match)
+                except (ValueError, TypeError):
+                    value = None
+                if value is not None:
+                    values.append(value)
+            if values:
+                # Totals are usually printed after subtotals and VAT lines,
+                # so prefer the largest amount; other fields take the first hit.
+                fields[field] = max(values) if field.endswith('_amount') else values[0]
+                break
+    return fields
+
+
+# ---------------------------------------------------------
+# Parsers
+# ---------------------------------------------------------
+def _parse_amount(match):
+    amount = float(match.group('amount').replace(',', '').replace(' ', ''))
+    return round(amount, 2) if amount > 0 else None
+
+
+def _parse_tin(match):
+    digits = re.sub(r'\D', '', match.group('tin'))
+    if len(digits) < 9:
+        return None
+    # BIR TINs are 9 digits plus a 3-5 digit branch code (000 for head office).
+    branch = digits[9:] or '000'
+    return f"{digits[0:3]}-{digits[3:6]}-{digits[6:9]}-{branch}"
+
+
+def _parse_reference(match):
+    value = match.group('number').strip().lstrip('#').upper()
+    return value if any(ch.isdigit() for ch in value) else None
+
+
+_DATE_FORMATS = (
+    '%m/%d/%Y', '%m-%d-%Y', '%m/%d/%y', '%m-%d-%y', '%Y-%m-%d', '%Y/%m/%d',
+    '%b %d %Y', '%B %d %Y', '%d %b %Y', '%d %B %Y',
+)
+
+
+def _parse_date(match):
+    raw = re.sub(r'[,.]', ' ', match.group('date'))
+    raw = ' '.join(raw.split())
+    for fmt in _DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(raw, fmt)
+        except ValueError:
+            continue
+        if 2000 <= parsed.year <= datetime.now().year + 1:
+            return pytz.utc.localize(parsed)
+    return None
+
+
+# ---------------------------------------------------------
+# Philippine official receipts / sales invoices
+# ---------------------------------------------------------
+_AMOUNT = r'(?:P|PHP|₱)?\s*(?P<amount>\d{1,3}(?:[, ]?\d{3})*\.\d{2})'
+_MONTH = r'(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*\.?'
+
+register_pattern_set('ph_receipt', {
+    'total_amount': [
+        (rf'\b(?:TOTAL\s+AMOUNT\s+DUE|AMOUNT\s+DUE|TOTAL\s+DUE|GRAND\s+TOTAL)\b[^\d\n]{{0,20}}{_AMOUNT}', _parse_amount),
+        (rf'\b(?:TOTAL\s+SALES|TOTAL\s+AMOUNT|AMOUNT\s+PAID|TOTAL)\b[^\d\n]{{0,20}}{_AMOUNT}', _parse_amount),
+    ],
+    'vat_amount': [
+        (rf'\b(?:VAT\s+AMOUNT|12%\s*VAT|VAT\s*\(12%\)|ADD:?\s*VAT)\b[^\d\n]{{0,20}}{_AMOUNT}', _parse_amount),
+    ],
+    'vendor_tin': [
+        (r'\b(?:VAT\s+REG\.?\s+)?TIN\b[^\d\n]{0,10}(?P<tin>\d{3}[- ]?\d{3}[- ]?\d{3}(?:[- ]?\d{3,5})?)', _parse_tin),
+    ],
+    'or_number': [
+        (r'\b(?:O\.?\s?R\.?|OFFICIAL\s+RECEIPT|S\.?\s?I\.?|SALES\s+INVOICE|INVOICE)\s*(?:NO\.?|NUMBER|#)\s*[:.]?\s*(?P<number>#?[A-Z0-9][A-Z0-9-]{2,19})', _parse_reference),
+    ],
+    'receipt_date': [
+        (r'\bDATE\b[^\d\n]{0,10}(?P<date>\d{1,4}[/-]\d{1,2}[/-]\d{2,4})', _parse_date),
+        (rf'\bDATE\b[^\w\n]{{0,10}}(?P<date>{_MONTH}\s*\d{{1,2}},?\s*\d{{4}}|\d{{1,2}}\s+{_MONTH}\s*,?\s*\d{{4}})', _parse_date),
+        (r'(?P<date>\b\d{1,2}[/-]\d{1,2}[/-]\d{4}\b)', _parse_date),
+        (rf'(?P<date>\b{_MONTH}\s*\d{{1,2}},?\s*\d{{4}}\b)', _parse_date),
+    ],
+})
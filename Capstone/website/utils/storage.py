@@ -0,0 +1,385 @@
+# website/utils/storage.py
+
+import logging
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+from datetime import datetime
+from urllib.parse import quote
+from zlib import adler32
+import pytz
+from flask import current_app, request, Response, abort
+from werkzeug.http import is_resource_modified
+from werkzeug.security import safe_join
+import gridfs
+
+logger = logging.getLogger(__name__)
+
+# Logical buckets and the config key holding their local folder.
+BUCKET_FOLDERS = {
+    'invoices': 'UPLOAD_FOLDER',
+    'profile_pics': 'PROFILE_PIC_FOLDER',
+    'upload_chunks': 'UPLOAD_CHUNK_FOLDER',
+}
+
+# Names the server derives from a content hash, <prefix>_<variant>_<sha256[:32]>
+# for avatar sizes (utils/images.py) and invoice page images (utils/ocr.py),
+# always hold the same bytes, so the browser may cache them indefinitely.
+# Uploads keep the user's file name after their random token
+# (<token>.<name>, utils/uploads.py) and never count, whatever that name is.
+_IMMUTABLE_NAME_RE = re.compile(
+    r'^(?![0-9a-f]{32}\.)[\w.-]+_(?:\d+|thumbnail|preview)_[0-9a-f]{32}\.(?:jpg|webp)$'
+)
+
+
+class StoredFile:
+    """
+    A read handle on a stored file. Wraps the backend's seekable stream and
+    exposes the metadata needed to build an HTTP response.
+    """
+    def __init__(self, filename, fileobj, length, content_type=None, upload_date=None, etag=None, local_path=None):
+        self.filename = filename
+        self.fileobj = fileobj
+        self.length = length
+        self.content_type = content_type
+        self.upload_date = upload_date
+        self.etag = etag
+        self.local_path = local_path
+
+    def read(self, size=-1):
+        return self.fileobj.read(size)
+
+    def seek(self, offset, whence=0):
+        return self.fileobj.seek(offset, whence)
+
+    def tell(self):
+        return self.fileobj.tell()
+
+    def close(self):
+        self.fileobj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def iter_chunks(self, start=0, end=None, chunk_size=256 * 1024):
+        """Yields the bytes in [start, end) in fixed-size chunks, closing the file when done."""
+        end = self.length if end is None else end
+        try:
+            self.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                data = self.read(min(chunk_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+        finally:
+            self.close()
+
+
+class FileStorage:
+    """Interface shared by all storage backends."""
+
+    chunk_size = 256 * 1024
+
+    def open_writer(self, bucket, filename, content_type=None):
+        """
+        Returns a writer for `filename`. Data becomes visible under that name
+        only after commit(); abort() throws away everything written so far.
+        """
+        raise NotImplementedError
+
+    def save(self, bucket, filename, stream, content_type=None):
+        """Stores `stream` under `filename` and returns the number of bytes written."""
+        writer = self.open_writer(bucket, filename, content_type)
+        try:
+            shutil.copyfileobj(stream, writer, self.chunk_size)
+        except Exception:
+            writer.abort()
+            raise
+        return writer.commit()
+
+    def open(self, bucket, filename):
+        """Returns a StoredFile, or None if the file does not exist."""
+        raise NotImplementedError
+
+    def exists(self, bucket, filename):
+        raise NotImplementedError
+
+    def delete(self, bucket, filename):
+        """Deletes the file. Returns True if something was removed."""
+        raise NotImplementedError
+
+    def iter_files(self, bucket):
+        """Yields (filename, upload_date) for every file in the bucket."""
+        raise NotImplementedError
+
+
+class LocalFileStorage(FileStorage):
+    """Stores files on the local disk, one folder per bucket."""
+
+    def __init__(self, folders, chunk_size):
+        self.folders = folders
+        self.chunk_size = chunk_size
+        for folder in folders.values():
+            os.makedirs(folder, exist_ok=True)
+
+    def _path(self, bucket, filename):
+        path = safe_join(self.folders[bucket], filename)
+        if path is None:
+            raise ValueError(f"Unsafe filename: {filename}")
+        return path
+
+    def open_writer(self, bucket, filename, content_type=None):
+        return _LocalWriter(self._path(bucket, filename))
+
+    def open(self, bucket, filename):
+        try:
+            path = self._path(bucket, filename)
+        except ValueError:
+            return None
+        if not os.path.isfile(path):
+            return None
+        stat = os.stat(path)
+        return StoredFile(
+            filename,
+            open(path, 'rb'),
+            stat.st_size,
+            upload_date=datetime.fromtimestamp(stat.st_mtime, pytz.utc),
+            etag=f"{stat.st_mtime}-{stat.st_size}-{adler32(path.encode('utf-8')) & 0xffffffff}",
+            local_path=path
+        )
+
+    def exists(self, bucket, filename):
+        try:
+            return os.path.isfile(self._path(bucket, filename))
+        except ValueError:
+            return False
+
+    def delete(self, bucket, filename):
+        try:
+            os.remove(self._path(bucket, filename))
+            return True
+        except (ValueError, FileNotFoundError):
+            return False
+
+    def iter_files(self, bucket):
+        with os.scandir(self.folders[bucket]) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    yield entry.name, datetime.fromtimestamp(entry.stat().st_mtime, pytz.utc)
+
+
+class GridFSFileStorage(FileStorage):
+    """
+    Stores files in MongoDB GridFS, one GridFS bucket per logical bucket, so
+    every app node behind the load balancer sees the same files.
+    """
+
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+
+    def _bucket(self, bucket):
+        db = current_app.db
+        if db is None:
+            raise RuntimeError("Database connection not available for GridFS storage.")
+        return gridfs.GridFSBucket(db, bucket_name=bucket, chunk_size_bytes=self.chunk_size)
+
+    def open_writer(self, bucket, filename, content_type=None):
+        return _GridFSWriter(self._bucket(bucket).open_upload_stream(filename, metadata={'contentType': content_type}))
+
+    def open(self, bucket, filename):
+        try:
+            grid_out = self._bucket(bucket).open_download_stream_by_name(filename)
+        except gridfs.errors.NoFile:
+            return None
+        metadata = grid_out.metadata or {}
+        upload_date = grid_out.upload_date
+        if upload_date is not None and upload_date.tzinfo is None:
+            upload_date = pytz.utc.localize(upload_date)
+        # Every GridFS upload is a new, immutable revision with its own _id.
+        return StoredFile(
+            filename,
+            grid_out,
+            grid_out.length,
+            content_type=metadata.get('contentType'),
+            upload_date=upload_date,
+            etag=str(grid_out._id)
+        )
+
+    def exists(self, bucket, filename):
+        db = current_app.db
+        if db is None: return False
+        return db[f"{bucket}.files"].find_one({'filename': filename}, {'_id': 1}) is not None
+
+    def delete(self, bucket, filename):
+        fs = self._bucket(bucket)
+        deleted = False
+        for grid_out in fs.find({'filename': filename}):
+            fs.delete(grid_out._id)
+            deleted = True
+        return deleted
+
+    def iter_files(self, bucket):
+        db = current_app.db
+        if db is None: return
+        for doc in db[f"{bucket}.files"].find({}, {'filename': 1, 'uploadDate': 1}):
+            upload_date = doc.get('uploadDate')
+            if upload_date is not None and upload_date.tzinfo is None:
+                upload_date = pytz.utc.localize(upload_date)
+            yield doc['filename'], upload_date
+
+
+class _LocalWriter:
+    """Writes to a temporary file next to the target and renames it into place on commit."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = tempfile.NamedTemporaryFile(dir=os.path.dirname(path), prefix='.upload-', delete=False)
+
+    def write(self, data):
+        return self._file.write(data)
+
+    def commit(self):
+        length = self._file.tell()
+        self._file.close()
+        # NamedTemporaryFile is created 0600; give it normal upload permissions.
+        os.chmod(self._file.name, 0o644)
+        os.replace(self._file.name, self.path)
+        return length
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._file.name)
+        except FileNotFoundError:
+            pass
+
+
+class _GridFSWriter:
+    def __init__(self, grid_in):
+        self._grid_in = grid_in
+
+    def write(self, data):
+        return self._grid_in.write(data)
+
+    def commit(self):
+        self._grid_in.close()
+        return self._grid_in.length
+
+    def abort(self):
+        self._grid_in.abort()
+
+
+def create_storage(app):
+    """Builds the storage backend selected by STORAGE_BACKEND."""
+    backend = app.config.get('STORAGE_BACKEND', 'local').lower()
+    chunk_size = app.config.get('STORAGE_CHUNK_SIZE', 256 * 1024)
+    if backend == 'gridfs':
+        return GridFSFileStorage(chunk_size)
+    if backend != 'local':
+        logger.warning(f"Unknown STORAGE_BACKEND '{backend}', falling back to local storage.")
+    folders = {bucket: app.config[key] for bucket, key in BUCKET_FOLDERS.items()}
+    return LocalFileStorage(folders, chunk_size)
+
+
+def get_storage():
+    return current_app.storage
+
+
+def is_immutable_name(filename):
+    """True if the file name was generated by the server from the file's content hash."""
+    return bool(_IMMUTABLE_NAME_RE.search(os.path.basename(filename).lower()))
+
+
+def send_stored_file(bucket, filename, mimetype=None, as_attachment=False):
+    """
+    Streams a stored file back to the client in chunks.
+
+    Responses carry a strong ETag and Last-Modified so repeat requests are
+    answered with 304, and single byte-range requests are answered with 206
+    by seeking in the backend stream. Content-addressed names are marked
+    `private, immutable` for a year. When STORAGE_SENDFILE_HEADER is set and
+    the file is on local disk, the transfer itself is handed to the front
+    proxy; callers are expected to have authorised the request already.
+    """
+    stored = get_storage().open(bucket, filename)
+    if stored is None:
+        abort(404)
+
+    config = current_app.config
+    mimetype = mimetype or stored.content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    length = stored.length
+
+    headers = {}
+    if stored.etag:
+        headers['ETag'] = f'"{stored.etag}"'
+    if is_immutable_name(filename):
+        headers['Cache-Control'] = f"private, max-age={config.get('STORAGE_IMMUTABLE_MAX_AGE', 31536000)}, immutable"
+    else:
+        headers['Cache-Control'] = 'private, no-cache'
+    if as_attachment:
+        headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+    if not is_resource_modified(request.environ, etag=stored.etag, last_modified=stored.upload_date):
+        stored.close()
+        response = Response(status=304, headers=headers)
+        response.last_modified = stored.upload_date
+        return response
+
+    sendfile_header = config.get('STORAGE_SENDFILE_HEADER')
+    if sendfile_header and stored.local_path:
+        stored.close()
+        if sendfile_header.lower() == 'x-accel-redirect':
+            prefix = config.get('STORAGE_ACCEL_REDIRECT_PREFIX', '/protected-uploads/').rstrip('/')
+            headers['X-Accel-Redirect'] = f"{prefix}/{quote(bucket)}/{quote(filename)}"
+        else:
+            headers['X-Sendfile'] = stored.local_path
+        response = Response(mimetype=mimetype, headers=headers)
+        response.last_modified = stored.upload_date
+        return response
+
+    start, end, status = 0, length, 200
+    if _range_applies(stored):
+        byte_range = request.range.range_for_length(length)
+        if byte_range is None:
+            stored.close()
+            response = Response(status=416)
+            response.headers['Content-Range'] = f"bytes */{length}"
+            return response
+        start, end = byte_range
+        status = 206
+
+    chunk_size = config.get('STORAGE_CHUNK_SIZE', 256 * 1024)
+    response = Response(
+        stored.iter_chunks(start, end, chunk_size),
+        status=status,
+        mimetype=mimetype,
+        headers=headers,
+        direct_passthrough=True
+    )
+    response.call_on_close(stored.close)
+    response.content_length = end - start
+    response.accept_ranges = 'bytes'
+    response.last_modified = stored.upload_date
+    if status == 206:
+        response.headers['Content-Range'] = f"bytes {start}-{end - 1}/{length}"
+    return response
+
+
+def _range_applies(stored):
+    """A single byte range is honoured unless an If-Range validator no longer matches."""
+    byte_range = request.range
+    if byte_range is None or byte_range.units != 'bytes' or len(byte_range.ranges) != 1:
+        return False
+    if_range = request.if_range
+    if if_range.etag is not None:
+        return if_range.etag == stored.etag
+    if if_range.date is not None:
+        return stored.upload_date is not None and if_range.date >= stored.upload_date.replace(microsecond=0)
+    return True
@@ -0,0 +1,349 @@
+# website/utils/uploads.py
+
+import functools
+import hashlib
+import logging
+import re
+import secrets
+import time
+from tempfile import SpooledTemporaryFile
+from flask import Request, current_app, flash, jsonify, redirect, request
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+from werkzeug.utils import secure_filename
+from .storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+UPLOADS_ENVIRON_KEY = 'decooffice.uploads'
+
+# Storage bucket holding the pieces of chunked uploads until they are assembled.
+CHUNK_BUCKET = 'upload_chunks'
+_UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+IMAGE_CONTENT_TYPES = frozenset({'image/png', 'image/jpeg', 'image/gif', 'image/webp', 'image/bmp', 'image/tiff'})
+INVOICE_CONTENT_TYPES = IMAGE_CONTENT_TYPES | {'application/pdf'}
+
+# Bytes needed to recognise every signature below.
+MAGIC_PEEK = 16
+
+_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'II*\x00', 'image/tiff'),
+    (b'MM\x00*', 'image/tiff'),
+    (b'%PDF-', 'application/pdf'),
+    (b'BM', 'image/bmp'),
+)
+
+
+def sniff_content_type(head):
+    """Content type from a file's leading bytes, or None if it is not a known format."""
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    for signature, content_type in _SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    return None
+
+
+def unique_upload_name(filename):
+    """'Receipt 1.png' -> '<32 hex>.Receipt_1.png': a fresh storage name that keeps the original readable."""
+    return f"{secrets.token_hex(16)}.{secure_filename(filename) or 'upload'}"
+
+
+def _format_size(num_bytes):
+    if num_bytes >= 1024 * 1024:
+        return f"{num_bytes / (1024 * 1024):.0f} MB"
+    return f"{num_bytes / 1024:.0f} KB"
+
+
+def streamed_upload(bucket=None, content_types=IMAGE_CONTENT_TYPES,
+                    max_request_size='UPLOAD_MAX_REQUEST_SIZE', max_file_size='UPLOAD_MAX_FILE_SIZE'):
+    """
+    Marks a view as accepting streamed file uploads. The size limits are
+    config keys so they can differ per route.
+
+    File parts are checked against `content_types` from their magic bytes
+    and against the per-file limit while they are being received, so a bad
+    or oversize file is rejected after its first chunk that gives it away.
+    With a `bucket`, parts are written straight to that storage bucket under
+    a new unique name (random token + secured filename), so an upload never
+    replaces an existing file; otherwise they are spooled to a temp file.
+    Parts stored for a request that ends in an error (failed CSRF or JWT
+    check, invalid form...) are deleted again.
+
+    Must be the innermost decorator so the marker reaches the registered view.
+    """
+    spec = {
+        'bucket': bucket,
+        'content_types': frozenset(content_types),
+        'max_request_size': max_request_size,
+        'max_file_size': max_file_size,
+    }
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            return view(*args, **kwargs)
+        wrapper.upload_spec = spec
+        return wrapper
+    return decorator
+
+
+def upload_limit(max_request_size):
+    """Marks a view that reads a raw request body with its own size limit (a config key)."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            return view(*args, **kwargs)
+        wrapper.upload_spec = {'max_request_size': max_request_size}
+        return wrapper
+    return decorator
+
+
+class UploadStream:
+    """
+    The container Werkzeug writes one file part into. Hashes and size-checks
+    the part as it arrives and forwards it in fixed-size chunks, either to a
+    storage writer or to a spooled temp file. Once the part is complete it
+    reads back like a normal file.
+    """
+
+    def __init__(self, spec, filename, config):
+        self.spec = spec
+        self.original_filename = filename
+        self.filename = unique_upload_name(filename)
+        self.max_size = config.get(spec['max_file_size'])
+        self.chunk_size = config.get('STORAGE_CHUNK_SIZE', 256 * 1024)
+        self.content_type = None
+        self.size = 0
+        self.sha256 = None
+        self.started = time.perf_counter()
+        self.duration = None
+        self._hash = hashlib.sha256()
+        self._buffer = bytearray()
+        self._writer = None
+        self._spool = None
+        self._reader = None
+        self._committed = False
+
+    def _open_sink(self):
+        self.content_type = sniff_content_type(bytes(self._buffer[:MAGIC_PEEK]))
+        if self.content_type not in self.spec['content_types']:
+            raise UnsupportedMediaType(f"{self.original_filename} is not a supported file type.")
+        if self.spec['bucket']:
+            self._writer = get_storage().open_writer(self.spec['bucket'], self.filename, self.content_type)
+        else:
+            self._spool = SpooledTemporaryFile(max_size=self.chunk_size, mode='w+b')
+
+    def _flush(self, final=False):
+        sink = self._writer or self._spool
+        while len(self._buffer) >= self.chunk_size or (final and self._buffer):
+            chunk = bytes(self._buffer[:self.chunk_size])
+            del self._buffer[:self.chunk_size]
+            sink.write(chunk)
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            self.abort()
+            raise RequestEntityTooLarge(
+                f"{self.original_filename} is larger than the {_format_size(self.max_size)} limit."
+            )
+        self._hash.update(data)
+        self._buffer += data
+        if self._writer is None and self._spool is None:
+            if len(self._buffer) < MAGIC_PEEK:
+                return len(data)
+            try:
+                self._open_sink()
+            except UnsupportedMediaType:
+                self.abort()
+                raise
+        self._flush()
+        return len(data)
+
+    def _finish(self):
+        if self._writer is None and self._spool is None:
+            # Shorter than MAGIC_PEEK bytes in total.
+            self._open_sink()
+        self._flush(final=True)
+        if self._writer is not None:
+            self._writer.commit()
+            self._writer = None
+        self._committed = True
+        self.sha256 = self._hash.hexdigest()
+        self.duration = time.perf_counter() - self.started
+        logger.info(
+            f"Received upload {self.filename} ({self.content_type}): {self.size} bytes in "
+            f"{self.duration * 1000:.1f} ms ({self.size / max(self.duration, 1e-6) / (1024 * 1024):.2f} MB/s), "
+            f"sha256 {self.sha256[:12]}"
+        )
+
+    def _source(self):
+        if self._spool is not None:
+            return self._spool
+        if self._reader is None:
+            self._reader = get_storage().open(self.spec['bucket'], self.filename)
+        return self._reader
+
+    def seek(self, offset, whence=0):
+        if not self._committed:
+            # Werkzeug rewinds the container once the part has been fully received.
+            try:
+                self._finish()
+            except UnsupportedMediaType:
+                self.abort()
+                raise
+        return self._source().seek(offset, whence)
+
+    def tell(self):
+        return self._source().tell() if self._committed else self.size
+
+    def read(self, size=-1):
+        return self._source().read(size)
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def close(self):
+        for handle in (self._reader, self._spool):
+            if handle is not None:
+                handle.close()
+        self._reader = None
+
+    def abort(self):
+        """Throws the part away, whether or not it has been committed."""
+        if self._writer is not None:
+            self._writer.abort()
+            self._writer = None
+        self.close()
+        self._spool = None
+        if self._committed and self.spec['bucket']:
+            get_storage().delete(self.spec['bucket'], self.filename)
+        self._committed = False
+
+
+class UploadRequest(Request):
+    """Request class that applies a view's streamed_upload settings while the body is parsed."""
+
+    @property
+    def upload_spec(self):
+        if self.url_rule is None:
+            return None
+        view = current_app.view_functions.get(self.url_rule.endpoint)
+        return getattr(view, 'upload_spec', None)
+
+    @property
+    def max_content_length(self):
+        spec = self.upload_spec
+        if spec is not None and self._max_content_length is None:
+            return current_app.config.get(spec['max_request_size'])
+        return Request.max_content_length.fget(self)
+
+    @max_content_length.setter
+    def max_content_length(self, value):
+        self._max_content_length = value
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        spec = self.upload_spec
+        if spec is None or 'content_types' not in spec or not filename:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        stream = UploadStream(spec, filename, current_app.config)
+        self.environ.setdefault(UPLOADS_ENVIRON_KEY, []).append(stream)
+        return stream
+
+
+def is_valid_upload_id(upload_id):
+    return bool(_UPLOAD_ID_RE.match(upload_id or ''))
+
+
+def chunk_name(owner, upload_id, index):
+    """Storage name of one chunk; the owner prefix keeps users out of each other's uploads."""
+    return f"{secure_filename(owner)}_{upload_id}_{index:05d}"
+
+
+def assemble_chunked_upload(owner, upload_id, filename, chunk_count):
+    """
+    Concatenates the chunks of a chunked upload, in order, into the current
+    view's upload bucket. The data goes through an UploadStream, so it gets
+    the same type, size and hash checks as a streamed multipart part.
+    Chunks are deleted afterwards either way. Returns the committed
+    UploadStream, or None if a chunk never arrived.
+    """
+    storage = get_storage()
+    stream = UploadStream(request.upload_spec, filename, current_app.config)
+    request.environ.setdefault(UPLOADS_ENVIRON_KEY, []).append(stream)
+    try:
+        for index in range(chunk_count):
+            chunk = storage.open(CHUNK_BUCKET, chunk_name(owner, upload_id, index))
+            if chunk is None:
+                stream.abort()
+                return None
+            for data in chunk.iter_chunks(chunk_size=stream.chunk_size):
+                stream.write(data)
+        stream.seek(0)
+        return stream
+    finally:
+        for index in range(chunk_count):
+            storage.delete(CHUNK_BUCKET, chunk_name(owner, upload_id, index))
+
+
+def received_uploads():
+    """UploadStreams received by the current request, in arrival order."""
+    return request.environ.get(UPLOADS_ENVIRON_KEY, [])
+
+
+def discard_uploads():
+    """Deletes everything the current request streamed into storage, e.g. when the form turns out invalid."""
+    for stream in received_uploads():
+        try:
+            stream.abort()
+        except Exception as e:
+            logger.error(f"Could not discard upload {stream.filename}: {e}", exc_info=True)
+
+
+def init_uploads(app):
+    """Installs the upload-aware request class, upload error pages and timing headers."""
+    app.request_class = UploadRequest
+
+    def upload_rejected(e):
+        discard_uploads()
+        message = e.description
+        if request.path.startswith('/api/'):
+            return jsonify({'success': False, 'error': message}), e.code
+        flash(message, 'error')
+        return redirect(request.referrer or '/')
+
+    app.register_error_handler(RequestEntityTooLarge, upload_rejected)
+    app.register_error_handler(UnsupportedMediaType, upload_rejected)
+
+    @app.after_request
+    def discard_failed_uploads(response):
+        # The body is parsed (and files stored) before CSRF and JWT checks
+        # run, so anything other than success throws the files away again.
+        if not 200 <= response.status_code < 300:
+            discard_uploads()
+        return response
+
+    @app.teardown_request
+    def discard_uploads_on_error(exc):
+        if exc is not None:
+            discard_uploads()
+
+    @app.after_request
+    def add_upload_timing(response):
+        streams = [s for s in received_uploads() if s.duration is not None]
+        if streams:
+            total_bytes = sum(s.size for s in streams)
+            receive_ms = sum(s.duration for s in streams) * 1000
+            response.headers.add(
+                'Server-Timing',
+                f'upload;dur={receive_ms:.1f};desc="{len(streams)} file(s), {total_bytes} bytes"'
+            )
+        return response
@@ -0,0 +1,38 @@
+# vendor_assets_task.py
+import os
+import urllib.request
+from website.utils.assets import VENDOR_ASSETS
+
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+# Pinned third-party files copied into static/. Font Awesome's stylesheet
+# loads its fonts from ../webfonts/, so they keep that layout.
+FONTAWESOME_CDN = 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.5.1'
+VENDOR_FILES = {
+    VENDOR_ASSETS['idb'][0]: VENDOR_ASSETS['idb'][1],
+    VENDOR_ASSETS['fontawesome'][0]: VENDOR_ASSETS['fontawesome'][1],
+    **{
+        f'vendor/fontawesome/webfonts/{font}.{ext}': f'{FONTAWESOME_CDN}/webfonts/{font}.{ext}'
+        for font in ('fa-solid-900', 'fa-regular-400', 'fa-brands-400', 'fa-v4compatibility')
+        for ext in ('woff2', 'ttf')
+    },
+}
+
+def vendor_assets():
+    """
+    Downloads the pinned CDN libraries into static/vendor so they are served,
+    fingerprinted and precached like the app's own assets. Run it when
+    bumping a version in VENDOR_ASSETS and commit the result. Without the
+    files only VENDOR_CDN_FALLBACK configs (dev, test) start, using the CDN.
+    """
+    for path, url in VENDOR_FILES.items():
+        target = os.path.join(STATIC_FOLDER, *path.split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        print(f"Fetching {url}...")
+        with urllib.request.urlopen(url, timeout=30) as response, open(target, 'wb') as f:
+            f.write(response.read())
+        print(f"  - Saved static/{path} ({os.path.getsize(target)} bytes)")
+
+
+if __name__ == '__main__':
+    vendor_assets()
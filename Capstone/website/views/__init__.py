@@ -6,4 +6,4 @@ from flask import Blueprint
 main = Blueprint('main', __name__)
 
 # Import the route modules to register their routes with the blueprint
-from . import core, transactions, schedules, invoices, billings, analytics
\ No newline at end of file
+from . import core, transactions, schedules, invoices, billings, analytics, sync
\ No newline at end of file
@@ -17,6 +17,9 @@ def analytics():
     return render_template('analytics.html', analytics_data=initial_data, show_sidebar=True)
 
 # --- Analytics API Routes ---
+# No conditional_view: the summary is read from a possibly lagging secondary,
+# so the primary's data version could label a stale body. It gets the ETag
+# hashed from the body instead (init_conditional_responses).
 @main.route('/api/analytics/summary', methods=['GET'])
 @jwt_required()
 def get_analytics_summary():
@@ -20,6 +20,8 @@ def billings():
     return render_template('billings.html', show_sidebar=True, form=form, loans=loans)
 
 # --- Billings & Loans API Routes ---
+# Read from the reporting secondary, so it is validated by the body-hash ETag
+# rather than conditional_view (see views/analytics.py).
 @main.route('/api/billings/summary', methods=['GET'])
 @jwt_required()
 def get_billings_summary():
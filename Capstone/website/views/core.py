@@ -1,27 +1,37 @@
 from flask import (
     Blueprint, render_template, request, redirect, url_for, session,
-    send_from_directory, jsonify, flash, current_app
+    jsonify, flash, current_app
 )
 from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
 from werkzeug.utils import secure_filename
+import io
 import os
-import uuid
 from datetime import datetime, timedelta
 import pytz
+import logging
 
 from . import main
 from ..models import (
     get_transactions_by_status, get_recent_activity, get_archived_items, 
     log_user_activity, restore_item, delete_item_permanently, 
+    archive_items, restore_items, delete_items_permanently, ARCHIVE_BULK_LIMIT,
     save_push_subscription, get_unread_notification_count, 
     get_notifications, mark_single_notification_as_read, 
     get_schedules, get_user_by_username, update_personal_info, 
     check_password, update_user_password, get_transaction_by_id,
-    get_child_transactions_by_parent_id, get_invoice_by_id
+    get_child_transactions_by_parent_id, get_invoice_details,
+    get_activity_version, get_data_version, ENTITY_NOTIFICATION
 )
 from ..forms import UpdatePersonalInfoForm, ChangePasswordForm
+from ..utils.storage import get_storage, send_stored_file
+from ..utils.images import build_avatar_variants, AVATAR_SIZES
+from ..utils.uploads import streamed_upload
+from ..utils.assets import get_asset_manifest, precache_manifest, vendor_asset_url
+from ..utils.http_cache import conditional_view
 
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+logger = logging.getLogger(__name__)
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
 def allowed_file(filename):
     return '.' in filename and \
@@ -30,7 +40,21 @@ def allowed_file(filename):
 # --- Static Service Worker & Offline Page ---
 @main.route('/sw.js')
 def service_worker():
-    return send_from_directory(os.path.join(main.root_path, '..', 'static', 'js'), 'sw.js', mimetype='application/javascript')
+    # The asset version is written into the script so any static change
+    # makes the browser install a new service worker.
+    with open(os.path.join(current_app.static_folder, 'js', 'sw.js'), encoding='utf-8') as f:
+        script = (f.read()
+                  .replace('__PRECACHE_VERSION__', get_asset_manifest()['version'])
+                  .replace('__IDB_URL__', vendor_asset_url('idb')))
+    response = current_app.response_class(script, mimetype='application/javascript')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@main.route('/precache-manifest.json')
+def precache_manifest_route():
+    response = jsonify(precache_manifest())
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @main.route('/offline')
 def offline():
@@ -142,6 +166,7 @@ def manage_account():
 
 @main.route('/update-personal-info', methods=['POST'])
 @jwt_required()
+@streamed_upload(max_request_size='PROFILE_PHOTO_MAX_REQUEST_SIZE', max_file_size='PROFILE_PHOTO_MAX_FILE_SIZE')
 def update_personal_info_route():
     username = get_jwt_identity()
     form = UpdatePersonalInfoForm()
@@ -158,13 +183,24 @@ def update_personal_info_route():
     if 'profile_photo' in request.files:
         file = request.files['profile_photo']
         if file and file.filename != '' and allowed_file(file.filename):
-            filename = secure_filename(f"{username}_{uuid.uuid4().hex}.{file.filename.rsplit('.', 1)[1].lower()}")
-            filepath = os.path.join(current_app.config['PROFILE_PIC_FOLDER'], filename)
-            file.save(filepath)
-            update_data['profile_picture_url'] = filename
-            
-            log_user_activity(username, 'Updated profile photo')
-            activity_logged = True
+            try:
+                variants = build_avatar_variants(file.stream, secure_filename(username))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Rejected profile photo upload for {username}: {e}")
+                variants = []
+                flash('The uploaded photo could not be read as an image.', 'error')
+
+            if variants:
+                storage = get_storage()
+                variant_map = {}
+                for size, format_key, filename, data, content_type in variants:
+                    storage.save('profile_pics', filename, io.BytesIO(data), content_type)
+                    variant_map.setdefault(str(size), {})[format_key] = filename
+                update_data['profile_picture_variants'] = variant_map
+                update_data['profile_picture_url'] = variant_map[str(max(AVATAR_SIZES))]['jpeg']
+                
+                log_user_activity(username, 'Updated profile photo')
+                activity_logged = True
 
     if update_personal_info(username, update_data):
         if activity_logged:
@@ -208,18 +244,28 @@ def change_password_route():
 @jwt_required()
 def archive():
     username = get_jwt_identity()
-    archived_items = get_archived_items(username)
+    cursor = request.args.get('cursor')
+    page = get_archived_items(username, cursor)
+    if page is None:
+        return redirect(url_for('main.archive', back=request.args.get('back')))
     back_url = request.args.get('back') or url_for('main.dashboard')
-    return render_template('_archive.html', show_sidebar=True, archived_items=archived_items, back_url=back_url)
+    return render_template('_archive.html', show_sidebar=True, archived_items=page['items'],
+                           next_cursor=page['next_cursor'], is_first_page=not cursor, back_url=back_url)
 
 @main.route('/uploads/profile_pics/<path:filename>')
 @jwt_required()
 def serve_profile_picture(filename):
-    return send_from_directory(current_app.config['PROFILE_PIC_FOLDER'], filename)
+    return send_stored_file('profile_pics', filename)
 
 # --- Core API Routes ---
+def _activity_version(username):
+    version = get_activity_version(username)
+    # Entries show relative times ("5m ago"), which move on every minute.
+    return None if version is None else f"{version}:{datetime.now(pytz.utc):%Y-%m-%dT%H:%M}"
+
 @main.route('/api/activity/recent', methods=['GET'])
 @jwt_required()
+@conditional_view(_activity_version)
 def get_recent_activity_api():
     username = get_jwt_identity()
     activities = get_recent_activity(username, limit=10)
@@ -240,6 +286,7 @@ def save_subscription_route():
 
 @main.route('/api/notifications/status', methods=['GET'])
 @jwt_required()
+@conditional_view(lambda username: get_data_version(username, [ENTITY_NOTIFICATION]))
 def notification_status():
     username = get_jwt_identity()
     count = get_unread_notification_count(username)
@@ -284,6 +331,33 @@ def delete_item_permanently_route(item_type, item_id):
         return jsonify({'success': True}), 200
     return jsonify({'error': 'An unexpected error occurred.'}), 500
 
+# Bulk actions take {"items": [{"type": "Transaction" | "Invoice", "id": "..."}, ...]}
+_BULK_ARCHIVE_ACTIONS = {
+    'archive': (archive_items, 'archived', 'Archived'),
+    'restore': (restore_items, 'restored', 'Restored'),
+    'delete': (delete_items_permanently, 'deleted', 'Permanently deleted'),
+}
+
+@main.route('/api/archive/bulk/<action>', methods=['POST'])
+@jwt_required()
+def bulk_archive_action_route(action):
+    username = get_jwt_identity()
+    if action not in _BULK_ARCHIVE_ACTIONS:
+        return jsonify({'error': 'Unknown bulk action.'}), 404
+    items = (request.get_json(silent=True) or {}).get('items')
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        return jsonify({'error': 'A non-empty list of items is required.'}), 400
+    if len(items) > ARCHIVE_BULK_LIMIT:
+        return jsonify({'error': f'At most {ARCHIVE_BULK_LIMIT} items can be processed at once.'}), 400
+
+    handler, count_key, verb = _BULK_ARCHIVE_ACTIONS[action]
+    result = handler(username, items)
+    if result is None:
+        return jsonify({'error': 'An unexpected error occurred.'}), 500
+    if result[count_key]:
+        log_user_activity(username, f'{verb} {result[count_key]} item(s)')
+    return jsonify({'success': True, **result}), 200
+
 # --- START OF FIX: Add the missing routes ---
 @main.route('/archive/view/transaction/<transaction_id>')
 @jwt_required()
@@ -320,7 +394,7 @@ def get_archived_transaction_details(item_id):
 @jwt_required()
 def get_archived_invoice_details(item_id):
     username = get_jwt_identity()
-    invoice_data = get_invoice_by_id(username, item_id)
+    invoice_data = get_invoice_details(username, item_id)
     if invoice_data:
         return jsonify(invoice_data)
     return jsonify({'error': 'Archived invoice not found'}), 404
\ No newline at end of file
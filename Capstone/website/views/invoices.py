@@ -1,13 +1,12 @@
 from flask import (
     render_template, request, jsonify, url_for, current_app, 
-    send_from_directory, send_file, abort, session, make_response
+    send_file, abort, session, make_response
 )
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 from datetime import datetime
 import os
-import pytesseract
-from PIL import Image
+import pypdfium2 as pdfium
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.utils import ImageReader
@@ -15,31 +14,47 @@ from reportlab.lib.units import inch
 from reportlab.platypus import Paragraph
 from reportlab.lib.styles import getSampleStyleSheet
 import io
+import json
 import logging
 
 from . import main # Import the blueprint
 from ..models import (
     log_user_activity, add_invoice, get_invoices, 
-    get_invoice_by_id, archive_invoice
+    get_invoice_by_id, archive_invoice, search_invoices,
+    get_invoice_details, get_invoice_text_page
+)
+from ..utils.storage import get_storage, send_stored_file
+from ..utils.receipt_fields import extract_invoice_fields
+from ..utils.ocr import process_invoice_uploads
+from ..utils.uploads import (
+    streamed_upload, upload_limit, discard_uploads, assemble_chunked_upload,
+    is_valid_upload_id, chunk_name, CHUNK_BUCKET, INVOICE_CONTENT_TYPES
 )
 
 logger = logging.getLogger(__name__)
 
-def perform_ocr_on_image(image_path):
-    """
-    Performs Optical Character Recognition (OCR) on an image file using Tesseract.
-    """
-    try:
-        return pytesseract.image_to_string(Image.open(image_path), timeout=15)
-    except pytesseract.TesseractNotFoundError:
-        logger.error("TESSERACT NOT FOUND: The Tesseract executable was not found in the system's PATH.")
-        return "OCR Error: Tesseract executable not found. Please check the server configuration."
-    except RuntimeError as timeout_error:
-        logger.error(f"OCR timed out for image {image_path}: {timeout_error}")
-        return "OCR failed: Processing timed out. The image may be too complex."
-    except Exception as e:
-        logger.error(f"An unexpected OCR error occurred for image {image_path}: {e}")
-        return f"OCR failed: An unexpected error occurred. Check server logs for details. (Error: {str(e)[:100]})"
+INVOICE_ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'bmp', 'tif', 'tiff', 'pdf'}
+INVOICE_MAX_FILES = 10
+
+def allowed_invoice_file(filename):
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in INVOICE_ALLOWED_EXTENSIONS
+
+def _max_upload_chunks():
+    config = current_app.config
+    return -(-config['INVOICE_UPLOAD_MAX_FILE_SIZE'] // config['INVOICE_UPLOAD_CHUNK_SIZE'])
+
+def _parse_chunked_uploads(raw):
+    """Validates the chunked upload manifest: [{'id', 'name', 'chunks'}, ...]."""
+    entries = json.loads(raw)
+    if not isinstance(entries, list) or not 0 < len(entries) <= INVOICE_MAX_FILES:
+        raise ValueError(f"Expected between 1 and {INVOICE_MAX_FILES} uploads.")
+    for entry in entries:
+        if not isinstance(entry, dict) or not is_valid_upload_id(entry.get('id')) \
+                or not isinstance(entry.get('name'), str) or not isinstance(entry.get('chunks'), int) \
+                or not 0 < entry['chunks'] <= _max_upload_chunks():
+            raise ValueError("Malformed upload entry.")
+    return entries
 
 @main.route('/invoice')
 @jwt_required()
@@ -57,16 +72,36 @@ def all_invoices():
 # --- Invoice API Routes ---
 @main.route('/api/invoices/upload', methods=['POST'])
 @jwt_required()
+@streamed_upload('invoices', INVOICE_CONTENT_TYPES,
+                 max_request_size='INVOICE_UPLOAD_MAX_REQUEST_SIZE', max_file_size='INVOICE_UPLOAD_MAX_FILE_SIZE')
 def upload_invoice():
     username = get_jwt_identity()
     selected_branch = session.get('selected_branch')
     
-    if 'files' not in request.files:
-        return jsonify({'success': False, 'error': 'No file part'}), 400
-    
-    files = request.files.getlist('files')
-    if not files or files[0].filename == '':
-        return jsonify({'success': False, 'error': 'No selected file'}), 400
+    # Files arrive either as multipart parts, already type-checked and
+    # streamed into the 'invoices' bucket while the body was parsed, or as
+    # a manifest of chunked uploads that are assembled below.
+    chunked_manifest = request.form.get('chunked_uploads')
+    if chunked_manifest:
+        try:
+            chunked_uploads = _parse_chunked_uploads(chunked_manifest)
+        except (ValueError, TypeError):
+            return jsonify({'success': False, 'error': 'Invalid chunked upload manifest.'}), 400
+        filenames = [entry['name'] for entry in chunked_uploads]
+    else:
+        if 'files' not in request.files:
+            discard_uploads()
+            return jsonify({'success': False, 'error': 'No file part'}), 400
+
+        files = request.files.getlist('files')
+        if not files or files[0].filename == '':
+            discard_uploads()
+            return jsonify({'success': False, 'error': 'No selected file'}), 400
+        filenames = [file.filename for file in files if file]
+
+    if not all(allowed_invoice_file(filename) for filename in filenames):
+        discard_uploads()
+        return jsonify({'success': False, 'error': 'Only image and PDF files can be uploaded.'}), 400
 
     try:
         date_obj = None
@@ -74,6 +109,7 @@ def upload_invoice():
         if date_str:
             date_obj = datetime.strptime(date_str, '%Y-%m-%d')
     except ValueError:
+        discard_uploads()
         return jsonify({'success': False, 'error': 'Invalid date format. Please use YYYY-MM-DD.'}), 400
 
     invoice_data = {
@@ -82,29 +118,74 @@ def upload_invoice():
         'date': date_obj,
     }
     
+    if chunked_manifest:
+        received = [
+            assemble_chunked_upload(username, entry['id'], entry['name'], entry['chunks'])
+            for entry in chunked_uploads
+        ]
+        if any(upload is None for upload in received):
+            discard_uploads()
+            return jsonify({'success': False, 'error': 'An upload was incomplete. Please try again.'}), 400
+        if sum(upload.size for upload in received) > current_app.config['INVOICE_UPLOAD_MAX_REQUEST_SIZE']:
+            discard_uploads()
+            return jsonify({'success': False, 'error': 'The selected files are too large in total.'}), 413
+    else:
+        received = [file.stream for file in files if file]
+
     processed_files_info = []
-    extracted_text_all = []
-
-    for file in files:
-        if file:
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
-            
-            extracted_text = perform_ocr_on_image(filepath)
-            extracted_text_all.append(extracted_text)
-            
-            processed_files_info.append({
-                'filename': filename, 'content_type': file.content_type,
-                'size': os.path.getsize(filepath)
-            })
-
-    if add_invoice(username, selected_branch, invoice_data, processed_files_info, "\n\n".join(extracted_text_all)):
+    uploads = []
+
+    for upload in received:
+        upload.seek(0)
+        uploads.append((upload.filename, upload, upload.content_type))
+
+        processed_files_info.append({
+            'filename': upload.filename, 'original_filename': upload.original_filename,
+            'content_type': upload.content_type,
+            'size': upload.size, 'sha256': upload.sha256
+        })
+
+    # PDFs are split into pages; all pages are OCR'd in parallel and stitched in order.
+    full_text, pages = process_invoice_uploads(uploads, secure_filename(username))
+    extracted_fields = extract_invoice_fields(full_text, current_app.config.get('OCR_FIELD_PATTERN_SET', 'ph_receipt'))
+
+    if add_invoice(username, selected_branch, invoice_data, processed_files_info, full_text, extracted_fields, pages):
         log_user_activity(username, 'Uploaded an invoice')
         return jsonify({'success': True, 'redirect_url': url_for('main.all_invoices')})
     else:
+        discard_uploads()
         return jsonify({'success': False, 'error': 'Database error'}), 500
 
+@main.route('/api/invoices/upload/chunks/<upload_id>/<int:index>', methods=['PUT'])
+@jwt_required()
+@upload_limit('INVOICE_UPLOAD_CHUNK_SIZE')
+def upload_invoice_chunk(upload_id, index):
+    """Stores one raw chunk of a file; upload_invoice assembles the chunks."""
+    username = get_jwt_identity()
+    if not is_valid_upload_id(upload_id) or index >= _max_upload_chunks():
+        return jsonify({'success': False, 'error': 'Invalid upload chunk.'}), 400
+    size = get_storage().save(CHUNK_BUCKET, chunk_name(username, upload_id, index), request.stream,
+                              'application/octet-stream')
+    return jsonify({'success': True, 'size': size})
+
+@main.route('/api/invoices/search', methods=['GET'])
+@jwt_required()
+def search_invoices_route():
+    username = get_jwt_identity()
+    selected_branch = session.get('selected_branch')
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Search query is required.'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 50)
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid limit parameter.'}), 400
+
+    page = search_invoices(username, selected_branch, query, request.args.get('cursor'), limit)
+    if page is None:
+        return jsonify({'error': 'Invalid cursor.'}), 400
+    return jsonify(page)
+
 @main.route('/api/invoices/<invoice_id>', methods=['DELETE'])
 @jwt_required()
 def delete_invoice_route(invoice_id):
@@ -116,13 +197,27 @@ def delete_invoice_route(invoice_id):
 
 @main.route('/api/invoices/details/<invoice_id>', methods=['GET'])
 @jwt_required()
-def get_invoice_details(invoice_id):
+def get_invoice_details_route(invoice_id):
     username = get_jwt_identity()
-    invoice_data = get_invoice_by_id(username, invoice_id)
+    invoice_data = get_invoice_details(username, invoice_id)
     if invoice_data:
         return jsonify(invoice_data)
     return jsonify({'error': 'Invoice not found'}), 404
 
+@main.route('/api/invoices/<invoice_id>/text', methods=['GET'])
+@jwt_required()
+def get_invoice_text_route(invoice_id):
+    username = get_jwt_identity()
+    page = request.args.get('page', 1, type=int)
+    if page < 1:
+        return jsonify({'error': 'Page must be 1 or greater.'}), 400
+    text_page = get_invoice_text_page(username, invoice_id, page)
+    if text_page is None:
+        return jsonify({'error': 'Invoice not found'}), 404
+    if page > max(text_page['text_pages'], 1):
+        return jsonify({'error': 'Page out of range.'}), 404
+    return jsonify(text_page)
+
 @main.route('/api/invoices/<invoice_id>/download', methods=['GET'])
 @jwt_required()
 def download_invoice_as_pdf(invoice_id):
@@ -186,18 +281,27 @@ def download_invoice_as_pdf(invoice_id):
     p.line(0.75 * inch, bottom_line_y, width - 0.75 * inch, bottom_line_y)
 
     # --- IMAGE PLACEMENT LOGIC ---
+    storage = get_storage()
     files = invoice.get('files', [])
+    pdf_inserts = []
     if files:
         # --- Draw the FIRST image on the first page ---
         first_file = files[0]
-        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], first_file['filename'])
-        if os.path.exists(filepath):
+        filepath = first_file['filename']
+        stored = None if _is_pdf(first_file) else storage.open('invoices', filepath)
+        if _is_pdf(first_file):
+            # Original PDF pages are spliced in after this page; see _embed_original_pdfs.
+            pdf_inserts.append((p.getPageNumber(), filepath))
+            p.setFont("Helvetica-Oblique", 10)
+            p.drawCentredString(width / 2.0, (top_line_y + bottom_line_y) / 2, "[Original document pages follow]")
+        elif stored:
             try:
                 margin = 0.85 * inch 
                 available_width = width - 2 * margin
                 available_height = top_line_y - bottom_line_y - (0.2 * inch) 
                 
-                img_reader = ImageReader(filepath)
+                with stored:
+                    img_reader = ImageReader(io.BytesIO(stored.read()))
                 img_width, img_height = img_reader.getSize()
                 
                 img_aspect = img_height / float(img_width) if img_width else 0
@@ -226,11 +330,16 @@ def download_invoice_as_pdf(invoice_id):
             page_available_height = height - 2 * page_margin
 
             for file_info in files[1:]:
-                filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], file_info['filename'])
-                if os.path.exists(filepath):
+                filepath = file_info['filename']
+                if _is_pdf(file_info):
+                    pdf_inserts.append((p.getPageNumber(), filepath))
+                    continue
+                stored = storage.open('invoices', filepath)
+                if stored:
                     try:
                         p.showPage()
-                        img_reader = ImageReader(filepath)
+                        with stored:
+                            img_reader = ImageReader(io.BytesIO(stored.read()))
                         img_width, img_height = img_reader.getSize()
                         
                         img_aspect = img_height / float(img_width)
@@ -255,6 +364,8 @@ def download_invoice_as_pdf(invoice_id):
 
     p.save()
     buffer.seek(0)
+    if pdf_inserts:
+        buffer = _embed_original_pdfs(buffer, pdf_inserts, storage)
     
     response = make_response(send_file(
         buffer, 
@@ -267,8 +378,39 @@ def download_invoice_as_pdf(invoice_id):
     response.headers['Expires'] = '0'
     return response
 
+def _is_pdf(file_info):
+    return file_info.get('content_type') == 'application/pdf' or file_info['filename'].lower().endswith('.pdf')
+
+def _embed_original_pdfs(report_buffer, pdf_inserts, storage):
+    """
+    Splices uploaded PDFs into the generated receipt at the recorded page
+    positions. Pages are copied as-is, so they keep their original vector
+    content and text layer instead of being re-rasterized.
+    """
+    report = pdfium.PdfDocument(report_buffer.getvalue())
+    inserted = 0
+    for after_page, filename in pdf_inserts:
+        stored = storage.open('invoices', filename)
+        if not stored:
+            logger.error(f"Original PDF missing from storage: {filename}")
+            continue
+        try:
+            with stored:
+                original = pdfium.PdfDocument(stored.read())
+            report.import_pages(original, index=after_page + inserted)
+            inserted += len(original)
+            original.close()
+        except Exception as e:
+            logger.error(f"Could not embed original PDF {filename}: {e}")
+
+    output = io.BytesIO()
+    report.save(output)
+    report.close()
+    output.seek(0)
+    return output
+
 @main.route('/invoices/uploads/<path:filename>')
 @jwt_required()
 def uploaded_invoice_file(filename):
     """Provides a secure endpoint to access uploaded invoice files."""
-    return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
\ No newline at end of file
+    return send_stored_file('invoices', filename)
\ No newline at end of file
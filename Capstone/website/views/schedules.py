@@ -8,8 +8,10 @@ import logging
 from . import main # Import the blueprint
 from ..models import (
     log_user_activity, add_schedule, get_schedules, 
-    update_schedule, delete_schedule, add_notification
+    update_schedule, delete_schedule, add_notification,
+    get_data_version, ENTITY_SCHEDULE
 )
+from ..utils.http_cache import conditional_view
 
 @main.route('/schedules')
 @jwt_required()
@@ -19,6 +21,7 @@ def schedules():
 # --- Schedule API Routes ---
 @main.route('/api/schedules', methods=['GET'])
 @jwt_required()
+@conditional_view(lambda username: get_data_version(username, [ENTITY_SCHEDULE]))
 def get_schedules_route():
     username = get_jwt_identity()
     selected_branch = session.get('selected_branch')
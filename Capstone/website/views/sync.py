@@ -0,0 +1,53 @@
+# website/views/sync.py
+
+from flask import request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+from . import main
+from ..models import get_transaction_changes, apply_sync_batch, log_user_activity, SYNC_BATCH_LIMIT
+
+@main.route('/api/sync/transactions', methods=['GET'])
+@jwt_required()
+def sync_transactions():
+    """
+    Changes to the user's folders and checks since `since`, the next_token
+    of the previous call (omit it for a full snapshot). Clients keep
+    calling while has_more is true and store the last next_token.
+    """
+    if current_app.db is None:
+        return jsonify({'error': 'Database not available.'}), 503
+    username = get_jwt_identity()
+    result = get_transaction_changes(
+        username,
+        token=request.args.get('since') or None,
+        branch=request.args.get('branch') or None,
+        max_age_days=current_app.config.get('SYNC_TOKEN_MAX_AGE_DAYS', 90)
+    )
+    if result is None:
+        return jsonify({'error': 'Invalid or expired sync token.'}), 400
+    return jsonify(result)
+
+@main.route('/api/sync/batch', methods=['POST'])
+@jwt_required()
+def sync_batch():
+    """
+    Replays the service worker's offline outbox in one request. Takes
+    {"operations": [{"op", "id", "data"}, ...]} in queue order and returns
+    one result per operation, in the same order.
+    """
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'success': False, 'error': 'No operations given.'}), 400
+    if len(operations) > SYNC_BATCH_LIMIT:
+        return jsonify({'success': False, 'error': f'At most {SYNC_BATCH_LIMIT} operations per batch.'}), 400
+
+    username = get_jwt_identity()
+    results = apply_sync_batch(username, operations)
+    if results is None:
+        return jsonify({'success': False, 'error': 'Database not available.'}), 503
+
+    applied = sum(1 for result in results if result['status'] == 'ok')
+    if applied:
+        log_user_activity(username, f'Synced {applied} offline change(s)')
+    return jsonify({'success': True, 'results': results})
@@ -20,8 +20,9 @@ from ..models import (
     log_user_activity, add_transaction, get_transactions_by_status, 
     get_transaction_by_id, get_child_transactions_by_parent_id,
     mark_folder_as_paid, archive_transaction, update_transaction,
-    update_child_transaction
+    update_child_transaction, get_data_version, ENTITY_TRANSACTION
 )
+from ..utils.http_cache import conditional_view
 
 logger = logging.getLogger(__name__)
 
@@ -232,6 +233,7 @@ def delete_transaction_route(transaction_id):
 
 @main.route('/api/transactions/details/<transaction_id>', methods=['GET'])
 @jwt_required()
+@conditional_view(lambda username, transaction_id: get_data_version(username, [ENTITY_TRANSACTION]))
 def get_transaction_details(transaction_id):
     username = get_jwt_identity()
     transaction_data = get_transaction_by_id(username, transaction_id)